@@ -0,0 +1,111 @@
+"""
+API - FastAPI backend exposing knowledge base builds, test case generation
+and Selenium script generation.
+"""
+
+import json
+from typing import Dict, List, Optional
+
+from fastapi import FastAPI, Form
+from fastapi.responses import StreamingResponse
+from pydantic import BaseModel
+
+from app.rag_engine import (
+    generate_selenium_code,
+    generate_selenium_code_batch,
+    generate_test_plan,
+    generate_test_plan_stream,
+    ingest_knowledge_base,
+    llm_provider_status,
+    warm_up_embeddings,
+    warm_up_reranker,
+)
+
+app = FastAPI(title="Autonomous QA Agent", description="Test case and Selenium script generation")
+
+
+class TestPlanRequest(BaseModel):
+    query: str = "Generate comprehensive test cases"
+    model_type: str = "auto"
+    k: int = 5
+    filters: Optional[Dict] = None
+    use_cache: bool = True
+
+
+class ScriptRequest(BaseModel):
+    test_case: Dict
+    model_type: str = "auto"
+    html_content: Optional[str] = None
+    use_cache: bool = True
+
+
+class BatchScriptRequest(BaseModel):
+    test_cases: List[Dict]
+    model_type: str = "auto"
+    html_content: Optional[str] = None
+    use_cache: bool = True
+
+
+@app.on_event("startup")
+def startup():
+    # Load the embeddings and reranker models in the background so the first request doesn't pay for them
+    warm_up_embeddings()
+    warm_up_reranker()
+
+
+@app.post("/api/knowledge-base/build")
+def build_knowledge_base(force_rebuild: bool = Form(False)):
+    """Build or incrementally update the knowledge base from the data folder."""
+    return ingest_knowledge_base(force_rebuild=force_rebuild)
+
+
+@app.post("/api/test-cases/generate")
+def generate_test_cases(request: TestPlanRequest):
+    """Generate test cases grounded in the knowledge base."""
+    return generate_test_plan(
+        query=request.query, model_type=request.model_type, k=request.k, filters=request.filters, use_cache=request.use_cache
+    )
+
+
+@app.post("/api/test-cases/generate/stream")
+def stream_test_cases(request: TestPlanRequest):
+    """
+    Generate test cases as newline-delimited JSON: one {"event": "test_case"}
+    line per test case as soon as the LLM has written it, then one
+    {"event": "result"} line.
+    """
+    events = generate_test_plan_stream(
+        query=request.query, model_type=request.model_type, k=request.k, filters=request.filters, use_cache=request.use_cache
+    )
+    return StreamingResponse(
+        (json.dumps(event, ensure_ascii=False) + "\n" for event in events), media_type="application/x-ndjson"
+    )
+
+
+@app.post("/api/scripts/generate")
+def generate_script(request: ScriptRequest):
+    """Generate a Selenium script for one test case."""
+    return generate_selenium_code(
+        request.test_case, html_content=request.html_content, model_type=request.model_type, use_cache=request.use_cache
+    )
+
+
+@app.post("/api/scripts/generate-batch")
+def generate_scripts(request: BatchScriptRequest):
+    """Generate Selenium scripts for many test cases; their context is retrieved in one batch."""
+    results = generate_selenium_code_batch(
+        request.test_cases, html_content=request.html_content, model_type=request.model_type, use_cache=request.use_cache
+    )
+    generated = sum(1 for result in results if result.get("success"))
+    icon = "✅" if generated == len(results) else "⚠️" if generated else "❌"
+    return {
+        "success": generated == len(results),
+        "message": f"{icon} Generated {generated}/{len(results)} Selenium scripts",
+        "results": results,
+    }
+
+
+@app.get("/api/llm/status")
+def llm_status():
+    """Rolling latency, error rate and circuit breaker state of each LLM provider."""
+    return {"success": True, "providers": llm_provider_status()}
@@ -0,0 +1,216 @@
+"""
+BM25 Index - Persistent keyword index built next to the vector index and
+fused with vector search by reciprocal rank at query time.
+"""
+
+import json
+import math
+import os
+import re
+from collections import Counter
+from itertools import repeat
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+import numpy as np
+from langchain_core.documents import Document
+
+from app.vector_backends import FILTER_FIELDS, metadata_matches
+
+BM25_FILENAME = "bm25_index.json"
+BM25_FORMAT_VERSION = 2
+
+_WORD_PATTERN = re.compile(r"[A-Za-z0-9_]+")
+_SUBWORD_PATTERN = re.compile(r"[A-Z]+(?=[A-Z][a-z])|[A-Z]?[a-z]+|[A-Z]+|\d+")
+
+
+def tokenize(text: str) -> List[str]:
+    """
+    Lowercase word tokens, plus the parts of camelCase, snake_case and
+    letter-digit identifiers, so "emailError" matches both "emailerror" and
+    "email error" and "SAVE15" matches "save15", "save" and "15".
+    """
+    tokens = []
+    for word in _WORD_PATTERN.findall(text):
+        tokens.append(word.lower())
+        parts = _SUBWORD_PATTERN.findall(word)
+        if len(parts) > 1:
+            tokens.extend(part.lower() for part in parts)
+    return tokens
+
+
+class BM25Index:
+    """
+    Okapi BM25 over chunk texts, keyed by chunk ID.
+
+    The filterable metadata fields of each chunk are kept alongside, so
+    searches can be restricted like vector searches. Removed chunks are
+    tombstoned and dropped from the postings on save().
+    """
+
+    def __init__(self, k1: float = 1.5, b: float = 0.75):
+        self.k1 = k1
+        self.b = b
+        self.ids: List[str] = []
+        self.lengths: List[int] = []
+        self.fields: List[Dict] = []
+        self.postings: Dict[str, Dict[int, int]] = {}
+        self._rows: Dict[str, int] = {}
+        self._total_length = 0
+
+    def __len__(self) -> int:
+        return len(self._rows)
+
+    def add(self, chunk_id: str, text: str, metadata: Optional[Dict] = None) -> None:
+        self.remove([chunk_id])
+        row = len(self.ids)
+        counts = Counter(tokenize(text))
+        self.ids.append(chunk_id)
+        self.lengths.append(sum(counts.values()))
+        self.fields.append({key: (metadata or {}).get(key) for key in FILTER_FIELDS})
+        self._rows[chunk_id] = row
+        self._total_length += self.lengths[row]
+        for term, tf in counts.items():
+            self.postings.setdefault(term, {})[row] = tf
+
+    def add_many(self, chunk_ids: Iterable[str], texts: Iterable[str], metadatas: Optional[Iterable[Dict]] = None) -> None:
+        metadatas = metadatas if metadatas is not None else repeat(None)
+        for chunk_id, text, metadata in zip(chunk_ids, texts, metadatas):
+            self.add(chunk_id, text, metadata)
+
+    def remove(self, chunk_ids: Iterable[str]) -> None:
+        for chunk_id in chunk_ids:
+            row = self._rows.pop(chunk_id, None)
+            if row is not None:
+                self._total_length -= self.lengths[row]
+
+    def search(self, query: str, k: int = 10, filter: Optional[Dict] = None) -> List[Tuple[str, float]]:
+        """Top k (chunk ID, score) pairs for a query among chunks matching filter, best first."""
+        live = len(self._rows)
+        if not live:
+            return []
+        average_length = self._total_length / live or 1.0
+        scores: Dict[int, float] = {}
+        for term in set(tokenize(query)):
+            postings = self.postings.get(term)
+            if not postings:
+                continue
+            idf = math.log(1.0 + (live - len(postings) + 0.5) / (len(postings) + 0.5))
+            for row, tf in postings.items():
+                if self._rows.get(self.ids[row]) != row:
+                    continue  # Tombstoned
+                if filter and not metadata_matches(self.fields[row], filter):
+                    continue
+                norm = self.k1 * (1.0 - self.b + self.b * self.lengths[row] / average_length)
+                scores[row] = scores.get(row, 0.0) + idf * tf * (self.k1 + 1.0) / (tf + norm)
+        best = sorted(scores.items(), key=lambda item: item[1], reverse=True)[:k]
+        return [(self.ids[row], score) for row, score in best]
+
+    def save(self, db_path: str) -> None:
+        """Write the index, without tombstoned chunks, next to the vector database."""
+        live_rows = sorted(self._rows.values())
+        remap = {old: new for new, old in enumerate(live_rows)}
+        postings = {}
+        for term, rows in self.postings.items():
+            kept = [[remap[row], tf] for row, tf in rows.items() if row in remap]
+            if kept:
+                postings[term] = kept
+        data = {
+            "version": BM25_FORMAT_VERSION,
+            "ids": [self.ids[row] for row in live_rows],
+            "lengths": [self.lengths[row] for row in live_rows],
+            "fields": [self.fields[row] for row in live_rows],
+            "postings": postings,
+        }
+        path = os.path.join(db_path, BM25_FILENAME)
+        with open(path + ".tmp", "w", encoding="utf-8") as f:
+            json.dump(data, f, ensure_ascii=False)
+        os.replace(path + ".tmp", path)
+
+    def load(self, db_path: str) -> bool:
+        """Load the index stored next to the vector database; returns False if there is none."""
+        path = os.path.join(db_path, BM25_FILENAME)
+        if not os.path.exists(path):
+            return False
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+        except (OSError, json.JSONDecodeError) as e:
+            print(f"Warning: Could not read BM25 index: {e}")
+            return False
+        if data.get("version") != BM25_FORMAT_VERSION:
+            return False
+        self.ids, self.lengths, self.fields = data["ids"], data["lengths"], data["fields"]
+        self.postings = {term: {row: tf for row, tf in rows} for term, rows in data["postings"].items()}
+        self._rows = {chunk_id: row for row, chunk_id in enumerate(self.ids)}
+        self._total_length = sum(self.lengths)
+        return True
+
+
+def reciprocal_rank_fusion(rankings: Sequence[Sequence[str]], k: int = 60) -> List[str]:
+    """
+    Merge ranked ID lists by reciprocal rank fusion: score(d) = sum 1 / (k + rank).
+
+    Args:
+        rankings: Ranked lists of chunk IDs, best first
+        k: Damping constant; larger values flatten the contribution of top ranks
+
+    Returns:
+        Chunk IDs ordered by fused score
+    """
+    scores: Dict[str, float] = {}
+    for ranking in rankings:
+        for rank, chunk_id in enumerate(ranking, start=1):
+            scores[chunk_id] = scores.get(chunk_id, 0.0) + 1.0 / (k + rank)
+    return sorted(scores, key=lambda chunk_id: scores[chunk_id], reverse=True)
+
+
+class HybridVectorStore:
+    """
+    Vector store view that fuses vector and BM25 rankings.
+
+    Each retriever contributes its top candidates; documents found only by
+    BM25 are fetched from the vector store by ID.
+    """
+
+    def __init__(self, vector_db, bm25: BM25Index, candidates: int = 20, rrf_k: int = 60):
+        self.vector_db = vector_db
+        self.bm25 = bm25
+        self.candidates = candidates
+        self.rrf_k = rrf_k
+
+    @property
+    def embeddings(self):
+        return self.vector_db.embeddings
+
+    def get(self, ids: Optional[List[str]] = None, include: Sequence[str] = ("documents", "metadatas")) -> Dict:
+        return self.vector_db.get(ids=ids, include=include)
+
+    def similarity_search(self, query: str, k: int = 4, filter: Optional[Dict] = None) -> List[Document]:
+        query_vector = np.asarray([self.vector_db.embeddings.embed_query(query)], dtype=np.float32)
+        return self.batch_search([query], query_vector, k=k, filters=[filter])[0]
+
+    def batch_search(
+        self,
+        queries: List[str],
+        vectors: np.ndarray,
+        k: int = 4,
+        filters: Optional[List[Optional[Dict]]] = None,
+    ) -> List[List[Document]]:
+        """Fuse a batched vector search with per-query BM25; keyword-only hits are fetched in one call."""
+        width = max(k, self.candidates)
+        filters = filters or [None] * len(queries)
+        dense = self.vector_db.batch_search(queries, vectors, k=width, filters=filters)
+        by_id = {document.id: document for documents in dense for document in documents if document.id}
+
+        fused_ids = []
+        for query, documents, filter in zip(queries, dense, filters):
+            keyword_ids = [chunk_id for chunk_id, _ in self.bm25.search(query, k=width, filter=filter)]
+            dense_ids = [document.id for document in documents if document.id]
+            fused_ids.append(reciprocal_rank_fusion([dense_ids, keyword_ids], k=self.rrf_k)[:k])
+
+        missing = sorted({chunk_id for ids in fused_ids for chunk_id in ids if chunk_id not in by_id})
+        if missing:
+            found = self.vector_db.get(ids=missing, include=["documents", "metadatas"])
+            for chunk_id, text, metadata in zip(found["ids"], found["documents"], found["metadatas"]):
+                by_id[chunk_id] = Document(id=chunk_id, page_content=text, metadata=metadata or {})
+        return [[by_id[chunk_id] for chunk_id in ids if chunk_id in by_id] for ids in fused_ids]
@@ -0,0 +1,236 @@
+"""
+Chunking - Structure-aware splitters that cut Markdown per heading, JSON per
+key path and HTML per form or section, with chunk sizes measured in tokens.
+"""
+
+import json
+import re
+import threading
+from pathlib import Path
+from typing import Callable, List, Tuple
+
+from langchain_core.documents import Document
+from langchain_text_splitters import RecursiveCharacterTextSplitter
+
+try:
+    import tiktoken
+    HAS_TIKTOKEN = True
+except ImportError:
+    HAS_TIKTOKEN = False
+
+_encoding = None
+_encoding_lock = threading.Lock()
+_WORD_PATTERN = re.compile(r"\w+|[^\w\s]")
+_HEADING_PATTERN = re.compile(r"^(#{1,6})\s+(.*?)\s*#*\s*$")
+
+
+def _get_encoding():
+    global _encoding
+    with _encoding_lock:
+        if _encoding is None and HAS_TIKTOKEN:
+            try:
+                _encoding = tiktoken.get_encoding("cl100k_base")
+            except Exception as e:
+                # tiktoken downloads its vocabulary on first use; offline machines approximate instead
+                print(f"Warning: Could not load tiktoken encoding, approximating token counts: {e}")
+                _encoding = False
+        return _encoding or None
+
+
+def use_approximate_token_counts() -> None:
+    """
+    Approximate token counts by words and punctuation from now on, even where
+    tiktoken is available, so counts are identical on every machine.
+    """
+    global _encoding
+    with _encoding_lock:
+        _encoding = False
+
+
+def count_tokens(text: str) -> int:
+    """Count tokens with tiktoken's cl100k_base, or approximate by words and punctuation."""
+    encoding = _get_encoding()
+    if encoding is not None:
+        return len(encoding.encode(text, disallowed_special=()))
+    return len(_WORD_PATTERN.findall(text))
+
+
+def truncate_tokens(text: str, max_tokens: int) -> str:
+    """Cut text after its first max_tokens tokens, counted like count_tokens()."""
+    if max_tokens <= 0:
+        return ""
+    encoding = _get_encoding()
+    if encoding is not None:
+        tokens = encoding.encode(text, disallowed_special=())
+        return text if len(tokens) <= max_tokens else encoding.decode(tokens[:max_tokens])
+    for i, match in enumerate(_WORD_PATTERN.finditer(text)):
+        if i == max_tokens - 1:
+            return text[:match.end()]
+    return text
+
+
+def tokenizer_token_counter(tokenizer) -> Callable[[str], int]:
+    """
+    Token counter for a Hugging Face tokenizer, including the special tokens
+    the model adds, so counts match what an embedding model actually reads.
+    """
+    def count(text: str) -> int:
+        return len(tokenizer(text, add_special_tokens=True, truncation=False, verbose=False)["input_ids"])
+    return count
+
+
+def file_type_of(document: Document) -> str:
+    """File type of a loaded document: its file_type metadata, else its source extension."""
+    file_type = document.metadata.get("file_type")
+    if file_type:
+        return file_type
+    return Path(document.metadata.get("source", "")).suffix.lower().lstrip(".") or "txt"
+
+
+class StructureAwareSplitter:
+    """
+    Splits documents along their structure, packing each structural unit
+    into chunks of at most max_tokens tokens.
+
+    Markdown is cut at headings and each chunk is prefixed with its heading
+    path; blank-line separated blocks (paragraphs, whole lists, code fences)
+    are only broken apart when a block alone exceeds the budget. JSON is cut
+    per key path, descending only into values that do not fit. HTML sections
+    from the extractor are kept whole when they fit. Everything else goes
+    through a token-measured recursive splitter with overlap.
+
+    Tokens are counted with length_function, count_tokens() by default; pass
+    the embedding model's tokenizer (see tokenizer_token_counter()) so no
+    chunk is truncated when it is embedded.
+    """
+
+    def __init__(
+        self,
+        max_tokens: int = 256,
+        overlap_tokens: int = 32,
+        length_function: Callable[[str], int] = count_tokens
+    ):
+        self.max_tokens = max_tokens
+        self.length_function = length_function
+        self.fallback = RecursiveCharacterTextSplitter(
+            chunk_size=max_tokens,
+            chunk_overlap=overlap_tokens,
+            length_function=length_function,
+        )
+
+    def split_documents(self, documents: List[Document]) -> List[Document]:
+        chunks = []
+        for document in documents:
+            file_type = file_type_of(document)
+            if file_type in ("md", "markdown"):
+                units = self._split_markdown(document.page_content)
+            elif file_type == "json":
+                units = self._split_json(document.page_content)
+            elif file_type in ("html", "htm"):
+                units = self._split_lines(document.metadata.get("section", ""), document.page_content)
+            else:
+                units = [(document.metadata.get("section", ""), text) for text in self.fallback.split_text(document.page_content)]
+
+            for section, text in units:
+                if not text.strip():
+                    continue
+                metadata = dict(document.metadata, file_type=file_type, tokens=self.length_function(text))
+                if section:
+                    metadata["section"] = section
+                chunks.append(Document(page_content=text, metadata=metadata))
+        return chunks
+
+    def _pack(self, header: str, blocks: List[str], separator: str = "\n\n") -> List[str]:
+        """Greedily pack blocks into chunks of at most max_tokens, each starting with header."""
+        budget = self.max_tokens - (self.length_function(header) if header else 0)
+        chunks, current, current_tokens = [], [], 0
+        for block in blocks:
+            block_tokens = self.length_function(block)
+            if block_tokens > budget:
+                # A single oversized block falls back to the token splitter
+                pieces = self.fallback.split_text(block)
+            else:
+                pieces = [block]
+            for piece in pieces:
+                piece_tokens = block_tokens if len(pieces) == 1 else self.length_function(piece)
+                if current and current_tokens + piece_tokens > budget:
+                    chunks.append(separator.join(current))
+                    current, current_tokens = [], 0
+                current.append(piece)
+                current_tokens += piece_tokens
+        if current:
+            chunks.append(separator.join(current))
+        return [f"{header}\n{chunk}" if header else chunk for chunk in chunks]
+
+    def _split_markdown(self, text: str) -> List[Tuple[str, str]]:
+        sections: List[Tuple[List[str], List[str]]] = [([], [])]
+        path: List[Tuple[int, str]] = []
+        in_fence = False
+        for line in text.splitlines():
+            if line.strip().startswith(("```", "~~~")):
+                in_fence = not in_fence
+            match = None if in_fence else _HEADING_PATTERN.match(line)
+            if match:
+                level = len(match.group(1))
+                path = [(lvl, title) for lvl, title in path if lvl < level] + [(level, match.group(2))]
+                sections.append(([title for _, title in path], []))
+            else:
+                sections[-1][1].append(line)
+
+        units = []
+        for heading_path, lines in sections:
+            body = "\n".join(lines).strip()
+            if not body:
+                continue
+            section = " > ".join(heading_path)
+            header = f"# {section}" if section else ""
+            blocks = [block.strip() for block in re.split(r"\n\s*\n", body) if block.strip()]
+            units.extend((section, chunk) for chunk in self._pack(header, blocks))
+        return units
+
+    def _split_json(self, text: str) -> List[Tuple[str, str]]:
+        try:
+            data = json.loads(text)
+        except json.JSONDecodeError:
+            return [("", chunk) for chunk in self.fallback.split_text(text)]
+
+        units: List[Tuple[str, str]] = []
+        if isinstance(data, (dict, list)) and data:
+            # Always split at the top level (e.g. one chunk per endpoint)
+            for key, value in self._children(data):
+                self._json_units(value, key, units)
+        else:
+            self._json_units(data, "", units)
+        return units
+
+    @staticmethod
+    def _children(value) -> List[Tuple[str, object]]:
+        if isinstance(value, dict):
+            return [(str(key), child) for key, child in value.items()]
+        return [(f"[{index}]", child) for index, child in enumerate(value)]
+
+    def _json_units(self, value, key_path: str, units: List[Tuple[str, str]]) -> None:
+        rendered = json.dumps(value, ensure_ascii=False, indent=1)
+        text = f"{key_path}: {rendered}" if key_path else rendered
+        if self.length_function(text) <= self.max_tokens:
+            units.append((key_path, text))
+            return
+        if not isinstance(value, (dict, list)) or not value:
+            # An oversized scalar (e.g. a long description) cannot be split by key
+            units.extend((key_path, chunk) for chunk in self.fallback.split_text(text))
+            return
+        for key, child in self._children(value):
+            if key.startswith("["):
+                child_path = f"{key_path}{key}"
+            else:
+                child_path = f"{key_path}.{key}" if key_path else key
+            self._json_units(child, child_path, units)
+
+    def _split_lines(self, section: str, text: str) -> List[Tuple[str, str]]:
+        if self.length_function(text) <= self.max_tokens:
+            return [(section, text)]
+        lines = text.splitlines()
+        # Repeat the section heading the extractor put on the first line
+        header = lines[0] if lines and lines[0].startswith("## ") else ""
+        body = lines[1:] if header else lines
+        return [(section, chunk) for chunk in self._pack(header, [line for line in body if line.strip()], separator="\n")]
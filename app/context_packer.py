@@ -0,0 +1,144 @@
+"""
+Context Packer - Selects retrieved chunks by maximal marginal relevance and
+packs them into a prompt token budget, trimming the last one to fit.
+"""
+
+import re
+from typing import List, NamedTuple, Optional, Sequence
+
+import numpy as np
+from langchain_core.documents import Document
+
+from app.chunking import count_tokens, truncate_tokens
+
+_HTML_COMMENT_PATTERN = re.compile(r"<!--.*?-->", re.DOTALL)
+
+
+class PackedContext(NamedTuple):
+    text: str
+    documents: List[Document]  # Selected chunks, in prompt order (the last one may be trimmed)
+    tokens: int
+    tokens_saved: int  # Against joining the top k candidates unpacked
+
+
+def mmr_order(
+    query_vector: Sequence[float],
+    doc_vectors: Sequence[Sequence[float]],
+    lambda_mult: float = 0.5,
+    relevance: Optional[Sequence[float]] = None
+) -> List[int]:
+    """
+    Order candidates by maximal marginal relevance:
+    lambda * relevance(d) - (1 - lambda) * max similarity(d, already selected).
+
+    Args:
+        query_vector: Query embedding
+        doc_vectors: Candidate embeddings
+        lambda_mult: 1.0 ranks by relevance only, 0.0 by diversity only
+        relevance: Relevance scores to use instead of cosine similarity to the query
+
+    Returns:
+        Candidate positions, best first
+    """
+    vectors = np.asarray(doc_vectors, dtype=np.float32)
+    if not len(vectors):
+        return []
+    vectors = vectors / np.maximum(np.linalg.norm(vectors, axis=1, keepdims=True), 1e-12)
+    if relevance is None:
+        query = np.asarray(query_vector, dtype=np.float32)
+        relevance = vectors @ (query / max(float(np.linalg.norm(query)), 1e-12))
+    relevance = np.asarray(relevance, dtype=np.float32)
+
+    order: List[int] = []
+    redundancy = np.zeros(len(vectors), dtype=np.float32)
+    remaining = np.ones(len(vectors), dtype=bool)
+    for _ in range(len(vectors)):
+        scores = np.where(remaining, lambda_mult * relevance - (1.0 - lambda_mult) * redundancy, -np.inf)
+        best = int(np.argmax(scores))
+        order.append(best)
+        remaining[best] = False
+        redundancy = np.maximum(redundancy, vectors @ vectors[best])
+    return order
+
+
+def pack_context(
+    documents: List[Document],
+    token_budget: int,
+    k: Optional[int] = None,
+    query_vector: Optional[Sequence[float]] = None,
+    doc_vectors: Optional[Sequence[Sequence[float]]] = None,
+    lambda_mult: float = 0.5,
+    relevance: Optional[Sequence[float]] = None,
+    min_chunk_tokens: int = 32,
+    separator: str = "\n\n",
+    label_key: Optional[str] = None
+) -> PackedContext:
+    """
+    Pack up to k retrieved chunks into token_budget tokens.
+
+    Chunks are taken in MMR order when vectors are given, else in retrieval
+    order. A chunk that no longer fits is trimmed to the remaining budget,
+    which ends packing, if at least min_chunk_tokens remain; otherwise it is
+    skipped in favour of later, shorter chunks. With label_key, each chunk
+    is preceded by a "[Source: <metadata[label_key]>]" line, counted in the
+    budget, so the model can tell which document a chunk comes from.
+
+    Args:
+        documents: Candidate chunks in retrieval order
+        token_budget: Maximum tokens of the packed text
+        k: Maximum number of chunks (all candidates if None)
+        query_vector: Query embedding, for MMR
+        doc_vectors: Embeddings of documents, for MMR
+        lambda_mult: MMR relevance/diversity trade-off
+        relevance: Optional relevance scores passed to mmr_order
+        min_chunk_tokens: Smallest useful trimmed chunk
+        separator: Text placed between chunks
+        label_key: Metadata key naming each chunk's source (no labels if None)
+
+    Returns:
+        PackedContext with the text, the chosen chunks and token counts
+    """
+    k = len(documents) if k is None else k
+
+    def render(document: Document, content: str) -> str:
+        source = document.metadata.get(label_key) if label_key else None
+        return f"[Source: {source}]\n{content}" if source else content
+
+    baseline = count_tokens(separator.join(render(doc, doc.page_content) for doc in documents[:k]))
+    if query_vector is not None and doc_vectors is not None:
+        order = mmr_order(query_vector, doc_vectors, lambda_mult, relevance)
+    else:
+        order = list(range(len(documents)))
+
+    separator_tokens = count_tokens(separator)
+    selected: List[Document] = []
+    rendered: List[str] = []
+    used = 0
+    for position in order:
+        if len(selected) >= k:
+            break
+        document = documents[position]
+        cost = separator_tokens if selected else 0
+        chunk_text = render(document, document.page_content)
+        tokens = count_tokens(chunk_text)
+        if used + cost + tokens <= token_budget:
+            selected.append(document)
+            rendered.append(chunk_text)
+            used += cost + tokens
+            continue
+        room = token_budget - used - cost - count_tokens(render(document, ""))
+        if room >= min_chunk_tokens:
+            trimmed = truncate_tokens(document.page_content, room)
+            selected.append(Document(id=document.id, page_content=trimmed, metadata={**document.metadata, "trimmed": True}))
+            rendered.append(render(document, trimmed))
+            break
+
+    text = separator.join(rendered)
+    tokens = count_tokens(text)
+    return PackedContext(text, selected, tokens, max(0, baseline - tokens))
+
+
+def compact_html(html: str) -> str:
+    """Drop comments, indentation and blank lines from HTML; tags, attributes and scripts are kept."""
+    html = _HTML_COMMENT_PATTERN.sub("", html)
+    return "\n".join(line.strip() for line in html.splitlines() if line.strip())
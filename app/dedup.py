@@ -0,0 +1,147 @@
+"""
+Near-Duplicate Index - MinHash signatures with LSH banding, used at ingest
+time to drop chunks that are near-copies of chunks already in the index.
+"""
+
+import os
+import re
+import zlib
+from typing import Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+
+_MERSENNE_PRIME = np.uint64((1 << 61) - 1)
+_MAX_HASH = np.uint64((1 << 32) - 1)
+_WORD_PATTERN = re.compile(r"\w+")
+
+SIGNATURES_FILENAME = "near_duplicates.npz"
+
+
+def _lsh_bands(threshold: float, num_perm: int) -> Tuple[int, int]:
+    """
+    Pick (bands, rows) so the LSH S-curve turns at the similarity threshold.
+
+    Two chunks become candidates with probability 1 - (1 - s^rows)^bands,
+    which rises steeply around s = (1 / bands) ** (1 / rows).
+    """
+    best = (num_perm, 1)
+    best_error = float("inf")
+    for rows in range(1, num_perm + 1):
+        bands = num_perm // rows
+        error = abs((1.0 / bands) ** (1.0 / rows) - threshold)
+        if error < best_error:
+            best, best_error = (bands, rows), error
+    return best
+
+
+class NearDuplicateIndex:
+    """
+    MinHash/LSH index of chunk signatures.
+
+    Texts are normalized to lowercase word shingles; check() reports the key
+    of an indexed chunk whose estimated Jaccard similarity is at least
+    threshold, or indexes the new chunk and returns None.
+    """
+
+    def __init__(self, threshold: float = 0.9, num_perm: int = 128, shingle_size: int = 3, seed: int = 1):
+        self.threshold = threshold
+        self.num_perm = num_perm
+        self.shingle_size = shingle_size
+        self.bands, self.rows = _lsh_bands(threshold, num_perm)
+        generator = np.random.RandomState(seed)
+        self._a = generator.randint(1, (1 << 61) - 1, size=num_perm, dtype=np.uint64)
+        self._b = generator.randint(0, (1 << 61) - 1, size=num_perm, dtype=np.uint64)
+        self.signatures: Dict[str, np.ndarray] = {}
+        self._buckets: List[Dict[bytes, List[str]]] = [{} for _ in range(self.bands)]
+
+    def __len__(self) -> int:
+        return len(self.signatures)
+
+    def signature(self, text: str) -> Optional[np.ndarray]:
+        """MinHash signature of a text, or None if it has no words."""
+        words = _WORD_PATTERN.findall(text.lower())
+        if not words:
+            return None
+        size = min(self.shingle_size, len(words))
+        shingles = {" ".join(words[i:i + size]) for i in range(len(words) - size + 1)}
+        hashes = np.fromiter((zlib.crc32(s.encode("utf-8")) for s in shingles), dtype=np.uint64, count=len(shingles))
+        # Universal hashing (a * x + b) mod p, wrapping in uint64 like datasketch
+        with np.errstate(over="ignore"):
+            permuted = (np.outer(hashes, self._a) + self._b) % _MERSENNE_PRIME & _MAX_HASH
+        return permuted.min(axis=0)
+
+    def _band_keys(self, signature: np.ndarray) -> List[bytes]:
+        return [signature[i * self.rows:(i + 1) * self.rows].tobytes() for i in range(self.bands)]
+
+    def find(self, signature: np.ndarray) -> Optional[str]:
+        """Key of an indexed chunk whose estimated similarity reaches the threshold."""
+        seen = set()
+        for bucket, band_key in zip(self._buckets, self._band_keys(signature)):
+            for key in bucket.get(band_key, ()):
+                if key in seen:
+                    continue
+                seen.add(key)
+                if np.mean(self.signatures[key] == signature) >= self.threshold:
+                    return key
+        return None
+
+    def add(self, key: str, signature: np.ndarray) -> None:
+        self.signatures[key] = signature
+        for bucket, band_key in zip(self._buckets, self._band_keys(signature)):
+            bucket.setdefault(band_key, []).append(key)
+
+    def check(self, key: str, text: str) -> Optional[str]:
+        """
+        Look up a chunk and index it if it is new.
+
+        Args:
+            key: Chunk ID
+            text: Chunk text
+
+        Returns:
+            Key of the chunk it duplicates, or None if it was indexed as new
+        """
+        signature = self.signature(text)
+        if signature is None:
+            return None
+        original = self.find(signature)
+        if original is None:
+            self.add(key, signature)
+        return original
+
+    def remove(self, keys: Iterable[str]) -> None:
+        for key in keys:
+            signature = self.signatures.pop(key, None)
+            if signature is None:
+                continue
+            for bucket, band_key in zip(self._buckets, self._band_keys(signature)):
+                members = bucket.get(band_key, [])
+                if key in members:
+                    members.remove(key)
+                if not members:
+                    bucket.pop(band_key, None)
+
+    def save(self, db_path: str) -> None:
+        """Write the signatures next to the vector database."""
+        keys = list(self.signatures)
+        matrix = np.stack([self.signatures[k] for k in keys]) if keys else np.zeros((0, self.num_perm), dtype=np.uint64)
+        path = os.path.join(db_path, SIGNATURES_FILENAME)
+        tmp_path = path + ".tmp.npz"
+        np.savez(tmp_path, keys=np.array(keys, dtype=str), signatures=matrix)
+        os.replace(tmp_path, path)
+
+    def load(self, db_path: str) -> None:
+        """Index the signatures stored next to the vector database, if any."""
+        path = os.path.join(db_path, SIGNATURES_FILENAME)
+        if not os.path.exists(path):
+            return
+        try:
+            with np.load(path) as data:
+                keys, matrix = data["keys"], data["signatures"]
+        except (OSError, ValueError, KeyError) as e:
+            print(f"Warning: Could not read near-duplicate signatures: {e}")
+            return
+        if matrix.ndim != 2 or (len(keys) and matrix.shape[1] != self.num_perm):
+            return
+        for key, signature in zip(keys, matrix):
+            self.add(str(key), signature)
@@ -0,0 +1,191 @@
+"""
+Embedding Cache - Persists embedding vectors on disk so identical chunks and
+queries skip the model forward pass on later builds and searches.
+"""
+
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+from array import array
+from typing import List, Optional
+
+from langchain_core.embeddings import Embeddings
+
+
+def embedding_key(model_name: str, text: str) -> str:
+    """Cache key for a (model, text) pair."""
+    return hashlib.sha256(f"{model_name}\0{text}".encode("utf-8")).hexdigest()
+
+
+class EmbeddingCache:
+    """
+    SQLite-backed vector cache with size-bounded LRU eviction.
+
+    Entries are keyed by embedding_key(); a hit refreshes the entry's
+    last-used timestamp once it is more than touch_interval seconds old, so
+    warm reads stay read-only, and the least recently used entries are
+    evicted once the cache holds more than max_entries vectors. The entry
+    count is read once and then tracked from each write.
+    """
+
+    def __init__(self, path: str, max_entries: int = 100_000, touch_interval: float = 3600.0):
+        self.path = path
+        self.max_entries = max_entries
+        self.touch_interval = touch_interval
+        self._lock = threading.Lock()
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS embeddings ("
+            "key TEXT PRIMARY KEY, vector BLOB NOT NULL, last_used REAL NOT NULL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_last_used ON embeddings(last_used)")
+        self._conn.commit()
+        self._size = self._conn.execute("SELECT COUNT(*) FROM embeddings").fetchone()[0]
+
+    def __len__(self) -> int:
+        return self._size
+
+    def get_many(self, keys: List[str]) -> List[Optional[List[float]]]:
+        """
+        Look up vectors for the given keys.
+
+        Args:
+            keys: Cache keys
+
+        Returns:
+            List aligned with keys holding the cached vector or None on a miss
+        """
+        found = {}
+        stale = []
+        now = time.time()
+        with self._lock:
+            # Stay well below SQLite's bound-parameter limit
+            for start in range(0, len(keys), 500):
+                batch = keys[start:start + 500]
+                placeholders = ",".join("?" * len(batch))
+                rows = self._conn.execute(
+                    f"SELECT key, vector, last_used FROM embeddings WHERE key IN ({placeholders})", batch
+                ).fetchall()
+                for key, blob, last_used in rows:
+                    vector = array("f")
+                    vector.frombytes(blob)
+                    found[key] = vector.tolist()
+                    if now - last_used > self.touch_interval:
+                        stale.append(key)
+            if stale:
+                self._conn.executemany(
+                    "UPDATE embeddings SET last_used = ? WHERE key = ?",
+                    [(now, key) for key in stale],
+                )
+                self._conn.commit()
+        return [found.get(key) for key in keys]
+
+    def put_many(self, keys: List[str], vectors: List[List[float]]) -> None:
+        """
+        Store vectors and evict the least recently used entries beyond max_entries.
+
+        Args:
+            keys: Cache keys
+            vectors: Embedding vectors aligned with keys
+        """
+        now = time.time()
+        rows = [(key, array("f", vector).tobytes(), now) for key, vector in zip(keys, vectors)]
+        with self._lock:
+            # New keys are counted from the insert itself; existing ones are overwritten afterwards
+            inserted = self._conn.executemany(
+                "INSERT OR IGNORE INTO embeddings (key, vector, last_used) VALUES (?, ?, ?)", rows
+            ).rowcount
+            if inserted < len(rows):
+                self._conn.executemany(
+                    "UPDATE embeddings SET vector = ?, last_used = ? WHERE key = ?",
+                    [(blob, used, key) for key, blob, used in rows]
+                )
+            self._size += inserted
+            overflow = self._size - self.max_entries
+            if overflow > 0:
+                self._conn.execute(
+                    "DELETE FROM embeddings WHERE key IN "
+                    "(SELECT key FROM embeddings ORDER BY last_used ASC LIMIT ?)",
+                    (overflow,),
+                )
+                self._size -= overflow
+            self._conn.commit()
+
+    def clear(self) -> None:
+        """Remove every cached vector."""
+        with self._lock:
+            self._conn.execute("DELETE FROM embeddings")
+            self._conn.commit()
+            self._size = 0
+
+
+class CachedEmbeddings(Embeddings):
+    """
+    Embeddings wrapper that serves vectors from an EmbeddingCache and only
+    sends cache misses to the underlying model.
+    """
+
+    def __init__(self, embeddings: Embeddings, cache: EmbeddingCache, model_name: str):
+        self.embeddings = embeddings
+        self.cache = cache
+        self.model_name = model_name
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        keys = [embedding_key(self.model_name, text) for text in texts]
+        vectors = self.cache.get_many(keys)
+
+        # Embed each distinct missing text once
+        missing = {}
+        for i, vector in enumerate(vectors):
+            if vector is None:
+                missing.setdefault(keys[i], texts[i])
+        if missing:
+            missing_keys = list(missing)
+            computed = self.embeddings.embed_documents([missing[key] for key in missing_keys])
+            # Round-trip through float32 so hits and misses return identical vectors
+            computed = [array("f", vector).tolist() for vector in computed]
+            self.cache.put_many(missing_keys, computed)
+            by_key = dict(zip(missing_keys, computed))
+            vectors = [vector if vector is not None else by_key[key] for key, vector in zip(keys, vectors)]
+        return vectors
+
+    def embed_query(self, text: str) -> List[float]:
+        # Queries are namespaced separately: some models embed queries differently
+        key = embedding_key(self.model_name, f"query\0{text}")
+        vector = self.cache.get_many([key])[0]
+        if vector is None:
+            vector = array("f", self.embeddings.embed_query(text)).tolist()
+            self.cache.put_many([key], [vector])
+        return vector
+
+    def embed_queries(self, texts: List[str]) -> List[List[float]]:
+        """
+        Embed many queries, sending all cache misses to the model in one call.
+
+        Models configured with a query instruction or query-specific encode
+        arguments are asked one query at a time through embed_query().
+        """
+        keys = [embedding_key(self.model_name, f"query\0{text}") for text in texts]
+        vectors = self.cache.get_many(keys)
+        missing = {}
+        for i, vector in enumerate(vectors):
+            if vector is None:
+                missing.setdefault(keys[i], texts[i])
+        if missing:
+            missing_keys = list(missing)
+            missing_texts = [missing[key] for key in missing_keys]
+            if getattr(self.embeddings, "query_instruction", None) or getattr(self.embeddings, "query_encode_kwargs", None):
+                computed = [self.embeddings.embed_query(text) for text in missing_texts]
+            else:
+                computed = self.embeddings.embed_documents(missing_texts)
+            computed = [array("f", vector).tolist() for vector in computed]
+            self.cache.put_many(missing_keys, computed)
+            by_key = dict(zip(missing_keys, computed))
+            vectors = [vector if vector is not None else by_key[key] for key, vector in zip(keys, vectors)]
+        return vectors
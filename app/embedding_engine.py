@@ -0,0 +1,109 @@
+"""
+Embedding Engine - Spreads large embedding batches across a pool of worker
+processes, each running its own copy of the sentence-transformers model with
+a pinned number of threads.
+"""
+
+import multiprocessing
+import os
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, List, Optional
+
+from langchain_core.embeddings import Embeddings
+
+# Per-process model, set by _init_worker() in each pool worker
+_worker_model = None
+
+
+def _init_worker(model_name: str, threads: int):
+    """Pin the worker's thread pools and load the model once per process."""
+    global _worker_model
+    # Must be set before torch is imported in this process
+    for var in ("OMP_NUM_THREADS", "MKL_NUM_THREADS", "OPENBLAS_NUM_THREADS"):
+        os.environ[var] = str(threads)
+    os.environ["TOKENIZERS_PARALLELISM"] = "false"
+
+    import torch
+    from sentence_transformers import SentenceTransformer
+
+    torch.set_num_threads(threads)
+    _worker_model = SentenceTransformer(model_name, device="cpu")
+
+
+def _encode(texts: List[str]) -> List[List[float]]:
+    return _worker_model.encode(texts, batch_size=len(texts), show_progress_bar=False).tolist()
+
+
+class EmbeddingEngine(Embeddings):
+    """
+    Embeddings implementation that encodes large calls in a process pool.
+
+    Calls with fewer than 2 * batch_size texts, and all queries, go to the
+    in-process local model, so small incremental builds never pay for
+    starting workers. The pool is started on the first large call and lives
+    until close().
+    """
+
+    def __init__(
+        self,
+        model_name: str,
+        local: Embeddings,
+        workers: int,
+        threads_per_worker: int = 1,
+        batch_size: int = 32,
+    ):
+        self.model_name = model_name
+        self.local = local
+        self.workers = max(1, workers)
+        self.threads_per_worker = max(1, threads_per_worker)
+        self.batch_size = max(1, batch_size)
+        self._pool: Optional[ProcessPoolExecutor] = None
+        self._lock = threading.Lock()
+        self._embedded = 0
+        self._seconds = 0.0
+
+    def _get_pool(self) -> ProcessPoolExecutor:
+        with self._lock:
+            if self._pool is None:
+                self._pool = ProcessPoolExecutor(
+                    max_workers=self.workers,
+                    mp_context=multiprocessing.get_context("spawn"),
+                    initializer=_init_worker,
+                    initargs=(self.model_name, self.threads_per_worker),
+                )
+            return self._pool
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        start = time.perf_counter()
+        if self.workers <= 1 or len(texts) < 2 * self.batch_size:
+            vectors = self.local.embed_documents(texts)
+        else:
+            batches = [texts[i:i + self.batch_size] for i in range(0, len(texts), self.batch_size)]
+            vectors = []
+            for batch_vectors in self._get_pool().map(_encode, batches):
+                vectors.extend(batch_vectors)
+        self._embedded += len(texts)
+        self._seconds += time.perf_counter() - start
+        return vectors
+
+    def embed_query(self, text: str) -> List[float]:
+        return self.local.embed_query(text)
+
+    def stats(self) -> Dict:
+        """Number of texts embedded, time spent and throughput in chunks/sec."""
+        return {
+            "embedded": self._embedded,
+            "seconds": round(self._seconds, 3),
+            "chunks_per_sec": round(self._embedded / self._seconds, 1) if self._seconds else 0.0,
+            "workers": self.workers,
+            "threads_per_worker": self.threads_per_worker,
+        }
+
+    def close(self) -> None:
+        """Shut down the worker pool."""
+        with self._lock:
+            if self._pool is not None:
+                self._pool.shutdown()
+                self._pool = None
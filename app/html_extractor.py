@@ -0,0 +1,197 @@
+"""
+HTML Extractor - Streams an HTML page with lxml and emits one Document per
+form or section, keeping the element IDs, names and onclick handlers that
+Selenium scripts need as chunk metadata.
+"""
+
+from typing import Iterator, List, Optional
+
+from lxml import etree
+from langchain_core.documents import Document
+
+# Elements that open their own chunk
+CONTAINER_TAGS = {"form", "section", "article", "fieldset", "nav", "header", "footer", "main", "aside", "dialog"}
+HEADING_TAGS = {"h1", "h2", "h3", "h4", "h5", "h6"}
+# Elements whose text is never page content
+SKIP_TAGS = {"style", "noscript", "template", "svg"}
+INTERACTIVE_TAGS = {"input", "button", "select", "textarea", "a", "label", "option", "img"}
+
+
+def _selector(element) -> Optional[str]:
+    """Most specific CSS selector for an element, preferring id over name."""
+    tag = element.tag
+    element_id = element.get("id")
+    if element_id:
+        return f"#{element_id}"
+    name = element.get("name")
+    if name:
+        value = element.get("value")
+        if value and element.get("type") in ("radio", "checkbox"):
+            return f"{tag}[name='{name}'][value='{value}']"
+        return f"{tag}[name='{name}']"
+    onclick = element.get("onclick")
+    if onclick and '"' not in onclick:
+        return f'{tag}[onclick="{onclick}"]'
+    return None
+
+
+def _describe(element) -> str:
+    """One-line description of an interactive element, e.g. [button#payBtn onclick=processPayment()]."""
+    parts = [element.tag]
+    if element.get("id"):
+        parts[0] += f"#{element.get('id')}"
+    for attr in ("name", "type", "value", "for", "placeholder", "onclick", "onchange", "onsubmit", "href"):
+        if element.get(attr):
+            parts.append(f"{attr}={element.get(attr)}")
+    return f"[{' '.join(parts)}]"
+
+
+class _SectionBuilder:
+    """Accumulates text and element attributes of the current section."""
+
+    def __init__(self, source: str, page_title: str = ""):
+        self.source = source
+        self.page_title = page_title
+        self.stack: List[str] = []  # Titles of the open container elements
+        self.title = ""
+        self.lines: List[str] = []
+        self.ids: List[str] = []
+        self.names: List[str] = []
+        self.onclick: List[str] = []
+        self.selectors: List[str] = []
+        self.index = 0
+
+    def add_text(self, text: Optional[str]):
+        if text and text.strip():
+            self.lines.append(" ".join(text.split()))
+
+    def add_element(self, element):
+        if element.get("id"):
+            self.ids.append(element.get("id"))
+        if element.get("name") and element.get("name") not in self.names:
+            self.names.append(element.get("name"))
+        for attr in ("onclick", "onchange", "onsubmit"):
+            if element.get(attr):
+                self.onclick.append(element.get(attr))
+        selector = _selector(element)
+        if selector and selector not in self.selectors:
+            self.selectors.append(selector)
+        if element.tag in INTERACTIVE_TAGS or element.get("onclick"):
+            self.lines.append(_describe(element))
+
+    def flush(self, next_title: str = "") -> Optional[Document]:
+        document = None
+        if self.lines:
+            section = " > ".join(t for t in self.stack + [self.title] if t) or self.page_title or "page"
+            content = "\n".join([f"## {section}"] + self.lines)
+            document = Document(
+                page_content=content,
+                metadata={
+                    "source": self.source,
+                    "file_type": "html",
+                    "section": section,
+                    "chunk_index": self.index,
+                    # Chroma metadata must be scalar, so lists are joined
+                    "element_ids": ",".join(self.ids),
+                    "element_names": ",".join(self.names),
+                    "onclick": "; ".join(self.onclick),
+                    "selectors": "; ".join(self.selectors),
+                },
+            )
+            self.index += 1
+        self.title = next_title
+        self.lines, self.ids, self.names, self.onclick, self.selectors = [], [], [], [], []
+        return document
+
+
+def _walk(element, builder: _SectionBuilder) -> Iterator[Document]:
+    """Visit an element subtree in document order, emitting finished sections."""
+    tag = element.tag if isinstance(element.tag, str) else None
+    if tag is None or tag in SKIP_TAGS:
+        return
+
+    if tag == "script":
+        # Inline scripts hold validation logic and the exact user-facing messages
+        if element.text and element.text.strip():
+            previous_title = builder.title
+            document = builder.flush("script")
+            if document:
+                yield document
+            builder.lines.append(element.text.strip())
+            document = builder.flush(previous_title)
+            if document:
+                yield document
+        return
+
+    if tag in HEADING_TAGS:
+        document = builder.flush(" ".join("".join(element.itertext()).split()))
+        if document:
+            yield document
+        builder.add_element(element)
+        return
+
+    if tag in CONTAINER_TAGS:
+        document = builder.flush()
+        if document:
+            yield document
+        label = element.get("id") or element.get("name") or element.get("aria-label") or ""
+        builder.stack.append(f"{tag}#{label}" if label else tag)
+
+    builder.add_element(element)
+    builder.add_text(element.text)
+    for child in element:
+        yield from _walk(child, builder)
+        builder.add_text(child.tail)
+
+    if tag in CONTAINER_TAGS:
+        document = builder.flush()
+        if document:
+            yield document
+        builder.stack.pop()
+
+
+def iter_html_sections(file_path: str) -> Iterator[Document]:
+    """
+    Stream an HTML file and yield one Document per form, section or heading block.
+
+    Each top-level body element is processed once it has been fully parsed
+    and then freed, so memory stays bounded by the largest block rather than
+    the whole page.
+
+    Args:
+        file_path: Path to the HTML file
+
+    Yields:
+        Documents with element IDs, names, onclick handlers and selectors in metadata
+    """
+    builder = _SectionBuilder(file_path)
+    body = None
+    for _, element in etree.iterparse(file_path, events=("end",), html=True, remove_comments=True):
+        parent = element.getparent()
+        if element.tag == "title" and not builder.page_title:
+            builder.page_title = " ".join((element.text or "").split())
+        if parent is None or parent.tag != "body":
+            continue
+        body = parent
+        # The previous sibling's tail is complete once this element has ended
+        previous = element.getprevious()
+        if previous is not None:
+            builder.add_text(previous.tail)
+        else:
+            builder.add_text(parent.text)
+        yield from _walk(element, builder)
+        # Free the processed siblings
+        while element.getprevious() is not None:
+            del parent[0]
+
+    if body is not None and len(body):
+        builder.add_text(body[-1].tail)
+    document = builder.flush()
+    if document:
+        yield document
+
+
+def load_html(file_path: str) -> List[Document]:
+    """Load an HTML file as a list of section Documents."""
+    return list(iter_html_sections(file_path))
+
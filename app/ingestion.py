@@ -0,0 +1,336 @@
+"""
+Ingestion Pipeline - Streams files through load -> split -> embed -> upsert in
+fixed-size batches so memory stays flat regardless of corpus size.
+"""
+
+import multiprocessing
+import os
+import queue
+import threading
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from typing import Callable, Dict, Iterable, Iterator, List, NamedTuple, Optional, Tuple
+
+from langchain_community.document_loaders import TextLoader
+from langchain_core.documents import Document
+
+from app.html_extractor import load_html
+from app.pdf_extractor import HAS_PYMUPDF, count_pdf_pages, extract_pdf_pages, load_pdf
+
+_DONE = object()
+
+
+def _load_text(file_path: str) -> List[Document]:
+    return TextLoader(file_path).load()
+
+
+# Format-specific parsers, keyed by file extension
+PARSERS: Dict[str, Callable[[str], List[Document]]] = {
+    ".md": _load_text,
+    ".txt": _load_text,
+    ".json": _load_text,
+    ".html": load_html,
+    ".htm": load_html,
+}
+if HAS_PYMUPDF:
+    PARSERS[".pdf"] = load_pdf
+
+
+def discover_files(data_dir: str) -> Dict[str, str]:
+    """
+    Find every file with a registered parser in a single directory walk.
+
+    Hidden files and directories are skipped.
+
+    Args:
+        data_dir: Root directory to scan
+
+    Returns:
+        Mapping of POSIX path relative to data_dir -> full path, sorted by relative path
+    """
+    files = {}
+    for root, dirs, names in os.walk(data_dir):
+        dirs[:] = [d for d in dirs if not d.startswith(".")]
+        for name in names:
+            if name.startswith(".") or Path(name).suffix.lower() not in PARSERS:
+                continue
+            full_path = os.path.join(root, name)
+            files[Path(os.path.relpath(full_path, data_dir)).as_posix()] = full_path
+    return dict(sorted(files.items()))
+
+
+def load_file(file_path: str) -> List[Document]:
+    """Load one file with the parser registered for its extension."""
+    return PARSERS[Path(file_path).suffix.lower()](file_path)
+
+
+class FilePart(NamedTuple):
+    """Chunks of one file, or of one page range of a PDF."""
+    rel_path: str
+    documents: int
+    chunks: List[Document]
+    last: bool  # True for the final part of the file
+    error: Optional[Exception] = None
+
+
+def _plan_tasks(
+    files: Iterable[Tuple[str, str]],
+    pages_per_task: int,
+) -> List[Tuple[str, str, Optional[Tuple[int, int]], bool]]:
+    """Split the work into (rel_path, abs_path, page range or None, last) tasks; PDFs get one task per page range."""
+    tasks = []
+    for rel_path, abs_path in files:
+        if HAS_PYMUPDF and Path(abs_path).suffix.lower() == ".pdf":
+            try:
+                page_count = count_pdf_pages(abs_path)
+            except Exception:
+                # Let the parser surface the error for this file
+                page_count = 0
+            ranges = [(start, min(start + pages_per_task, page_count)) for start in range(0, page_count, pages_per_task)]
+            for i, page_range in enumerate(ranges):
+                tasks.append((rel_path, abs_path, page_range, i == len(ranges) - 1))
+            if ranges:
+                continue
+        tasks.append((rel_path, abs_path, None, True))
+    return tasks
+
+
+def _run_task(load: Callable[[str], List[Document]], abs_path: str, pages: Optional[Tuple[int, int]]) -> List[Document]:
+    if pages is None:
+        return load(abs_path)
+    return extract_pdf_pages(abs_path, *pages)
+
+
+def _load_in_pool(
+    tasks: List[Tuple[str, str, Optional[Tuple[int, int]], bool]],
+    load: Callable[[str], List[Document]],
+    workers: int,
+    max_in_flight: int,
+) -> Iterator[Tuple[str, bool, Optional[List[Document]], Optional[Exception]]]:
+    # "spawn" avoids forking a process that already runs threads and torch
+    context = multiprocessing.get_context("spawn")
+    with ProcessPoolExecutor(max_workers=workers, mp_context=context) as pool:
+        pending = deque()
+        remaining = iter(tasks)
+        for rel_path, abs_path, pages, last in remaining:
+            pending.append((rel_path, last, pool.submit(_run_task, load, abs_path, pages)))
+            if len(pending) >= max_in_flight:
+                break
+        while pending:
+            rel_path, last, future = pending.popleft()
+            try:
+                yield rel_path, last, future.result(), None
+            except Exception as e:
+                yield rel_path, last, None, e
+            # Keep the pool busy, but never more than max_in_flight tasks ahead
+            for next_rel_path, abs_path, pages, next_last in remaining:
+                pending.append((next_rel_path, next_last, pool.submit(_run_task, load, abs_path, pages)))
+                break
+
+
+def _load_serially(
+    tasks: List[Tuple[str, str, Optional[Tuple[int, int]], bool]],
+    load: Callable[[str], List[Document]],
+) -> Iterator[Tuple[str, bool, Optional[List[Document]], Optional[Exception]]]:
+    for rel_path, abs_path, pages, last in tasks:
+        try:
+            yield rel_path, last, _run_task(load, abs_path, pages), None
+        except Exception as e:
+            yield rel_path, last, None, e
+
+
+def iter_file_chunks(
+    files: Iterable[Tuple[str, str]],
+    split_documents: Callable[[List[Document]], List[Document]],
+    load: Callable[[str], List[Document]] = load_file,
+    workers: int = 1,
+    parallel_min_tasks: int = 32,
+    pdf_pages_per_task: int = 16,
+) -> Iterator[FilePart]:
+    """
+    Load and split files, optionally parsing them in a process pool.
+
+    PDFs are cut into page ranges of pdf_pages_per_task pages, each parsed as
+    its own task, so a single large PDF is extracted by every worker at once
+    and its pages reach the chunker range by range. With workers > 1,
+    parsing runs in worker processes while results are yielded in input
+    order whenever a PDF spans more than one page range or there are at
+    least parallel_min_tasks tasks; smaller jobs are parsed in-process since
+    spawning workers would cost more.
+
+    Args:
+        files: Iterable of (relative path, absolute path)
+        split_documents: Splits documents into chunks
+        load: Loads the documents of one file (must be picklable for the pool)
+        workers: Number of parser processes
+        parallel_min_tasks: Minimum number of tasks before the pool is used for files that are not split
+        pdf_pages_per_task: Pages per PDF extraction task
+
+    Yields:
+        FilePart per file or PDF page range; a failed part carries the error.
+        Every chunk is tagged with its relative path as "source_file" metadata.
+    """
+    tasks = _plan_tasks(files, max(1, pdf_pages_per_task))
+    # Only a PDF cut into several ranges has a page-range task that is not its last
+    has_split_pdf = any(pages is not None and not last for _, _, pages, last in tasks)
+    if workers > 1 and (has_split_pdf or len(tasks) >= parallel_min_tasks):
+        loaded = _load_in_pool(tasks, load, workers, max_in_flight=workers * 2)
+    else:
+        loaded = _load_serially(tasks, load)
+
+    for rel_path, last, docs, error in loaded:
+        if error is not None:
+            yield FilePart(rel_path, 0, [], last, error)
+        else:
+            chunks = split_documents(docs)
+            for chunk in chunks:
+                chunk.metadata["source_file"] = rel_path
+            yield FilePart(rel_path, len(docs), chunks, last)
+
+
+def prefetch(items: Iterator, max_pending: int) -> Iterator:
+    """
+    Produce items in a background thread while the caller consumes them.
+
+    At most max_pending items are buffered: once the buffer is full the
+    producer blocks until the consumer catches up (backpressure). Exceptions
+    raised by the producer are re-raised in the consumer.
+
+    Args:
+        items: Iterator to drain in the background
+        max_pending: Maximum number of buffered items
+
+    Yields:
+        The items of the iterator, in order
+    """
+    buffer = queue.Queue(maxsize=max(1, max_pending))
+    stop = threading.Event()
+
+    def _put(item) -> bool:
+        while not stop.is_set():
+            try:
+                buffer.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def _produce():
+        try:
+            for item in items:
+                if not _put((None, item)):
+                    return
+            _put((None, _DONE))
+        except BaseException as e:
+            _put((e, None))
+
+    producer = threading.Thread(target=_produce, name="ingest-prefetch", daemon=True)
+    producer.start()
+    try:
+        while True:
+            error, item = buffer.get()
+            if error is not None:
+                raise error
+            if item is _DONE:
+                return
+            yield item
+    finally:
+        stop.set()
+        producer.join()
+
+
+def run_ingestion(
+    file_parts: Iterator[FilePart],
+    make_ids: Callable[[str, int, int], List[str]],
+    add_batch: Callable[[List[Document], List[str]], None],
+    total_files: int,
+    batch_size: int = 256,
+    max_pending: int = 4,
+    progress_callback: Optional[Callable[[Dict], None]] = None,
+    remove_ids: Optional[Callable[[List[str]], None]] = None,
+    is_duplicate: Optional[Callable[[Document, str], bool]] = None,
+) -> Tuple[Dict[str, List[str]], Dict]:
+    """
+    Embed and upsert streamed chunks in batches of batch_size.
+
+    Loading and splitting run ahead in a background thread, bounded by
+    max_pending parts, while the calling thread embeds and upserts. Files
+    that fail to load are skipped with a warning so the next build retries
+    them; chunks already stored from earlier parts of such a file are
+    removed again through remove_ids. Chunks for which is_duplicate returns
+    True are dropped before embedding; the remaining chunks keep the IDs
+    they would have had without the filter.
+
+    Args:
+        file_parts: Output of iter_file_chunks()
+        make_ids: Builds chunk IDs for (relative path, first chunk index, chunk count)
+        add_batch: Embeds and stores one batch of chunks with their IDs
+        total_files: Number of files expected, for progress reporting
+        batch_size: Number of chunks embedded and upserted at a time
+        max_pending: Number of split parts allowed to wait for embedding
+        progress_callback: Called after every batch with a progress dict
+        remove_ids: Deletes stored chunks by ID
+        is_duplicate: Called with (chunk, chunk ID); True drops the chunk
+
+    Returns:
+        Tuple of (chunk IDs per successfully ingested file, stats dict)
+    """
+    stats = {"files": 0, "total_files": total_files, "documents": 0, "chunks": 0, "batches": 0, "chunks_per_sec": 0.0, "duplicates": 0}
+    file_chunk_ids = {}
+    partial_ids: Dict[str, List[str]] = {}
+    partial_counts: Dict[str, int] = {}
+    failed = set()
+    batch, batch_ids = [], []
+    start = time.perf_counter()
+
+    def _flush():
+        add_batch(batch, batch_ids)
+        stats["chunks"] += len(batch)
+        stats["batches"] += 1
+        elapsed = time.perf_counter() - start
+        stats["chunks_per_sec"] = round(stats["chunks"] / elapsed, 1) if elapsed else 0.0
+        batch.clear()
+        batch_ids.clear()
+        if progress_callback:
+            progress_callback(dict(stats))
+
+    for part in prefetch(file_parts, max_pending):
+        if part.rel_path in failed:
+            continue
+        if part.error is not None:
+            print(f"Warning: Error loading {part.rel_path}: {part.error}")
+            failed.add(part.rel_path)
+            stored = partial_ids.pop(part.rel_path, [])
+            if stored and remove_ids:
+                if batch:
+                    _flush()
+                remove_ids(stored)
+            continue
+
+        ids_so_far = partial_ids.setdefault(part.rel_path, [])
+        # Chunk indices continue across the parts of a file, duplicates included
+        first = partial_counts.get(part.rel_path, 0)
+        partial_counts[part.rel_path] = first + len(part.chunks)
+        ids = make_ids(part.rel_path, first, len(part.chunks))
+        stats["documents"] += part.documents
+        for chunk, chunk_id in zip(part.chunks, ids):
+            if is_duplicate and is_duplicate(chunk, chunk_id):
+                stats["duplicates"] += 1
+                continue
+            ids_so_far.append(chunk_id)
+            batch.append(chunk)
+            batch_ids.append(chunk_id)
+            if len(batch) >= batch_size:
+                _flush()
+        if part.last:
+            file_chunk_ids[part.rel_path] = partial_ids.pop(part.rel_path)
+            partial_counts.pop(part.rel_path, None)
+            stats["files"] += 1
+
+    if batch:
+        _flush()
+    elif progress_callback:
+        progress_callback(dict(stats))
+    return file_chunk_ids, stats
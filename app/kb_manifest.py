@@ -0,0 +1,170 @@
+"""
+Knowledge Base Manifest - Tracks per-file content hashes and chunk IDs so the
+vector store can be updated incrementally instead of rebuilt from scratch.
+"""
+
+import hashlib
+import json
+import os
+from typing import Dict, List, Optional
+
+MANIFEST_FILENAME = "kb_manifest.json"
+MANIFEST_VERSION = 1
+
+
+def hash_file(file_path: str, block_size: int = 1 << 20) -> str:
+    """
+    Compute the SHA-256 hash of a file's contents.
+
+    Args:
+        file_path: Path to the file
+        block_size: Number of bytes to read at a time
+
+    Returns:
+        Hex digest of the file contents
+    """
+    digest = hashlib.sha256()
+    with open(file_path, "rb") as f:
+        for block in iter(lambda: f.read(block_size), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def empty_manifest(embedding_model: Optional[str] = None, pipeline_version: Optional[int] = None) -> Dict:
+    """Return a manifest with no tracked files."""
+    return {
+        "version": MANIFEST_VERSION,
+        "embedding_model": embedding_model,
+        "pipeline_version": pipeline_version,
+        "files": {},
+    }
+
+
+def load_manifest(db_path: str) -> Dict:
+    """
+    Load the manifest stored alongside the vector database.
+
+    Args:
+        db_path: Vector database directory
+
+    Returns:
+        The stored manifest, or an empty manifest if none exists or it is unreadable
+    """
+    manifest_path = os.path.join(db_path, MANIFEST_FILENAME)
+    if not os.path.exists(manifest_path):
+        return empty_manifest()
+
+    try:
+        with open(manifest_path, "r", encoding="utf-8") as f:
+            manifest = json.load(f)
+    except (OSError, json.JSONDecodeError) as e:
+        print(f"Warning: Could not read knowledge base manifest: {e}")
+        return empty_manifest()
+
+    if manifest.get("version") != MANIFEST_VERSION or not isinstance(manifest.get("files"), dict):
+        return empty_manifest()
+    return manifest
+
+
+def save_manifest(db_path: str, manifest: Dict) -> None:
+    """
+    Atomically write the manifest next to the vector database.
+
+    Args:
+        db_path: Vector database directory
+        manifest: Manifest dictionary to persist
+    """
+    os.makedirs(db_path, exist_ok=True)
+    manifest_path = os.path.join(db_path, MANIFEST_FILENAME)
+    tmp_path = manifest_path + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(manifest, f, indent=2, sort_keys=True)
+    os.replace(tmp_path, manifest_path)
+
+
+def scan_file_states(files: Dict[str, str], manifest: Dict) -> Dict[str, Dict]:
+    """
+    Collect the current hash, size and mtime of each file.
+
+    Files whose size and mtime match the manifest reuse the stored hash, so
+    unchanged files are never re-read.
+
+    Args:
+        files: Mapping of relative path -> absolute path
+        manifest: Previously stored manifest
+
+    Returns:
+        Mapping of relative path -> {"hash", "size", "mtime"}
+    """
+    tracked = manifest.get("files", {})
+    states = {}
+    for rel_path, abs_path in files.items():
+        stat = os.stat(abs_path)
+        previous = tracked.get(rel_path)
+        if previous and previous.get("size") == stat.st_size and previous.get("mtime") == stat.st_mtime_ns:
+            file_hash = previous["hash"]
+        else:
+            file_hash = hash_file(abs_path)
+        states[rel_path] = {"hash": file_hash, "size": stat.st_size, "mtime": stat.st_mtime_ns}
+    return states
+
+
+def diff_manifest(manifest: Dict, states: Dict[str, Dict]) -> Dict[str, List[str]]:
+    """
+    Compare the stored manifest with the current file states.
+
+    Args:
+        manifest: Previously stored manifest
+        states: Output of scan_file_states()
+
+    Returns:
+        Dict with sorted "added", "changed", "removed" and "unchanged" relative paths
+    """
+    tracked = manifest.get("files", {})
+    added, changed, unchanged = [], [], []
+    for rel_path, state in states.items():
+        previous = tracked.get(rel_path)
+        if previous is None:
+            added.append(rel_path)
+        elif previous.get("hash") != state["hash"]:
+            changed.append(rel_path)
+        else:
+            unchanged.append(rel_path)
+    removed = [rel_path for rel_path in tracked if rel_path not in states]
+
+    return {
+        "added": sorted(added),
+        "changed": sorted(changed),
+        "removed": sorted(removed),
+        "unchanged": sorted(unchanged),
+    }
+
+
+def stale_chunk_ids(manifest: Dict, rel_paths: List[str]) -> List[str]:
+    """Return the chunk IDs stored for the given files."""
+    tracked = manifest.get("files", {})
+    ids = []
+    for rel_path in rel_paths:
+        ids.extend(tracked.get(rel_path, {}).get("chunk_ids", []))
+    return ids
+
+
+def make_chunk_ids(rel_path: str, file_hash: str, count: int, start: int = 0) -> List[str]:
+    """
+    Build deterministic chunk IDs for a file version.
+
+    Args:
+        rel_path: File path relative to the data directory
+        file_hash: Content hash of the file
+        count: Number of chunks to build IDs for
+        start: Index of the first chunk, for files ingested in several parts
+
+    Returns:
+        List of chunk IDs, one per chunk
+    """
+    return [f"{rel_path}::{file_hash[:16]}::{i}" for i in range(start, start + count)]
+
+
+def chunk_id_path(chunk_id: str) -> str:
+    """Return the relative file path a chunk ID was built from."""
+    return chunk_id.rsplit("::", 2)[0]
@@ -0,0 +1,123 @@
+"""
+LLM Cache - Persists LLM responses on disk, keyed by the fully rendered
+prompt, model and temperature, so repeated generations skip the model call.
+"""
+
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+from typing import Optional
+
+
+def llm_cache_key(model_name: str, temperature: float, prompt: str) -> str:
+    """Cache key for a (model, temperature, rendered prompt) triple."""
+    return hashlib.sha256(f"{model_name}\0{temperature!r}\0{prompt}".encode("utf-8")).hexdigest()
+
+
+class LLMResponseCache:
+    """
+    SQLite-backed response cache with time-to-live and size-bounded LRU
+    eviction.
+
+    Entries older than ttl_seconds are never served and are purged on the
+    next write; beyond max_entries the least recently used entries are
+    evicted. Like EmbeddingCache, a hit only refreshes the entry's last-used
+    timestamp once it is more than touch_interval seconds old, and the
+    entry count is tracked from each write rather than counted.
+    """
+
+    def __init__(
+        self,
+        path: str,
+        max_entries: int = 5_000,
+        ttl_seconds: Optional[float] = 7 * 24 * 3600,
+        touch_interval: float = 3600.0
+    ):
+        self.path = path
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.touch_interval = touch_interval
+        self._lock = threading.Lock()
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS responses ("
+            "key TEXT PRIMARY KEY, response TEXT NOT NULL, created REAL NOT NULL, last_used REAL NOT NULL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_responses_last_used ON responses(last_used)")
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_responses_created ON responses(created)")
+        self._conn.commit()
+        self._size = self._conn.execute("SELECT COUNT(*) FROM responses").fetchone()[0]
+
+    def __len__(self) -> int:
+        return self._size
+
+    def _oldest_fresh(self, now: float) -> float:
+        return now - self.ttl_seconds if self.ttl_seconds is not None else float("-inf")
+
+    def get(self, key: str) -> Optional[str]:
+        """
+        Look up a response.
+
+        Args:
+            key: Cache key from llm_cache_key()
+
+        Returns:
+            The cached response, or None if missing or expired
+        """
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT response, last_used FROM responses WHERE key = ? AND created >= ?", (key, self._oldest_fresh(now))
+            ).fetchone()
+            if row is None:
+                return None
+            if now - row[1] > self.touch_interval:
+                self._conn.execute("UPDATE responses SET last_used = ? WHERE key = ?", (now, key))
+                self._conn.commit()
+        return row[0]
+
+    def put(self, key: str, response: str) -> None:
+        """
+        Store a response, purge expired entries and evict the least recently
+        used ones beyond max_entries.
+
+        Args:
+            key: Cache key from llm_cache_key()
+            response: Raw LLM response text
+        """
+        now = time.time()
+        with self._lock:
+            inserted = self._conn.execute(
+                "INSERT OR IGNORE INTO responses (key, response, created, last_used) VALUES (?, ?, ?, ?)",
+                (key, response, now, now),
+            ).rowcount
+            if not inserted:
+                self._conn.execute(
+                    "UPDATE responses SET response = ?, created = ?, last_used = ? WHERE key = ?",
+                    (response, now, now, key),
+                )
+            self._size += inserted
+            self._size -= self._conn.execute(
+                "DELETE FROM responses WHERE created < ?", (self._oldest_fresh(now),)
+            ).rowcount
+            overflow = self._size - self.max_entries
+            if overflow > 0:
+                self._size -= self._conn.execute(
+                    "DELETE FROM responses WHERE key IN "
+                    "(SELECT key FROM responses ORDER BY last_used ASC LIMIT ?)",
+                    (overflow,),
+                ).rowcount
+            self._conn.commit()
+
+    def clear(self) -> None:
+        """Remove every cached response."""
+        with self._lock:
+            self._conn.execute("DELETE FROM responses")
+            self._conn.commit()
+            self._size = 0
@@ -0,0 +1,188 @@
+"""
+LLM Cassette - Records LLM responses to a cassette file, keyed by request,
+and replays them offline, with simulated latency, for reproducible pipeline
+runs.
+"""
+
+import hashlib
+import json
+import os
+import threading
+import time
+from typing import Any, Dict, Iterator, Optional
+
+from langchain_core.messages import BaseMessage
+from langchain_core.prompt_values import PromptValue
+from langchain_core.runnables import Runnable
+
+from app.llm_router import simulated_stream
+
+CASSETTE_MODES = ("record", "replay")
+# Run-config key ("configurable") holding the stable identity of a request, e.g. template name and query
+CASSETTE_REQUEST_CONFIG_KEY = "cassette_request"
+
+
+class CassetteMissError(Exception):
+    """Raised in replay mode for a request the cassette has no (matching) response for."""
+
+
+def cassette_key(text: str) -> str:
+    """Cassette key of a request identity or rendered prompt."""
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+def _request_identity(config: Any) -> Optional[str]:
+    return ((config or {}).get("configurable") or {}).get(CASSETTE_REQUEST_CONFIG_KEY)
+
+
+def _prompt_text(input: Any) -> str:
+    if isinstance(input, PromptValue):
+        return input.to_string()
+    if isinstance(input, list):
+        return "\n".join(message.content if isinstance(message, BaseMessage) else str(message) for message in input)
+    return str(input)
+
+
+def _response_text(response: Any) -> str:
+    content = getattr(response, "content", response)
+    return content if isinstance(content, str) else str(content)
+
+
+class LLMCassette:
+    """
+    Request -> response pairs stored as JSON lines, each with the hash of
+    the prompt it was recorded for.
+
+    Recording appends one line per call, so an interrupted run keeps what it
+    recorded; when a request is recorded twice the later response wins.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._entries: Dict[str, Dict] = {}
+        self._lock = threading.Lock()
+        if os.path.exists(path):
+            with open(path, "r", encoding="utf-8") as f:
+                for line in f:
+                    if line.strip():
+                        entry = json.loads(line)
+                        self._entries[entry["key"]] = entry
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get(self, key: str) -> Optional[Dict]:
+        """Recorded entry (response, prompt_hash, model, latency_seconds) for a cassette key, or None."""
+        return self._entries.get(key)
+
+    def record(self, key: str, prompt: str, response: str, model: str, latency: float) -> None:
+        entry = {
+            "key": key,
+            "prompt_hash": cassette_key(prompt),
+            "model": model,
+            "latency_seconds": round(latency, 4),
+            "prompt": prompt,
+            "response": response,
+        }
+        with self._lock:
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            with open(self.path, "a", encoding="utf-8") as f:
+                f.write(json.dumps(entry, ensure_ascii=False) + "\n")
+            self._entries[entry["key"]] = entry
+
+
+class CassetteLLM(Runnable):
+    """
+    LLM stand-in backed by a cassette.
+
+    In record mode every call goes to llm and the rendered prompt and
+    response text are saved; in replay mode responses come from the
+    cassette after sleeping latency seconds, or the recorded latency if
+    latency is None. Both modes return the response text.
+
+    Responses are keyed by the request identity passed in the run config as
+    {"configurable": {CASSETTE_REQUEST_CONFIG_KEY: identity}}, so a replay
+    still matches when retrieval or token counting renders a slightly
+    different prompt; calls without one are keyed by the rendered prompt.
+    With strict set, a replayed response must also have been recorded for
+    the identical prompt.
+    """
+
+    def __init__(
+        self,
+        cassette: LLMCassette,
+        mode: str = "replay",
+        llm: Optional[Any] = None,
+        latency: Optional[float] = None,
+        model_name: str = "unknown",
+        strict: bool = False
+    ):
+        if mode not in CASSETTE_MODES:
+            raise ValueError(f"Unknown cassette mode: {mode}")
+        if mode == "record" and llm is None:
+            raise ValueError("Recording a cassette needs an LLM to record from")
+        self.cassette = cassette
+        self.mode = mode
+        self.llm = llm
+        self.latency = latency
+        self.model_name = model_name
+        self.strict = strict
+
+    def _replay(self, prompt: str, config: Any) -> Dict:
+        identity = _request_identity(config)
+        key = cassette_key(identity if identity is not None else prompt)
+        # Cassettes recorded before request identities were keyed by prompt
+        entry = self.cassette.get(key) or self.cassette.get(cassette_key(prompt))
+        if entry is None:
+            raise CassetteMissError(
+                f"No recorded response for this request (key {key[:12]}) in {self.cassette.path}. "
+                "Record the run first with model_type='record'."
+            )
+        if self.strict and entry.get("prompt_hash", entry["key"]) != cassette_key(prompt):
+            raise CassetteMissError(
+                f"The response recorded for this request (key {key[:12]}) in {self.cassette.path} "
+                "was recorded for a different prompt."
+            )
+        return entry
+
+    def _record(self, prompt: str, config: Any, response: str, latency: float) -> None:
+        identity = _request_identity(config)
+        self.cassette.record(
+            cassette_key(identity if identity is not None else prompt), prompt, response, self.model_name, latency
+        )
+
+    def _replay_latency(self, entry: Dict) -> float:
+        return self.latency if self.latency is not None else entry.get("latency_seconds", 0.0)
+
+    def invoke(self, input: Any, config: Any = None, **kwargs) -> str:
+        prompt = _prompt_text(input)
+        if self.mode == "record":
+            start = time.perf_counter()
+            response = _response_text(self.llm.invoke(input, config, **kwargs))
+            self._record(prompt, config, response, time.perf_counter() - start)
+            return response
+
+        entry = self._replay(prompt, config)
+        time.sleep(self._replay_latency(entry))
+        return entry["response"]
+
+    def stream(self, input: Any, config: Any = None, **kwargs) -> Iterator[str]:
+        """
+        Stream the response text. Recording streams from the LLM and saves
+        the joined text once it is complete; replays yield it word by word
+        with the latency spread across the words.
+        """
+        prompt = _prompt_text(input)
+        if self.mode == "record":
+            start = time.perf_counter()
+            pieces = []
+            for chunk in self.llm.stream(input, config, **kwargs):
+                pieces.append(_response_text(chunk))
+                yield pieces[-1]
+            self._record(prompt, config, "".join(pieces), time.perf_counter() - start)
+            return
+
+        entry = self._replay(prompt, config)
+        yield from simulated_stream(entry["response"], self._replay_latency(entry))
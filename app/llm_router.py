@@ -0,0 +1,320 @@
+"""
+LLM Router - Sends each request to the fastest healthy LLM provider, using
+rolling latency and error statistics, per-provider circuit breakers and
+optional hedged requests.
+"""
+
+import math
+import random
+import re
+import threading
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from typing import Any, Callable, Dict, Iterator, List, Optional, Sequence, Tuple
+
+from langchain_core.prompt_values import PromptValue
+from langchain_core.runnables import Runnable
+
+CLOSED, OPEN, HALF_OPEN = "closed", "open", "half_open"
+# Run-config key ("configurable") holding the provider order fixed by the caller for one request
+ROUTE_CONFIG_KEY = "llm_route"
+_STREAM_CHUNK_PATTERN = re.compile(r"\s*\S+\s*|\s+")
+
+
+def simulated_stream(text: str, seconds: float) -> Iterator[str]:
+    """Yield text word by word, spreading seconds of simulated latency across the words."""
+    chunks = _STREAM_CHUNK_PATTERN.findall(text) or [text]
+    for chunk in chunks:
+        time.sleep(seconds / len(chunks))
+        yield chunk
+
+
+def _percentile(sorted_values: List[float], fraction: float) -> Optional[float]:
+    """Nearest-rank percentile of an ascending list, or None if it is empty."""
+    if not sorted_values:
+        return None
+    return sorted_values[max(0, math.ceil(fraction * len(sorted_values)) - 1)]
+
+
+class ProviderHealth:
+    """
+    Rolling latency and error statistics plus a circuit breaker per provider.
+
+    Statistics cover the last window calls that are younger than
+    max_age_seconds, so old samples such as a slow cold start stop counting.
+    A provider's breaker opens after failure_threshold consecutive failures,
+    or when its recent error rate reaches max_error_rate (once min_samples
+    recent calls are recorded). After reset_seconds an open breaker turns
+    half-open and lets requests through as health checks: a success closes
+    it, a failure opens it again.
+    """
+
+    def __init__(
+        self,
+        window: int = 50,
+        failure_threshold: int = 3,
+        max_error_rate: float = 0.5,
+        min_samples: int = 10,
+        reset_seconds: float = 30.0,
+        max_age_seconds: Optional[float] = 300.0,
+        explore_every: int = 0
+    ):
+        self.window = window
+        self.failure_threshold = failure_threshold
+        self.max_error_rate = max_error_rate
+        self.min_samples = min_samples
+        self.reset_seconds = reset_seconds
+        self.max_age_seconds = max_age_seconds
+        self.explore_every = explore_every
+        self._calls: Dict[str, deque] = {}
+        self._consecutive_failures: Dict[str, int] = {}
+        self._opened_at: Dict[str, float] = {}
+        self._ranked = 0
+        self._lock = threading.Lock()
+
+    def _recent(self, provider: str) -> List[Tuple[float, bool]]:
+        # Must be called with self._lock held
+        calls = self._calls.get(provider, ())
+        oldest = time.monotonic() - self.max_age_seconds if self.max_age_seconds is not None else -math.inf
+        return [(latency, ok) for at, latency, ok in calls if at >= oldest]
+
+    def _last_call(self, provider: str) -> float:
+        with self._lock:
+            calls = self._calls.get(provider)
+            return calls[-1][0] if calls else -math.inf
+
+    def _state(self, provider: str) -> str:
+        opened_at = self._opened_at.get(provider)
+        if opened_at is None:
+            return CLOSED
+        return HALF_OPEN if time.monotonic() - opened_at >= self.reset_seconds else OPEN
+
+    def record(self, provider: str, latency: float, ok: bool) -> None:
+        """Record the outcome of one call and update the provider's breaker."""
+        with self._lock:
+            calls = self._calls.setdefault(provider, deque(maxlen=self.window))
+            calls.append((time.monotonic(), latency, ok))
+            if ok:
+                self._consecutive_failures[provider] = 0
+                self._opened_at.pop(provider, None)
+                return
+            failures = self._consecutive_failures.get(provider, 0) + 1
+            self._consecutive_failures[provider] = failures
+            recent = self._recent(provider)
+            error_rate = sum(1 for _, success in recent if not success) / len(recent)
+            if (
+                self._state(provider) == HALF_OPEN
+                or failures >= self.failure_threshold
+                or (len(recent) >= self.min_samples and error_rate >= self.max_error_rate)
+            ):
+                self._opened_at[provider] = time.monotonic()
+
+    def stats(self, provider: str) -> Dict:
+        """p50/p95 latency of recent successful calls, recent error rate and call count, and breaker state."""
+        with self._lock:
+            calls = self._recent(provider)
+            state = self._state(provider)
+        latencies = sorted(latency for latency, ok in calls if ok)
+        return {
+            "state": state,
+            "calls": len(calls),
+            "error_rate": round(sum(1 for _, ok in calls if not ok) / len(calls), 4) if calls else 0.0,
+            "p50_seconds": _percentile(latencies, 0.5),
+            "p95_seconds": _percentile(latencies, 0.95),
+        }
+
+    def rank(self, providers: Sequence[str]) -> List[str]:
+        """
+        Providers whose breaker lets requests through, fastest recent p50
+        first. Providers without a recent successful call follow in the given
+        (preference) order, those with errors last.
+
+        With explore_every set, every explore_every-th ranking moves the
+        provider called longest ago (or never) to the front, so unmeasured
+        and slower providers are measured again and stale statistics recover.
+        """
+        with self._lock:
+            self._ranked += 1
+            explore = bool(self.explore_every) and self._ranked % self.explore_every == 0
+        ranked = []
+        for position, provider in enumerate(providers):
+            stats = self.stats(provider)
+            if stats["state"] == OPEN:
+                continue
+            p50 = stats["p50_seconds"]
+            ranked.append((p50 if p50 is not None else math.inf, stats["error_rate"], position, provider))
+        order = [provider for *_, provider in sorted(ranked)]
+        if explore and len(order) > 1:
+            stalest = min(order[1:], key=self._last_call)
+            order.remove(stalest)
+            order.insert(0, stalest)
+        return order
+
+
+class LLMRouter(Runnable):
+    """
+    Runnable that invokes the fastest healthy of several LLM clients.
+
+    Failed calls fall through to the next provider. With hedge_after set, a
+    request still unanswered after that many seconds is also sent to the
+    next provider and the first answer wins; the slower call finishes in
+    the background and still counts towards its provider's statistics.
+
+    Callers that need to know the serving provider before the call (e.g. to
+    size the prompt) fix the order with route() and pass it in the run
+    config as {"configurable": {ROUTE_CONFIG_KEY: order}}.
+    """
+
+    def __init__(
+        self,
+        clients: Dict[str, Callable[[], Any]],
+        health: ProviderHealth,
+        hedge_after: Optional[float] = None
+    ):
+        """
+        Args:
+            clients: Provider name -> zero-argument callable returning its LLM client, in order of preference
+            health: Statistics shared by every router of the process
+            hedge_after: Seconds before a request is hedged (None disables hedging)
+        """
+        self.clients = clients
+        self.health = health
+        self.hedge_after = hedge_after
+        self._executor = ThreadPoolExecutor(max_workers=max(2, 2 * len(clients)), thread_name_prefix="llm-hedge")
+
+    @property
+    def providers(self) -> List[str]:
+        return list(self.clients)
+
+    def _call(self, provider: str, input: Any, config: Any, **kwargs) -> Any:
+        start = time.perf_counter()
+        try:
+            result = self.clients[provider]().invoke(input, config, **kwargs)
+        except Exception:
+            self.health.record(provider, time.perf_counter() - start, ok=False)
+            raise
+        self.health.record(provider, time.perf_counter() - start, ok=True)
+        return result
+
+    def route(self) -> List[str]:
+        """Providers to try for one request, in order (see ProviderHealth.rank())."""
+        candidates = self.health.rank(self.providers)
+        if not candidates:
+            raise Exception(
+                f"All LLM providers are unavailable (circuit open): {', '.join(self.providers)}. "
+                f"Retrying in up to {self.health.reset_seconds:g}s."
+            )
+        return candidates
+
+    def _candidates(self, config: Any) -> List[str]:
+        """The order fixed in the run config, minus providers whose circuit has opened since; else a new route."""
+        route = ((config or {}).get("configurable") or {}).get(ROUTE_CONFIG_KEY)
+        if route:
+            route = [p for p in route if p in self.clients and self.health.stats(p)["state"] != OPEN]
+        return route or self.route()
+
+    def invoke(self, input: Any, config: Any = None, **kwargs) -> Any:
+        candidates = self._candidates(config)
+        if self.hedge_after is None or len(candidates) < 2:
+            return self._invoke_in_order(candidates, input, config, **kwargs)
+        return self._invoke_hedged(candidates, input, config, **kwargs)
+
+    def stream(self, input: Any, config: Any = None, **kwargs) -> Iterator[Any]:
+        """
+        Stream from the fastest healthy provider. A provider failing before
+        its first chunk falls through to the next one; streams are not hedged.
+        """
+        errors = []
+        for provider in self._candidates(config):
+            start = time.perf_counter()
+            started = False
+            try:
+                for chunk in self.clients[provider]().stream(input, config, **kwargs):
+                    started = True
+                    yield chunk
+            except Exception as e:
+                self.health.record(provider, time.perf_counter() - start, ok=False)
+                if started:
+                    raise
+                print(f"Warning: LLM provider {provider} failed, trying the next one: {e}")
+                errors.append(f"{provider}: {e}")
+                continue
+            self.health.record(provider, time.perf_counter() - start, ok=True)
+            return
+        raise Exception("All LLM providers failed. " + "; ".join(errors))
+
+    def _invoke_in_order(self, candidates: List[str], input: Any, config: Any, **kwargs) -> Any:
+        errors = []
+        for provider in candidates:
+            try:
+                return self._call(provider, input, config, **kwargs)
+            except Exception as e:
+                print(f"Warning: LLM provider {provider} failed, trying the next one: {e}")
+                errors.append(f"{provider}: {e}")
+        raise Exception("All LLM providers failed. " + "; ".join(errors))
+
+    def _invoke_hedged(self, candidates: List[str], input: Any, config: Any, **kwargs) -> Any:
+        remaining = list(candidates)
+        running = {}
+        errors = []
+
+        def launch():
+            provider = remaining.pop(0)
+            running[self._executor.submit(self._call, provider, input, config, **kwargs)] = provider
+
+        launch()
+        while running:
+            done, _ = wait(running, timeout=self.hedge_after if remaining else None, return_when=FIRST_COMPLETED)
+            if not done:
+                print(f"LLM provider {', '.join(running.values())} slower than {self.hedge_after:g}s, hedging with {remaining[0]}")
+                launch()
+                continue
+            for future in done:
+                provider = running.pop(future)
+                try:
+                    return future.result()
+                except Exception as e:
+                    print(f"Warning: LLM provider {provider} failed: {e}")
+                    errors.append(f"{provider}: {e}")
+            if remaining and not running:
+                launch()
+        raise Exception("All LLM providers failed. " + "; ".join(errors))
+
+
+class StubLLM(Runnable):
+    """
+    Local stand-in LLM for exercising the router without a network: answers
+    after latency seconds (plus up to jitter), fails with probability
+    fail_rate, and replies with response or else echoes the prompt.
+    """
+
+    def __init__(
+        self,
+        response: Optional[str] = None,
+        latency: float = 0.0,
+        jitter: float = 0.0,
+        fail_rate: float = 0.0,
+        seed: Optional[int] = None
+    ):
+        self.response = response
+        self.latency = latency
+        self.jitter = jitter
+        self.fail_rate = fail_rate
+        self._random = random.Random(seed)
+
+    def _respond(self, input: Any) -> str:
+        if self._random.random() < self.fail_rate:
+            raise ConnectionError("Stub LLM simulated failure")
+        if self.response is not None:
+            return self.response
+        return input.to_string() if isinstance(input, PromptValue) else str(input)
+
+    def invoke(self, input: Any, config: Any = None, **kwargs) -> str:
+        time.sleep(self.latency + self._random.uniform(0.0, self.jitter))
+        return self._respond(input)
+
+    def stream(self, input: Any, config: Any = None, **kwargs) -> Iterator[str]:
+        """Yield the response word by word, with the latency spread across the words."""
+        response = self._respond(input)
+        yield from simulated_stream(response, self.latency + self._random.uniform(0.0, self.jitter))
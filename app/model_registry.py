@@ -0,0 +1,90 @@
+"""
+Model Registry - Loads expensive models once per process and shares them
+between threads, with optional background warm-up.
+"""
+
+import threading
+from typing import Any, Callable, Dict, Optional
+
+
+class ModelRegistry:
+    """
+    Thread-safe registry of lazily loaded models.
+
+    Each key is loaded at most once: concurrent callers for the same key wait
+    for the first load to finish, while different keys load independently.
+    A failed load is not cached, so the next caller retries it.
+    """
+
+    def __init__(self):
+        self._models: Dict[str, Any] = {}
+        self._key_locks: Dict[str, threading.Lock] = {}
+        self._warmups: Dict[str, threading.Thread] = {}
+        self._lock = threading.Lock()
+
+    def _key_lock(self, key: str) -> threading.Lock:
+        with self._lock:
+            return self._key_locks.setdefault(key, threading.Lock())
+
+    def get(self, key: str, factory: Callable[[], Any]) -> Any:
+        """
+        Return the model for key, loading it with factory on first use.
+
+        Args:
+            key: Registry key, e.g. the model name
+            factory: Zero-argument callable that loads the model
+
+        Returns:
+            The shared model instance
+        """
+        model = self._models.get(key)
+        if model is not None:
+            return model
+        with self._key_lock(key):
+            model = self._models.get(key)
+            if model is None:
+                model = factory()
+                self._models[key] = model
+            return model
+
+    def warm_up(self, key: str, factory: Callable[[], Any]) -> Optional[threading.Thread]:
+        """
+        Start loading a model in a background daemon thread.
+
+        Args:
+            key: Registry key
+            factory: Zero-argument callable that loads the model
+
+        Returns:
+            The warm-up thread, or None if the model is already loaded
+        """
+        if key in self._models:
+            return None
+
+        def _load():
+            try:
+                self.get(key, factory)
+            except Exception as e:
+                print(f"Warning: Background warm-up of {key} failed: {e}")
+
+        with self._lock:
+            thread = self._warmups.get(key)
+            if thread is not None and thread.is_alive():
+                return thread
+            thread = threading.Thread(target=_load, name=f"warmup-{key}", daemon=True)
+            self._warmups[key] = thread
+        thread.start()
+        return thread
+
+    def is_loaded(self, key: str) -> bool:
+        """Check whether a model has finished loading."""
+        return key in self._models
+
+    def evict(self, key: str) -> None:
+        """Drop a loaded model so the next get() reloads it."""
+        with self._key_lock(key):
+            self._models.pop(key, None)
+
+
+# Shared by every module in the process
+registry = ModelRegistry()
@@ -0,0 +1,60 @@
+"""
+PDF Extractor - Extracts PDF text page by page with PyMuPDF so page ranges
+can be parsed in parallel and streamed into the chunker.
+"""
+
+from typing import List
+
+from langchain_core.documents import Document
+
+try:
+    import pymupdf
+    HAS_PYMUPDF = True
+except ImportError:
+    try:
+        import fitz as pymupdf  # PyMuPDF < 1.24.3
+        HAS_PYMUPDF = True
+    except ImportError:
+        HAS_PYMUPDF = False
+
+
+def count_pdf_pages(file_path: str) -> int:
+    """Number of pages in a PDF (only the cross-reference table is read)."""
+    with pymupdf.open(file_path) as pdf:
+        return pdf.page_count
+
+
+def extract_pdf_pages(file_path: str, start: int, end: int) -> List[Document]:
+    """
+    Extract the text of pages [start, end) as one Document per page.
+
+    Args:
+        file_path: Path to the PDF
+        start: First page index (0-based, inclusive)
+        end: Last page index (0-based, exclusive)
+
+    Returns:
+        Documents with "page" (1-based) and "total_pages" metadata; blank pages are skipped
+    """
+    documents = []
+    with pymupdf.open(file_path) as pdf:
+        total_pages = pdf.page_count
+        for index in range(start, min(end, total_pages)):
+            text = pdf.load_page(index).get_text("text")
+            if not text.strip():
+                continue
+            documents.append(Document(
+                page_content=text,
+                metadata={
+                    "source": file_path,
+                    "file_type": "pdf",
+                    "page": index + 1,
+                    "total_pages": total_pages,
+                },
+            ))
+    return documents
+
+
+def load_pdf(file_path: str) -> List[Document]:
+    """Load every page of a PDF in-process."""
+    return extract_pdf_pages(file_path, 0, count_pdf_pages(file_path))
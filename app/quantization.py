@@ -0,0 +1,342 @@
+"""
+Quantized Vectors - Compact float16/int8 copies of the embedding matrix, with
+optional PCA, searched approximately and re-scored exactly on a few candidates.
+"""
+
+import os
+from typing import Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+
+import numpy as np
+from langchain_core.documents import Document
+
+STORAGE_MODES = ("float32", "float16", "int8")
+COMPACT_FILENAME = "compact_vectors.npz"
+
+
+class QuantizedVectors:
+    """
+    Embedding matrix stored as float16 or per-dimension int8 codes.
+
+    With pca_dims set, vectors are first projected onto their top principal
+    components. Distances are squared L2, like Chroma's default space, and
+    are computed without materializing the dequantized matrix.
+    """
+
+    def __init__(self, mode: str = "int8", pca_dims: Optional[int] = None):
+        if mode not in STORAGE_MODES:
+            raise ValueError(f"Unknown vector storage mode: {mode}")
+        self.mode = mode
+        self.pca_dims = pca_dims
+        self.mean: Optional[np.ndarray] = None
+        self.components: Optional[np.ndarray] = None
+        self.low: Optional[np.ndarray] = None
+        self.scale: Optional[np.ndarray] = None
+        self.codes = np.zeros((0, 0), dtype=np.float32)
+        self.norms = np.zeros(0, dtype=np.float32)
+
+    def __len__(self) -> int:
+        return len(self.codes)
+
+    @property
+    def nbytes(self) -> int:
+        """Memory used by the codes and the decoding parameters."""
+        extra = [a for a in (self.mean, self.components, self.low, self.scale) if a is not None]
+        return self.codes.nbytes + self.norms.nbytes + sum(a.nbytes for a in extra)
+
+    def project(self, vectors: np.ndarray) -> np.ndarray:
+        if self.components is None:
+            return vectors
+        return (vectors - self.mean) @ self.components
+
+    def fit(self, vectors: np.ndarray) -> "QuantizedVectors":
+        """Fit the projection and quantization ranges on vectors and encode them."""
+        vectors = np.asarray(vectors, dtype=np.float32)
+        if vectors.ndim != 2:
+            vectors = vectors.reshape(0, 0)
+        return self.fit_blocks(lambda: iter([vectors]), len(vectors), vectors.shape[1])
+
+    def fit_blocks(self, blocks: Callable[[], Iterable[np.ndarray]], count: int, dims: int) -> "QuantizedVectors":
+        """
+        Fit and encode count vectors of dims dimensions that are read block by
+        block, so only one block of float32 rows is in memory at a time.
+
+        Args:
+            blocks: Returns an iterable over the row blocks; it is called once
+                per pass (up to three) and must yield the same rows each time
+            count: Total number of rows
+            dims: Dimensions of the vectors
+
+        Returns:
+            self
+        """
+        if self.pca_dims and count > 1 and self.pca_dims < dims:
+            # Principal components from the covariance matrix, accumulated in float64
+            total = np.zeros(dims, dtype=np.float64)
+            gram = np.zeros((dims, dims), dtype=np.float64)
+            for block in blocks():
+                block = np.asarray(block, dtype=np.float64)
+                total += block.sum(axis=0)
+                gram += block.T @ block
+            mean = total / count
+            eigenvalues, eigenvectors = np.linalg.eigh(gram / count - np.outer(mean, mean))
+            top = np.argsort(eigenvalues)[::-1][:self.pca_dims]
+            self.mean = mean.astype(np.float32)
+            self.components = np.ascontiguousarray(eigenvectors[:, top], dtype=np.float32)
+        out_dims = self.components.shape[1] if self.components is not None else dims
+
+        if self.mode == "int8":
+            low = np.full(out_dims, np.inf, dtype=np.float32)
+            high = np.full(out_dims, -np.inf, dtype=np.float32)
+            for block in blocks():
+                projected = self.project(np.asarray(block, dtype=np.float32))
+                if len(projected):
+                    low = np.minimum(low, projected.min(axis=0))
+                    high = np.maximum(high, projected.max(axis=0))
+            if not count:
+                low, high = np.zeros(out_dims, dtype=np.float32), np.ones(out_dims, dtype=np.float32)
+            span = high - low
+            self.low = low
+            self.scale = np.where(span > 0, span / 255.0, 1.0).astype(np.float32)
+
+        self.codes = np.empty((count, out_dims), dtype={"int8": np.int8, "float16": np.float16}.get(self.mode, np.float32))
+        self.norms = np.empty(count, dtype=np.float32)
+        start = 0
+        for block in blocks():
+            projected = self.project(np.asarray(block, dtype=np.float32))
+            end = start + len(projected)
+            if self.mode == "int8":
+                self.codes[start:end] = np.round((projected - self.low) / self.scale) - 128
+            else:
+                self.codes[start:end] = projected
+            self.norms[start:end] = np.square(self._decode(self.codes[start:end])).sum(axis=1)
+            start = end
+        return self
+
+    def _decode(self, codes: np.ndarray) -> np.ndarray:
+        if self.mode == "int8":
+            return (codes.astype(np.float32) + 128.0) * self.scale + self.low
+        return codes.astype(np.float32)
+
+    def dequantize(self, rows: Optional[np.ndarray] = None) -> np.ndarray:
+        """Approximate (projected) vectors for the given row indices, or all rows."""
+        return self._decode(self.codes if rows is None else self.codes[rows])
+
+    def distances(self, queries: np.ndarray) -> np.ndarray:
+        """
+        Approximate squared L2 distances from one query (shape (d,)) or a
+        query matrix (shape (m, d)) to every stored vector.
+        """
+        q = self.project(np.asarray(queries, dtype=np.float32))
+        if self.mode == "int8":
+            # x = (c + 128) * scale + low, so q.x = c.(q * scale) + 128 * sum(q * scale) + q.low
+            weighted = q * self.scale
+            offset = 128.0 * weighted.sum(axis=-1) + q @ self.low
+            dots = _dot(self.codes, weighted) + np.expand_dims(offset, -1)
+        else:
+            dots = _dot(self.codes, q)
+        return self.norms - 2.0 * dots + np.expand_dims(np.square(q).sum(axis=-1), -1)
+
+    def search(self, query: np.ndarray, top_n: int) -> np.ndarray:
+        """Row indices of the top_n nearest stored vectors, nearest first."""
+        return top_k_indices(self.distances(query), top_n)
+
+    def search_many(self, queries: np.ndarray, top_n: int) -> List[np.ndarray]:
+        """search() for every row of a query matrix, scanning the codes once."""
+        return [top_k_indices(row, top_n) for row in self.distances(queries)]
+
+    def save(self, db_path: str, ids: List[str]) -> None:
+        """Write the codes and their chunk IDs next to the vector database."""
+        arrays = {"ids": np.array(ids, dtype=str), "codes": self.codes, "norms": self.norms, "mode": np.array(self.mode)}
+        for name in ("mean", "components", "low", "scale"):
+            if getattr(self, name) is not None:
+                arrays[name] = getattr(self, name)
+        path = os.path.join(db_path, COMPACT_FILENAME)
+        tmp_path = path + ".tmp.npz"
+        np.savez(tmp_path, **arrays)
+        os.replace(tmp_path, path)
+
+
+def load_compact_vectors(db_path: str) -> Optional[Tuple[List[str], QuantizedVectors]]:
+    """
+    Load the compact vectors stored next to the vector database.
+
+    Returns:
+        Tuple of (chunk IDs, QuantizedVectors), or None if there are none
+    """
+    path = os.path.join(db_path, COMPACT_FILENAME)
+    if not os.path.exists(path):
+        return None
+    try:
+        with np.load(path) as data:
+            quantized = QuantizedVectors(str(data["mode"]))
+            quantized.codes, quantized.norms = data["codes"], data["norms"]
+            for name in ("mean", "components", "low", "scale"):
+                if name in data:
+                    setattr(quantized, name, data[name])
+            ids = [str(i) for i in data["ids"]]
+    except (OSError, ValueError, KeyError) as e:
+        print(f"Warning: Could not read compact vectors: {e}")
+        return None
+    if quantized.components is not None:
+        quantized.pca_dims = quantized.components.shape[1]
+    return ids, quantized
+
+
+def _dot(codes: np.ndarray, queries: np.ndarray, block: int = 65536) -> np.ndarray:
+    """
+    codes @ query in float32, upcasting one block of rows at a time; for a
+    query matrix the result has one row per query.
+    """
+    out = np.empty(queries.shape[:-1] + (len(codes),), dtype=np.float32)
+    for start in range(0, len(codes), block):
+        out[..., start:start + block] = queries @ codes[start:start + block].astype(np.float32).T
+    return out
+
+
+def top_k_indices(distances: np.ndarray, k: int) -> np.ndarray:
+    """Indices of the k smallest distances, smallest first."""
+    k = min(k, len(distances))
+    if k <= 0:
+        return np.zeros(0, dtype=np.int64)
+    candidates = np.argpartition(distances, k - 1)[:k]
+    return candidates[np.argsort(distances[candidates])]
+
+
+def rescore(query: np.ndarray, vectors: np.ndarray, k: int) -> np.ndarray:
+    """Positions of the k candidate vectors nearest to query, by exact squared L2."""
+    diff = np.asarray(vectors, dtype=np.float32) - np.asarray(query, dtype=np.float32)
+    return top_k_indices(np.einsum("ij,ij->i", diff, diff), k)
+
+
+def exact_neighbors(vectors: np.ndarray, queries: np.ndarray, k: int, block: int = 65536) -> np.ndarray:
+    """
+    Rows of the k vectors nearest to each query by exact squared L2, nearest
+    first, reading vectors (e.g. a memory-mapped matrix) one block at a time.
+    """
+    queries = np.asarray(queries, dtype=np.float32)
+    best_rows = np.zeros((len(queries), 0), dtype=np.int64)
+    best_distances = np.zeros((len(queries), 0), dtype=np.float32)
+    query_norms = np.square(queries).sum(axis=1, keepdims=True)
+    for start in range(0, len(vectors), block):
+        chunk = np.asarray(vectors[start:start + block], dtype=np.float32)
+        distances = np.einsum("ij,ij->i", chunk, chunk) - 2.0 * (queries @ chunk.T) + query_norms
+        rows = np.broadcast_to(np.arange(start, start + len(chunk)), distances.shape)
+        distances = np.concatenate([best_distances, distances], axis=1)
+        rows = np.concatenate([best_rows, rows], axis=1)
+        keep = np.argsort(distances, axis=1, kind="stable")[:, :k]
+        best_distances = np.take_along_axis(distances, keep, axis=1)
+        best_rows = np.take_along_axis(rows, keep, axis=1)
+    return best_rows
+
+
+def evaluate_recall(
+    vectors: np.ndarray,
+    quantized: QuantizedVectors,
+    k: int = 5,
+    candidates: int = 20,
+    sample: int = 100,
+    seed: int = 0,
+) -> Dict:
+    """
+    Measure recall@k of the quantized search against the float32 baseline.
+
+    Stored vectors are used as queries, each excluding itself from its own
+    neighbors. The exact neighbors are found in one blocked pass over
+    vectors, so a memory-mapped matrix is never loaded whole.
+
+    Args:
+        vectors: The float32 vectors quantized was fitted on (may be memory-mapped)
+        quantized: Fitted QuantizedVectors
+        k: Number of neighbors compared
+        candidates: Approximate candidates re-scored exactly per query
+        sample: Maximum number of queries
+        seed: Seed of the query sample
+
+    Returns:
+        Dict with recall_at_k (approximate only), recall_at_k_rescored, k and queries
+    """
+    if len(vectors) < 2:
+        return {"k": k, "queries": 0, "recall_at_k": 1.0, "recall_at_k_rescored": 1.0}
+    k = min(k, len(vectors) - 1)
+    rows = np.random.RandomState(seed).permutation(len(vectors))[:sample]
+    queries = np.asarray(vectors[rows], dtype=np.float32)
+    neighbors = exact_neighbors(vectors, queries, k + 1)
+    approx_hits = rescored_hits = 0
+    for row, query, exact in zip(rows, queries, neighbors):
+        exact = set(exact[exact != row][:k].tolist())
+        approx = quantized.search(query, max(candidates, k) + 1)
+        approx = approx[approx != row]
+        approx_hits += len(exact.intersection(approx[:k].tolist()))
+        rescored = approx[rescore(query, vectors[approx], k)]
+        rescored_hits += len(exact.intersection(rescored.tolist()))
+    total = len(rows) * k
+    return {
+        "k": k,
+        "queries": len(rows),
+        "recall_at_k": round(approx_hits / total, 4),
+        "recall_at_k_rescored": round(rescored_hits / total, 4),
+    }
+
+
+class CompactVectorStore:
+    """
+    Vector store view that searches the compact vectors in memory and asks
+    the underlying NumPy store only for the float32 vectors and documents of
+    the few candidates it re-scores, so only their pages of the
+    memory-mapped matrix are read.
+    """
+
+    def __init__(self, vector_db, ids: List[str], quantized: QuantizedVectors, candidates_per_result: int = 4):
+        self.vector_db = vector_db
+        self.ids = ids
+        self.quantized = quantized
+        self.candidates_per_result = max(1, candidates_per_result)
+
+    @property
+    def embeddings(self):
+        return self.vector_db.embeddings
+
+    def get(self, ids: Optional[List[str]] = None, include: Sequence[str] = ("documents", "metadatas")) -> Dict:
+        return self.vector_db.get(ids=ids, include=include)
+
+    def similarity_search(self, query: str, k: int = 4, filter: Optional[Dict] = None) -> List[Document]:
+        query_vector = np.asarray([self.vector_db.embeddings.embed_query(query)], dtype=np.float32)
+        return self.batch_search([query], query_vector, k=k, filters=[filter])[0]
+
+    def batch_search(
+        self,
+        queries: List[str],
+        vectors: np.ndarray,
+        k: int = 4,
+        filters: Optional[List[Optional[Dict]]] = None,
+    ) -> List[List[Document]]:
+        """Scan the codes once for all unfiltered queries, then re-score every candidate set from one fetch."""
+        vectors = np.asarray(vectors, dtype=np.float32)
+        results: List[List[Document]] = [[] for _ in queries]
+        unfiltered = [i for i in range(len(queries)) if not (filters and filters[i])]
+        filtered = [i for i in range(len(queries)) if filters and filters[i]]
+        if filtered:
+            # Filtered sub-collections are searched exactly by the underlying store
+            found = self.vector_db.batch_search(
+                [queries[i] for i in filtered], vectors[filtered], k=k, filters=[filters[i] for i in filtered]
+            )
+            for i, documents in zip(filtered, found):
+                results[i] = documents
+        if not unfiltered or not self.ids:
+            return results
+
+        candidates = self.quantized.search_many(vectors[unfiltered], k * self.candidates_per_result)
+        wanted = sorted({self.ids[row] for rows in candidates for row in rows})
+        found = self.vector_db.get(ids=wanted, include=["embeddings", "documents", "metadatas"])
+        position = {chunk_id: i for i, chunk_id in enumerate(found["ids"])}
+        stored = np.asarray(found["embeddings"], dtype=np.float32)
+        for i, rows in zip(unfiltered, candidates):
+            hits = [position[self.ids[row]] for row in rows if self.ids[row] in position]
+            if not hits:
+                continue
+            order = rescore(vectors[i], stored[hits], k)
+            results[i] = [
+                Document(id=found["ids"][hits[j]], page_content=found["documents"][hits[j]], metadata=found["metadatas"][hits[j]] or {})
+                for j in order
+            ]
+        return results
@@ -0,0 +1,85 @@
+"""
+Query Cache - LRU cache of retrieval results keyed by index version, query,
+k and filters, so repeated queries skip embedding and search entirely.
+"""
+
+import json
+import threading
+from collections import OrderedDict
+from typing import Dict, List, Optional, Tuple
+
+from langchain_core.documents import Document
+
+
+def normalize_query(query: str) -> str:
+    """Collapse whitespace so queries differing only in spacing share an entry."""
+    return " ".join(query.split())
+
+
+class QueryCache:
+    """
+    Thread-safe LRU of retrieval results.
+
+    Entries hold chunk IDs, texts and metadata rather than Document objects,
+    so callers can never mutate a cached result. Entries are keyed by the
+    index version they were computed on. The first lookup on a new version
+    retires the previous one: its entries are still served to readers that
+    hold a lease on it but no longer stored, and age out of the LRU, so
+    readers on both sides of a publish do not evict each other.
+    """
+
+    def __init__(self, max_entries: int = 1024):
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[Tuple, List[Tuple]]" = OrderedDict()
+        self._version: Optional[str] = None
+        self._retired = set()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def make_key(version: str, query: str, k: int, filters: Optional[Dict]) -> Tuple:
+        return version, normalize_query(query), k, json.dumps(filters, sort_keys=True, default=str) if filters else None
+
+    def _is_current(self, version: str) -> bool:
+        # Must be called with self._lock held
+        if version != self._version and version not in self._retired:
+            if self._version is not None:
+                self._retired.add(self._version)
+            self._version = version
+        return version == self._version
+
+    def get(self, version: str, query: str, k: int, filters: Optional[Dict] = None) -> Optional[List[Document]]:
+        """Cached documents for (query, k, filters) on the given index version, or None."""
+        key = self.make_key(version, query, k, filters)
+        with self._lock:
+            self._is_current(version)
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+        return [Document(id=chunk_id, page_content=text, metadata=dict(metadata)) for chunk_id, text, metadata in entry]
+
+    def put(self, version: str, query: str, k: int, filters: Optional[Dict], documents: List[Document]) -> None:
+        if self.max_entries <= 0:
+            return
+        key = self.make_key(version, query, k, filters)
+        entry = [(doc.id, doc.page_content, dict(doc.metadata)) for doc in documents]
+        with self._lock:
+            if not self._is_current(version):
+                return
+            self._entries[key] = entry
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def clear(self) -> None:
+        """Drop every entry; which versions are retired is kept."""
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> Dict:
+        with self._lock:
+            return {"entries": len(self._entries), "hits": self.hits, "misses": self.misses, "version": self._version}
@@ -1,16 +1,15 @@
 import os
 import sys
 import json
-import shutil
+import hashlib
+import re
+import threading
 import time
-from typing import List, Dict, Optional
+import urllib.request
+from typing import Callable, Iterator, List, Dict, Optional, Tuple
 from pathlib import Path
-from langchain_community.document_loaders import DirectoryLoader, TextLoader, UnstructuredHTMLLoader
-from langchain_text_splitters import RecursiveCharacterTextSplitter
-from langchain_community.vectorstores import Chroma
 from langchain_core.prompts import PromptTemplate
 from langchain_core.documents import Document
-from langchain_core.runnables import RunnablePassthrough
 from langchain_core.output_parsers import StrOutputParser
 
 
@@ -22,6 +21,7 @@ if str(project_root) not in sys.path:
 # Try to import different LLM providers
 try:
     from langchain_openai import OpenAIEmbeddings, ChatOpenAI
+    import httpx
     HAS_OPENAI = True
 except ImportError:
     HAS_OPENAI = False
@@ -46,80 +46,620 @@ except ImportError:
 
 # Load utils (use try-except for flexibility)
 try:
-    from app.utils import clean_llm_json
+    from app.utils import IncrementalJSONArrayParser, clean_llm_json
+    from app.kb_manifest import (
+        chunk_id_path, diff_manifest, empty_manifest, load_manifest, make_chunk_ids,
+        save_manifest, scan_file_states, stale_chunk_ids,
+    )
+    from app.embedding_cache import CachedEmbeddings, EmbeddingCache
+    from app.embedding_engine import EmbeddingEngine
+    from app.model_registry import registry
+    from app.vector_store import (
+        VectorStoreHandle, collect_garbage, create_snapshot, discard_snapshot,
+        publish_snapshot, read_index_version, remove_legacy_layout, snapshot_path,
+    )
+    from app.ingestion import discover_files, iter_file_chunks, run_ingestion
+    from app.chunking import (
+        StructureAwareSplitter, count_tokens, tokenizer_token_counter, use_approximate_token_counts,
+    )
+    from app.dedup import NearDuplicateIndex
+    from app.vector_backends import HNSW_FILENAME, VECTOR_BACKENDS, embed_queries, open_vector_backend
+    from app.bm25_index import BM25_FILENAME, BM25Index, HybridVectorStore
+    from app.query_cache import QueryCache
+    from app.context_packer import PackedContext, compact_html, pack_context
+    from app.reranker import CrossEncoderReranker, load_cross_encoder
+    from app.llm_router import ROUTE_CONFIG_KEY, LLMRouter, ProviderHealth, StubLLM
+    from app.llm_cache import LLMResponseCache, llm_cache_key
+    from app.llm_cassette import CASSETTE_MODES, CASSETTE_REQUEST_CONFIG_KEY, CassetteLLM, LLMCassette
+    from app.quantization import (
+        COMPACT_FILENAME, CompactVectorStore, QuantizedVectors, evaluate_recall, load_compact_vectors,
+    )
 except ImportError:
     # Fallback for direct execution
     import sys
     from pathlib import Path
     sys.path.insert(0, str(Path(__file__).parent.parent))
-    from app.utils import clean_llm_json
+    from app.utils import IncrementalJSONArrayParser, clean_llm_json
+    from app.kb_manifest import (
+        chunk_id_path, diff_manifest, empty_manifest, load_manifest, make_chunk_ids,
+        save_manifest, scan_file_states, stale_chunk_ids,
+    )
+    from app.embedding_cache import CachedEmbeddings, EmbeddingCache
+    from app.embedding_engine import EmbeddingEngine
+    from app.model_registry import registry
+    from app.vector_store import (
+        VectorStoreHandle, collect_garbage, create_snapshot, discard_snapshot,
+        publish_snapshot, read_index_version, remove_legacy_layout, snapshot_path,
+    )
+    from app.ingestion import discover_files, iter_file_chunks, run_ingestion
+    from app.chunking import (
+        StructureAwareSplitter, count_tokens, tokenizer_token_counter, use_approximate_token_counts,
+    )
+    from app.dedup import NearDuplicateIndex
+    from app.vector_backends import HNSW_FILENAME, VECTOR_BACKENDS, embed_queries, open_vector_backend
+    from app.bm25_index import BM25_FILENAME, BM25Index, HybridVectorStore
+    from app.query_cache import QueryCache
+    from app.context_packer import PackedContext, compact_html, pack_context
+    from app.reranker import CrossEncoderReranker, load_cross_encoder
+    from app.llm_router import ROUTE_CONFIG_KEY, LLMRouter, ProviderHealth, StubLLM
+    from app.llm_cache import LLMResponseCache, llm_cache_key
+    from app.llm_cassette import CASSETTE_MODES, CASSETTE_REQUEST_CONFIG_KEY, CassetteLLM, LLMCassette
+    from app.quantization import (
+        COMPACT_FILENAME, CompactVectorStore, QuantizedVectors, evaluate_recall, load_compact_vectors,
+    )
 
 
 
 # Configuration
 VECTOR_DB_PATH = "chroma_db_store"
 DATA_PATH = "data"
+EMBEDDING_MODEL_NAME = "sentence-transformers/all-MiniLM-L6-v2"
+EMBEDDING_CACHE_PATH = os.path.join("embedding_cache", "embeddings.sqlite3")
+EMBEDDING_CACHE_MAX_ENTRIES = 100_000
+EMBEDDING_CACHE_TOUCH_SECONDS = 3600  # A cache hit rewrites its LRU timestamp only once it is older than this
+INGEST_PIPELINE_VERSION = 6  # Bump when parsing or chunking changes so snapshots are rebuilt
+INGEST_BATCH_SIZE = 256  # Chunks embedded and upserted per batch
+INGEST_MAX_PENDING_FILES = 4  # Split files (or PDF page ranges) allowed to wait for embedding (backpressure)
+INGEST_LOAD_WORKERS = os.cpu_count() or 1  # Parser processes for large document trees
+INGEST_PDF_PAGES_PER_TASK = 16  # PDF pages extracted per parser task
+INGEST_EMBED_THREADS_PER_WORKER = 2  # Torch threads pinned in each embedding worker
+INGEST_EMBED_WORKERS = max(1, (os.cpu_count() or 1) // INGEST_EMBED_THREADS_PER_WORKER)
+INGEST_EMBED_BATCH_SIZE = 32  # Chunks per encode call in an embedding worker
+CHUNK_MAX_TOKENS = 256  # Upper bound on chunk size, in tokens
+CHUNK_OVERLAP_TOKENS = 32  # Overlap used only when unstructured text has to be cut
+CHUNK_TOKEN_MARGIN = 0.75  # Share of CHUNK_MAX_TOKENS used when chunks cannot be measured with the embedding model's tokenizer
+DEDUP_THRESHOLD = 0.9  # Estimated Jaccard similarity above which a chunk is dropped (None disables)
+DEDUP_NUM_PERM = 128  # MinHash permutations per chunk signature
+VECTOR_BACKEND = "chroma"  # "chroma", "numpy" (memory-mapped brute force) or "hnsw" (needs hnswlib)
+HNSW_M = 16  # Graph degree of the HNSW backend
+HNSW_EF_CONSTRUCTION = 200  # Build-time candidate list size of the HNSW backend
+HNSW_EF_SEARCH = 64  # Query-time candidate list size of the HNSW backend
+HYBRID_RETRIEVAL = True  # Fuse vector search with a BM25 keyword index (reciprocal rank fusion)
+HYBRID_CANDIDATES = 20  # Candidates each retriever contributes to the fusion
+RRF_K = 60  # Reciprocal rank fusion damping constant
+VECTOR_STORAGE = "float32"  # "float16" or "int8" searches a compact in-memory copy of the vectors ("numpy" or "hnsw" backend only)
+VECTOR_PCA_DIMS = None  # Optional PCA dimensions for the compact copy
+VECTOR_RESCORE_FACTOR = 4  # Compact-search candidates re-scored exactly per requested result
+RERANKER_ENABLED = os.getenv("RERANKER_ENABLED", "").lower() in ("1", "true", "yes")  # Opt in to the cross-encoder second retrieval stage
+RERANKER_MODEL_NAME = "cross-encoder/ms-marco-MiniLM-L-6-v2"  # Local cross-encoder for the second retrieval stage (downloaded on first use)
+RERANKER_RETRY_SECONDS = 300  # Wait before retrying a reranker that failed to load
+RERANK_CANDIDATES = 50  # First-stage candidates rescored by the reranker
+RERANK_CACHE_PATH = os.path.join("embedding_cache", "rerank_scores.sqlite3")
+RERANK_CACHE_MAX_ENTRIES = 200_000
+LLM_MODELS = {"google": "gemini-2.5-flash", "openai": "gpt-4o-mini", "ollama": "llama3.2", "stub": "stub"}  # Model used per provider
+LLM_ROUTER_PROVIDERS = ("google", "openai", "ollama")  # Providers "auto" routes between; preference order until latencies are known
+LLM_ROUTER_WINDOW = 50  # Recent calls per provider behind the latency percentiles and error rate
+LLM_ROUTER_MAX_AGE_SECONDS = 300  # Calls older than this stop counting towards a provider's statistics
+LLM_ROUTER_EXPLORE_EVERY = 20  # Every Nth request goes to the provider called longest ago, to re-measure it (0 disables)
+LLM_CIRCUIT_FAILURES = 3  # Consecutive failures that open a provider's circuit breaker
+LLM_CIRCUIT_ERROR_RATE = 0.5  # Rolling error rate that opens the breaker (after 10 calls)
+LLM_CIRCUIT_RESET_SECONDS = 30  # Time an open breaker waits before letting a health-check request through
+LLM_HEDGE_AFTER_SECONDS = None  # Also send a request to the next provider if unanswered after this long (None disables)
+LLM_STUB_LATENCY_SECONDS = 0.0  # Simulated latency of the local "stub" provider
+OLLAMA_BASE_URL = os.getenv("OLLAMA_BASE_URL", "http://localhost:11434")
+OLLAMA_ENABLED = os.getenv("OLLAMA_ENABLED", "").lower() in ("1", "true", "yes")  # Route "auto" requests to Ollama without probing it first
+OLLAMA_PROBE_TIMEOUT_SECONDS = 0.5  # Reachability probe deciding whether "auto" routes to Ollama
+OLLAMA_PROBE_TTL_SECONDS = 60  # How long a probe result is trusted
+LLM_CASSETTE_PATH = os.getenv("LLM_CASSETTE_PATH", os.path.join("cassettes", "llm_cassette.jsonl"))
+LLM_CASSETTE_MODE = os.getenv("LLM_CASSETTE_MODE") or None  # "record" or "replay" sends "auto" requests through the cassette
+LLM_CASSETTE_LATENCY_SECONDS = None  # Simulated latency of replayed responses (None replays each recorded latency)
+LLM_CASSETTE_STRICT = os.getenv("LLM_CASSETTE_STRICT", "").lower() in ("1", "true", "yes")  # Replay only responses recorded for the identical prompt
+LLM_CACHE_PATH = os.path.join("embedding_cache", "llm_responses.sqlite3")
+LLM_CACHE_MAX_ENTRIES = 5_000  # Valid LLM responses kept on disk (0 disables the response cache)
+LLM_CACHE_TTL_SECONDS = 7 * 24 * 3600  # Age after which a cached response is regenerated (None keeps them)
+LLM_CACHE_TOUCH_SECONDS = 3600  # A cached response served again rewrites its LRU timestamp only once it is older than this
+LLM_MAX_KEEPALIVE_CONNECTIONS = 20  # Idle HTTP connections pooled for reuse by the LLM clients
+LLM_REQUEST_TIMEOUT = 120  # Seconds before an LLM HTTP request is abandoned
+CONTEXT_TOKEN_BUDGETS = {"google": 3000, "openai": 3000, "ollama": 1000}  # Documentation tokens per prompt, by LLM provider
+CONTEXT_FETCH_FACTOR = 3  # Candidates retrieved per packed chunk, for MMR selection
+CONTEXT_MMR_LAMBDA = 0.5  # MMR trade-off between relevance (1.0) and diversity (0.0)
+QUERY_CACHE_MAX_ENTRIES = 1024  # Retrieval results kept per process (0 disables)
+SNAPSHOT_GRACE_SECONDS = 60  # Keep retired snapshots this long for readers in other processes
 
 
-def get_embeddings():
-    """Get embeddings model - prefer local, fallback to OpenAI"""
+def _load_base_embeddings():
+    """Load the embeddings model - prefer local, fallback to OpenAI"""
     if HAS_HF_EMBEDDINGS:
         try:
             return HuggingFaceEmbeddings(
-                model_name="sentence-transformers/all-MiniLM-L6-v2"
-            )
+                model_name=EMBEDDING_MODEL_NAME
+            ), EMBEDDING_MODEL_NAME
         except Exception as e:
             print(f"Warning: Could not load HuggingFace embeddings: {e}")
     
     if HAS_OPENAI and os.getenv("OPENAI_API_KEY"):
-        return OpenAIEmbeddings()
+        embeddings = OpenAIEmbeddings()
+        return embeddings, f"openai/{embeddings.model}"
     
     raise Exception("No embeddings model available. Install sentence-transformers or set OPENAI_API_KEY")
 
 
-def get_llm(model_type: str = "auto", temperature: float = 0.1):
-    """Get LLM - prefer Google Gemini first, then OpenAI, fallback to Ollama"""
-    if model_type == "auto":
-        # Try Google Gemini first (cloud, reliable)
-        if HAS_GOOGLE and os.getenv("GOOGLE_API_KEY"):
-            try:
-                return ChatGoogleGenerativeAI(model="gemini-2.5-flash", temperature=temperature)
-            except Exception as e:
-                print(f"Warning: Google Gemini connection failed: {e}")
-                print("Falling back to other providers...")
-        
-        # Try OpenAI second (cloud, reliable)
-        if HAS_OPENAI and os.getenv("OPENAI_API_KEY"):
-            try:
-                return ChatOpenAI(model="gpt-4o-mini", temperature=temperature)
-            except Exception as e:
-                print(f"Warning: OpenAI connection failed: {e}")
-                print("Falling back to Ollama...")
-        
-        # Try Ollama last (local, requires service to be running)
-        if HAS_OLLAMA:
-            try:
-                llm = Ollama(model="llama3.2", temperature=temperature)
-                return llm
-            except Exception as e:
-                error_msg = str(e).lower()
-                if "connection" in error_msg or "refused" in error_msg or "10061" in error_msg:
-                    print(f"Warning: Ollama is not running. Error: {e}")
-                else:
-                    print(f"Warning: Ollama not available: {e}")
-        
+def get_embedding_cache() -> EmbeddingCache:
+    """Get the process-wide on-disk embedding cache"""
+    return registry.get(
+        "embedding_cache",
+        lambda: EmbeddingCache(
+            EMBEDDING_CACHE_PATH, max_entries=EMBEDDING_CACHE_MAX_ENTRIES, touch_interval=EMBEDDING_CACHE_TOUCH_SECONDS
+        )
+    )
+
+
+def _load_embeddings():
+    embeddings, model_name = _load_base_embeddings()
+    return CachedEmbeddings(embeddings, get_embedding_cache(), model_name)
+
+
+def get_embeddings():
+    """
+    Get the shared embeddings model, backed by the on-disk cache.
+    The model is loaded once per process and reused by every call.
+    """
+    return registry.get("embeddings", _load_embeddings)
+
+
+def warm_up_embeddings():
+    """Start loading the embeddings model in the background so the first request doesn't pay for it"""
+    return registry.warm_up("embeddings", _load_embeddings)
+
+
+def _load_reranker() -> CrossEncoderReranker:
+    cache = EmbeddingCache(
+        RERANK_CACHE_PATH, max_entries=RERANK_CACHE_MAX_ENTRIES, touch_interval=EMBEDDING_CACHE_TOUCH_SECONDS
+    )
+    return CrossEncoderReranker(load_cross_encoder(RERANKER_MODEL_NAME), RERANKER_MODEL_NAME, cache)
+
+
+_reranker_lock = threading.Lock()
+_reranker_retry_at = 0.0
+
+
+def _reranker_wanted() -> bool:
+    return RERANKER_ENABLED and bool(RERANKER_MODEL_NAME)
+
+
+def get_reranker() -> Optional[CrossEncoderReranker]:
+    """
+    Get the shared cross-encoder reranker, or None if it is disabled or
+    cannot be loaded (retrieval then keeps the first-stage order).
+    A failed load is retried once RERANKER_RETRY_SECONDS have passed.
+    """
+    global _reranker_retry_at
+    if not _reranker_wanted():
+        return None
+    with _reranker_lock:
+        if time.monotonic() < _reranker_retry_at:
+            return None
+    try:
+        return registry.get("reranker", _load_reranker)
+    except Exception as e:
+        with _reranker_lock:
+            _reranker_retry_at = time.monotonic() + RERANKER_RETRY_SECONDS
+        print(f"Warning: Reranker unavailable, using first-stage ranking for the next {RERANKER_RETRY_SECONDS}s: {e}")
+        return None
+
+
+def warm_up_reranker():
+    """Start loading the reranker in the background, if it is enabled"""
+    if _reranker_wanted():
+        return registry.warm_up("reranker", _load_reranker)
+    return None
+
+
+def _open_backend(path: str, embeddings):
+    """
+    Open the configured vector backend on a snapshot directory. With compact
+    storage the HNSW backend is opened without its graph: the codes replace
+    it, and the graph would hold another float32 copy of every vector.
+    """
+    if VECTOR_BACKEND not in VECTOR_BACKENDS:
+        raise Exception(f"Unknown vector backend: {VECTOR_BACKEND}. Choose one of {', '.join(VECTOR_BACKENDS)}")
+    backend = "numpy" if VECTOR_BACKEND == "hnsw" and VECTOR_STORAGE != "float32" else VECTOR_BACKEND
+    return open_vector_backend(
+        backend, path, embeddings,
+        m=HNSW_M, ef_construction=HNSW_EF_CONSTRUCTION, ef_search=HNSW_EF_SEARCH
+    )
+
+
+def _open_vector_store(version: str):
+    # Clean up after builds of earlier processes; runs on its own thread since the store handle is locked here
+    schedule_snapshot_garbage_collection()
+    path = snapshot_path(VECTOR_DB_PATH, version)
+    vector_db = _open_backend(path, get_embeddings())
+    if VECTOR_STORAGE != "float32" and VECTOR_BACKEND != "chroma":
+        compact = load_compact_vectors(path)
+        if compact is not None:
+            vector_db = CompactVectorStore(vector_db, *compact, candidates_per_result=VECTOR_RESCORE_FACTOR)
+    if HYBRID_RETRIEVAL:
+        bm25 = BM25Index()
+        if bm25.load(path):
+            vector_db = HybridVectorStore(vector_db, bm25, candidates=HYBRID_CANDIDATES, rrf_k=RRF_K)
+    return vector_db
+
+
+def _build_compact_vectors(vector_db, build_path: str, batch_size: int) -> Optional[Dict]:
+    """
+    Write the compact copy of a snapshot's vectors, or remove a stale one.
+    The codes are fitted and encoded batch_size rows at a time from the
+    memory-mapped float32 matrix, which stays on disk for re-scoring; the
+    HNSW graph, another in-memory float32 copy, is dropped.
+    Returns footprint and recall@k against float32, or None when disabled.
+    """
+    compact_path = os.path.join(build_path, COMPACT_FILENAME)
+    if VECTOR_STORAGE == "float32":
+        if os.path.exists(compact_path):
+            os.remove(compact_path)
+        return None
+
+    graph_path = os.path.join(build_path, HNSW_FILENAME)
+    if os.path.exists(graph_path):
+        os.remove(graph_path)
+    vectors = vector_db.vectors
+    quantized = QuantizedVectors(VECTOR_STORAGE, VECTOR_PCA_DIMS).fit_blocks(
+        lambda: (vectors[start:start + batch_size] for start in range(0, len(vectors), batch_size)),
+        len(vectors), vectors.shape[1]
+    )
+    quantized.save(build_path, vector_db.ids)
+    report = {
+        "mode": VECTOR_STORAGE,
+        "dims": quantized.codes.shape[1] if quantized.codes.ndim == 2 else 0,
+        "float32_bytes": int(vectors.nbytes),
+        "compact_bytes": int(quantized.nbytes),
+    }
+    report.update(evaluate_recall(vectors, quantized, k=5, candidates=5 * VECTOR_RESCORE_FACTOR))
+    print(f"Compact vectors: {report}")
+    return report
+
+
+def _release_chroma_client(version: str):
+    """Best-effort release of the Chroma client cached for a snapshot so its files can be deleted"""
+    try:
+        from chromadb.api.shared_system_client import SharedSystemClient
+        system = SharedSystemClient._identifier_to_system.pop(snapshot_path(VECTOR_DB_PATH, version), None)
+        if system is not None:
+            system.stop()
+    except Exception:
+        pass
+
+
+_vector_store_handle = VectorStoreHandle(
+    _open_vector_store, lambda: read_index_version(VECTOR_DB_PATH), close_store=_release_chroma_client
+)
+_build_lock = threading.Lock()
+_query_cache = QueryCache(QUERY_CACHE_MAX_ENTRIES)
+
+
+def get_vector_store():
+    """Get the shared vector store of the published snapshot, reopened only when a new snapshot is published"""
+    return _vector_store_handle.get()
+
+
+def retrieve_documents(query: str, k: int = 5, filters: Optional[Dict] = None) -> List[Document]:
+    """
+    Retrieve the k most relevant chunks for a query.
+    filters restricts the search to chunks whose source_file, file_type or
+    section metadata match, e.g. {"source_file": "checkout.html"}.
+    The published snapshot is leased for the duration of the search, so a
+    concurrent rebuild never swaps or deletes it mid-query.
+    Results are cached per index version, so repeated queries cost a lookup.
+    """
+    with _vector_store_handle.pin() as (version, vector_db):
+        cached = _query_cache.get(version, query, k, filters)
+        if cached is not None:
+            return cached
+        documents = vector_db.similarity_search(query, k=k, filter=filters)
+        _query_cache.put(version, query, k, filters, documents)
+        return documents
+
+
+def retrieve_documents_batch(
+    queries: List[str],
+    k: int = 5,
+    filters: Optional[List[Optional[Dict]]] = None
+) -> List[List[Document]]:
+    """
+    Retrieve the k most relevant chunks for many queries in one round trip.
+    Queries missing from the result cache are embedded in a single model call
+    and searched together (one matrix top-k per distinct filter).
+    Returns one list of documents per query, in input order.
+    """
+    filters = filters or [None] * len(queries)
+    with _vector_store_handle.pin() as (version, vector_db):
+        results = [_query_cache.get(version, query, k, f) for query, f in zip(queries, filters)]
+        # Each distinct (query, filter) pair is searched once
+        pending: Dict[tuple, List[int]] = {}
+        for i, cached in enumerate(results):
+            if cached is None:
+                pending.setdefault(QueryCache.make_key(queries[i], k, filters[i]), []).append(i)
+        if pending:
+            first = [positions[0] for positions in pending.values()]
+            vectors = embed_queries(vector_db.embeddings, [queries[i] for i in first])
+            found = vector_db.batch_search(
+                [queries[i] for i in first], vectors, k=k, filters=[filters[i] for i in first]
+            )
+            for positions, documents in zip(pending.values(), found):
+                _query_cache.put(version, queries[positions[0]], k, filters[positions[0]], documents)
+                for i in positions:
+                    results[i] = [Document(id=d.id, page_content=d.page_content, metadata=dict(d.metadata)) for d in documents]
+        return results
+
+
+def first_stage_k(k: int) -> int:
+    """Candidates the first retrieval stage returns so the final k chunks can be chosen from them"""
+    pool = k * CONTEXT_FETCH_FACTOR
+    return max(RERANK_CANDIDATES, pool) if get_reranker() is not None else pool
+
+
+def rerank_documents(queries: List[str], document_lists: List[List[Document]], top_n: int) -> List[List[Document]]:
+    """
+    Second retrieval stage: rescore each query's first-stage candidates with
+    the cross-encoder (one model call for all queries) and keep the top_n.
+    Kept documents carry their score in metadata["rerank_score"]. Without a
+    reranker the candidates are truncated in first-stage order.
+    """
+    reranker = get_reranker()
+    if reranker is None:
+        return [documents[:top_n] for documents in document_lists]
+    ranked = reranker.rerank_many(queries, document_lists, top_n)
+    return [
+        [Document(id=d.id, page_content=d.page_content, metadata={**d.metadata, "rerank_score": score}) for d, score in pairs]
+        for pairs in ranked
+    ]
+
+
+def source_filter(source_document: Optional[str], known_files: Optional[Dict[str, Dict]] = None) -> Optional[Dict]:
+    """
+    Build a retrieval filter from a test case's source_document, which may
+    name several files ("product_specs.md, checkout.html").
+    With known_files (the manifest's file entries), each name must match an
+    indexed file, by path or else by file name; other names are dropped.
+    Each file is widened to the files holding the originals of its dropped
+    near-duplicate chunks. Returns None when no name matches, so retrieval
+    is not restricted to a file the model made up.
+    """
+    names = [name.strip().strip("`'\"[]") for name in re.split(r"[,;]|\band\b", source_document or "")]
+    # The model may copy the whole "[Source: ...]" label
+    names = [Path(re.sub(r"^source:\s*", "", name, flags=re.IGNORECASE)).as_posix() for name in names if name]
+    if known_files is not None:
+        by_file_name: Dict[str, List[str]] = {}
+        for rel_path in known_files:
+            by_file_name.setdefault(Path(rel_path).name, []).append(rel_path)
+        matched = []
+        for name in names:
+            for rel_path in [name] if name in known_files else by_file_name.get(Path(name).name, []):
+                matched.append(rel_path)
+                matched.extend(known_files[rel_path].get("duplicate_of", []))
+        names = list(dict.fromkeys(matched))
+    if not names:
+        return None
+    return {"source_file": names if len(names) > 1 else names[0]}
+
+
+_legacy_layout_removed = False
+
+
+_published_files_cache: Dict[str, Dict[str, Dict]] = {}
+
+
+def published_files() -> Dict[str, Dict]:
+    """Manifest file entries of the published snapshot, read once per version"""
+    version = read_index_version(VECTOR_DB_PATH)
+    if version is None:
+        return {}
+    files = _published_files_cache.get(version)
+    if files is None:
+        files = load_manifest(snapshot_path(VECTOR_DB_PATH, version))["files"]
+        _published_files_cache.clear()
+        _published_files_cache[version] = files
+    return files
+
+
+def collect_snapshot_garbage():
+    """
+    Delete retired index snapshots that are no longer in use. The first run
+    in a process that finds a published snapshot also removes the files of
+    the pre-snapshot layout.
+    """
+    global _legacy_layout_removed
+    if not _legacy_layout_removed and read_index_version(VECTOR_DB_PATH) is not None:
+        _legacy_layout_removed = True
+        legacy = remove_legacy_layout(VECTOR_DB_PATH)
+        if legacy:
+            print(f"Removed pre-snapshot index files: {', '.join(legacy)}")
+    return collect_garbage(
+        VECTOR_DB_PATH,
+        in_use=_vector_store_handle.in_use(),
+        grace_seconds=SNAPSHOT_GRACE_SECONDS,
+        release=_release_chroma_client
+    )
+
+
+def schedule_snapshot_garbage_collection(delay: float = 0.0):
+    """
+    Run collect_snapshot_garbage() on a background timer after delay seconds.
+    Snapshots still inside their grace period or in use are left for a
+    later run.
+    """
+    timer = threading.Timer(delay, collect_snapshot_garbage)
+    timer.daemon = True
+    timer.start()
+    return timer
+
+
+def _http_client():
+    """Shared keep-alive HTTP connection pool for the OpenAI clients"""
+    return registry.get(
+        "llm_http_client",
+        lambda: httpx.Client(
+            limits=httpx.Limits(max_keepalive_connections=LLM_MAX_KEEPALIVE_CONNECTIONS),
+            timeout=LLM_REQUEST_TIMEOUT
+        )
+    )
+
+
+def _create_llm(provider: str, model: str, temperature: float):
+    if provider == "google":
+        return ChatGoogleGenerativeAI(model=model, temperature=temperature)
+    if provider == "openai":
+        return ChatOpenAI(model=model, temperature=temperature, http_client=_http_client())
+    if provider == "stub":
+        return StubLLM(latency=LLM_STUB_LATENCY_SECONDS)
+    # langchain_community's Ollama opens a new HTTP connection per request; it is local, so there is no TLS to reuse
+    return Ollama(model=model, temperature=temperature, base_url=OLLAMA_BASE_URL)
+
+
+def get_llm_client(provider: str, temperature: float = 0.1):
+    """
+    Get the shared LLM client for a provider, keyed by (provider, model, temperature).
+    Clients are created once per process, so their HTTP connections and TLS
+    sessions are reused across calls.
+    """
+    model = LLM_MODELS[provider]
+    return registry.get(f"llm/{provider}/{model}/{temperature}", lambda: _create_llm(provider, model, temperature))
+
+
+_provider_health = ProviderHealth(
+    window=LLM_ROUTER_WINDOW,
+    failure_threshold=LLM_CIRCUIT_FAILURES,
+    max_error_rate=LLM_CIRCUIT_ERROR_RATE,
+    reset_seconds=LLM_CIRCUIT_RESET_SECONDS,
+    max_age_seconds=LLM_ROUTER_MAX_AGE_SECONDS,
+    explore_every=LLM_ROUTER_EXPLORE_EVERY
+)
+_ollama_probe_lock = threading.Lock()
+_ollama_probe: Dict[str, Optional[float]] = {"checked_at": None, "reachable": False}
+
+
+def _ollama_reachable() -> bool:
+    """Whether the Ollama server answers, probed at most once per OLLAMA_PROBE_TTL_SECONDS"""
+    with _ollama_probe_lock:
+        checked_at = _ollama_probe["checked_at"]
+        if checked_at is not None and time.monotonic() - checked_at < OLLAMA_PROBE_TTL_SECONDS:
+            return bool(_ollama_probe["reachable"])
+    try:
+        with urllib.request.urlopen(f"{OLLAMA_BASE_URL.rstrip('/')}/api/tags", timeout=OLLAMA_PROBE_TIMEOUT_SECONDS) as response:
+            reachable = response.status == 200
+    except Exception:
+        reachable = False
+    with _ollama_probe_lock:
+        _ollama_probe.update(checked_at=time.monotonic(), reachable=reachable)
+    return reachable
+
+
+def _provider_configured(provider: str) -> bool:
+    """
+    Whether a provider's package is installed and its API key (if any) is
+    set. Ollama needs no key, so it counts only when OLLAMA_ENABLED is set
+    or its server answers a probe.
+    """
+    if provider == "google":
+        return HAS_GOOGLE and bool(os.getenv("GOOGLE_API_KEY"))
+    if provider == "openai":
+        return HAS_OPENAI and bool(os.getenv("OPENAI_API_KEY"))
+    if provider == "ollama":
+        return HAS_OLLAMA and (OLLAMA_ENABLED or _ollama_reachable())
+    return provider == "stub"
+
+
+def llm_provider_status() -> Dict[str, Dict]:
+    """Rolling latency percentiles, error rate and circuit state of every routable provider"""
+    return {provider: _provider_health.stats(provider) for provider in LLM_ROUTER_PROVIDERS}
+
+
+def _get_router(temperature: float) -> LLMRouter:
+    """Shared router over every configured provider: fastest healthy first, failures fall through"""
+    providers = [provider for provider in LLM_ROUTER_PROVIDERS if _provider_configured(provider)]
+    if not providers:
         raise Exception(
             "No LLM available. Please configure one of the following:\n"
             "1. Set GOOGLE_API_KEY in .env file (recommended)\n"
             "2. Set OPENAI_API_KEY in .env file (recommended)\n"
             "3. Start Ollama: Install from https://ollama.ai/ and run 'ollama serve', then pull a model: 'ollama pull llama3.2'"
         )
+    return registry.get(
+        f"llm_router/{'/'.join(providers)}/{temperature}",
+        lambda: LLMRouter(
+            {provider: (lambda p=provider: get_llm_client(p, temperature)) for provider in providers},
+            _provider_health,
+            hedge_after=LLM_HEDGE_AFTER_SECONDS
+        )
+    )
+
+
+def use_deterministic_prompts() -> None:
+    """
+    Make prompts render identically on every machine, for cassette runs:
+    count tokens by the word approximation (tiktoken may be unavailable
+    offline) and skip the reranker (its model may be missing).
+    """
+    global RERANKER_ENABLED
+    RERANKER_ENABLED = False
+    use_approximate_token_counts()
+
+
+def _get_cassette_llm(mode: str, temperature: float) -> CassetteLLM:
+    """Shared cassette LLM; record mode records what the router answers"""
+    use_deterministic_prompts()
+    cassette = registry.get(f"llm_cassette_file/{LLM_CASSETTE_PATH}", lambda: LLMCassette(LLM_CASSETTE_PATH))
+    if mode == "record":
+        router = _get_router(temperature)
+        return registry.get(
+            f"llm_cassette/record/{LLM_CASSETTE_PATH}/{temperature}",
+            lambda: CassetteLLM(cassette, "record", llm=router, model_name=_llm_identity(router))
+        )
+    return registry.get(
+        f"llm_cassette/replay/{LLM_CASSETTE_PATH}/{LLM_CASSETTE_STRICT}",
+        lambda: CassetteLLM(
+            cassette, "replay", latency=LLM_CASSETTE_LATENCY_SECONDS, model_name="cassette", strict=LLM_CASSETTE_STRICT
+        )
+    )
+
+
+def get_llm(model_type: str = "auto", temperature: float = 0.1):
+    """
+    Get LLM - "auto" routes each request to the fastest healthy configured
+    provider (Google Gemini, OpenAI, Ollama), skipping providers whose
+    circuit breaker is open; other model types select one provider.
+    "record" and "replay" use the LLM cassette at LLM_CASSETTE_PATH for
+    offline, deterministic runs; setting LLM_CASSETTE_MODE applies one of
+    them to "auto" requests.
+    """
+    if model_type == "auto" and LLM_CASSETTE_MODE:
+        model_type = LLM_CASSETTE_MODE
+    
+    if model_type == "auto":
+        return _get_router(temperature)
+    
+    elif model_type in CASSETTE_MODES:
+        return _get_cassette_llm(model_type, temperature)
+    
+    elif model_type == "stub":
+        return get_llm_client("stub", temperature)
     
     elif model_type == "ollama":
         if not HAS_OLLAMA:
             raise Exception("Ollama not installed. Install with: pip install langchain-community")
         try:
-            return Ollama(model="llama3.2", temperature=temperature)
+            return get_llm_client("ollama", temperature)
         except Exception as e:
             error_msg = str(e).lower()
             if "connection" in error_msg or "refused" in error_msg or "10061" in error_msg:
@@ -134,21 +674,128 @@ def get_llm(model_type: str = "auto", temperature: float = 0.1):
     elif model_type == "openai":
         if not HAS_OPENAI or not os.getenv("OPENAI_API_KEY"):
             raise Exception("OpenAI not configured. Set OPENAI_API_KEY environment variable")
-        return ChatOpenAI(model="gpt-4o-mini", temperature=temperature)
+        return get_llm_client("openai", temperature)
     
     elif model_type == "google":
         if not HAS_GOOGLE or not os.getenv("GOOGLE_API_KEY"):
             raise Exception("Google not configured. Set GOOGLE_API_KEY environment variable")
-        return ChatGoogleGenerativeAI(model="gemini-2.5-flash", temperature=temperature)
+        return get_llm_client("google", temperature)
     
     raise Exception(f"Unknown model type: {model_type}")
 
 
-def ingest_knowledge_base(data_path: Optional[str] = None, force_rebuild: bool = False):
+def _plan_llm_call(llm, request_identity: str) -> Tuple[int, Optional[Dict]]:
+    """
+    Documentation token budget and run config for one call to llm.
+    A router's provider order is fixed here and passed to it in the run
+    config, so the budget is that of the provider serving the call (a
+    provider it falls back to gets the same prompt). Cassettes get
+    request_identity (e.g. template name and query) as their key, and the
+    smallest budget, so recording and replaying render the same prompt.
+    Unknown providers get the smallest budget too.
+    """
+    smallest = min(CONTEXT_TOKEN_BUDGETS.values())
+    if isinstance(llm, CassetteLLM):
+        configurable = {CASSETTE_REQUEST_CONFIG_KEY: request_identity}
+        if isinstance(llm.llm, LLMRouter):
+            configurable[ROUTE_CONFIG_KEY] = llm.llm.route()
+        return smallest, {"configurable": configurable}
+    if isinstance(llm, LLMRouter):
+        route = llm.route()
+        return CONTEXT_TOKEN_BUDGETS.get(route[0], smallest), {"configurable": {ROUTE_CONFIG_KEY: route}}
+    providers = {"ChatGoogleGenerativeAI": "google", "ChatOpenAI": "openai", "Ollama": "ollama"}
+    return CONTEXT_TOKEN_BUDGETS.get(providers.get(type(llm).__name__), smallest), None
+
+
+def pack_documents(query: str, documents: List[Document], token_budget: int, k: int) -> PackedContext:
+    """
+    Select up to k of the retrieved documents by maximal marginal relevance
+    and pack them into token_budget tokens, each labelled with its source file.
+    Embeddings come from the embedding cache, so packing re-embeds nothing
+    that was indexed. Reranked documents use their min-max scaled
+    rerank_score as MMR relevance. Falls back to retrieval order if
+    embedding fails.
+    """
+    relevance = None
+    scores = [doc.metadata.get("rerank_score") for doc in documents]
+    if documents and None not in scores:
+        low, high = min(scores), max(scores)
+        relevance = [(score - low) / (high - low) if high > low else 1.0 for score in scores]
+    query_vector = doc_vectors = None
+    if documents:
+        try:
+            embeddings = get_embeddings()
+            query_vector = embeddings.embed_query(query)
+            doc_vectors = embeddings.embed_documents([doc.page_content for doc in documents])
+        except Exception as e:
+            print(f"Warning: Could not embed context for MMR, keeping retrieval order: {e}")
+            query_vector = doc_vectors = None
+    return pack_context(
+        documents, token_budget, k=k, query_vector=query_vector, doc_vectors=doc_vectors,
+        lambda_mult=CONTEXT_MMR_LAMBDA, relevance=relevance, label_key="source_file"
+    )
+
+
+def _embedding_model_name(embeddings) -> str:
+    """Identify the embedding model so a model change forces a full re-embed."""
+    return getattr(embeddings, "model_name", None) or getattr(embeddings, "model", None) or type(embeddings).__name__
+
+
+def _build_embeddings(embeddings):
+    """
+    Embeddings used to write a new snapshot: the local model is swapped for a
+    multi-process EmbeddingEngine, still behind the embedding cache.
+    Returns (embeddings, engine or None); the caller must close the engine.
+    """
+    if (
+        INGEST_EMBED_WORKERS > 1
+        and HAS_HF_EMBEDDINGS
+        and isinstance(embeddings, CachedEmbeddings)
+        and isinstance(embeddings.embeddings, HuggingFaceEmbeddings)
+    ):
+        engine = EmbeddingEngine(
+            embeddings.model_name,
+            local=embeddings.embeddings,
+            workers=INGEST_EMBED_WORKERS,
+            threads_per_worker=INGEST_EMBED_THREADS_PER_WORKER,
+            batch_size=INGEST_EMBED_BATCH_SIZE
+        )
+        return CachedEmbeddings(engine, embeddings.cache, embeddings.model_name), engine
+    return embeddings, None
+
+
+def _chunk_splitter(embeddings) -> StructureAwareSplitter:
+    """
+    Splitter whose chunks fit the embedding model's input. A local
+    sentence-transformers model measures chunks with its own tokenizer,
+    capped at its max sequence length; other models are measured with
+    count_tokens() and keep CHUNK_TOKEN_MARGIN headroom for tokenizers that
+    split text finer than cl100k_base.
+    """
+    model = getattr(getattr(embeddings, "embeddings", embeddings), "client", None)
+    tokenizer = getattr(model, "tokenizer", None)
+    if tokenizer is not None:
+        max_tokens = min(CHUNK_MAX_TOKENS, getattr(model, "max_seq_length", None) or CHUNK_MAX_TOKENS)
+        return StructureAwareSplitter(max_tokens, CHUNK_OVERLAP_TOKENS, length_function=tokenizer_token_counter(tokenizer))
+    return StructureAwareSplitter(int(CHUNK_MAX_TOKENS * CHUNK_TOKEN_MARGIN), CHUNK_OVERLAP_TOKENS)
+
+
+def ingest_knowledge_base(
+    data_path: Optional[str] = None,
+    force_rebuild: bool = False,
+    batch_size: int = INGEST_BATCH_SIZE,
+    progress_callback: Optional[Callable[[Dict], None]] = None
+):
     """
     1. Reads all files from data_path (default: DATA_PATH)
-    2. Splits them into chunks
-    3. Saves them to ChromaDB
+    2. Compares their content hashes with the manifest of the published snapshot
+    3. Copies that snapshot, streams added or changed files through
+       load -> split -> deduplicate -> embed -> upsert in batches of
+       batch_size and deletes the chunks of changed or removed files
+    4. Publishes the copy with an atomic pointer swap; readers are never blocked
+
+    progress_callback, if given, is called after every batch with a dict of
+    files, total_files, documents, chunks and batches processed so far.
     """
     print("--- 🧠 Building Knowledge Base ---")
     
@@ -157,112 +804,251 @@ def ingest_knowledge_base(data_path: Optional[str] = None, force_rebuild: bool =
     if not os.path.exists(data_dir):
         return {"success": False, "message": f"❌ Data directory not found: {data_dir}"}
     
-    # Define how to load each file type
-    loaders = [
-        DirectoryLoader(data_dir, glob="**/*.md", loader_cls=TextLoader),
-        DirectoryLoader(data_dir, glob="**/*.txt", loader_cls=TextLoader),
-        DirectoryLoader(data_dir, glob="**/*.json", loader_cls=TextLoader),
-        DirectoryLoader(data_dir, glob="**/*.html", loader_cls=UnstructuredHTMLLoader),
-    ]
+    files = discover_files(data_dir)
+    if not files:
+        return {"success": False, "message": f"❌ No documents found in {data_dir} folder."}
+    if VECTOR_STORAGE != "float32" and VECTOR_BACKEND == "chroma":
+        return {
+            "success": False,
+            "message": (
+                f"❌ VECTOR_STORAGE={VECTOR_STORAGE} needs the \"numpy\" or \"hnsw\" vector backend: "
+                "Chroma keeps its own float32 index, so a compact copy would only add to it."
+            )
+        }
 
-    documents = []
-    for loader in loaders:
-        try:
-            docs = loader.load()
-            documents.extend(docs)
-        except Exception as e:
-            print(f"Warning: Error loading files with {loader}: {e}")
+    try:
+        embeddings = get_embeddings()
+    except Exception as e:
+        return {"success": False, "message": f"❌ Error building knowledge base: {str(e)}"}
+    model_name = _embedding_model_name(embeddings)
 
-    if not documents:
-        return {"success": False, "message": f"❌ No documents found in {data_dir} folder."}
+    # Builds in this process are serialized; readers never wait on this lock
+    with _build_lock:
+        current_version = read_index_version(VECTOR_DB_PATH)
+        manifest = load_manifest(snapshot_path(VECTOR_DB_PATH, current_version)) if current_version else empty_manifest()
+        # A snapshot built by another model or parsing pipeline cannot be updated incrementally
+        dedup_settings = {"threshold": DEDUP_THRESHOLD, "num_perm": DEDUP_NUM_PERM} if DEDUP_THRESHOLD else None
+        needs_rebuild = (
+            force_rebuild
+            or manifest.get("embedding_model") != model_name
+            or manifest.get("pipeline_version") != INGEST_PIPELINE_VERSION
+            or manifest.get("dedup") != dedup_settings
+            or manifest.get("vector_backend", "chroma") != VECTOR_BACKEND
+        )
+        if needs_rebuild:
+            manifest = empty_manifest(model_name, INGEST_PIPELINE_VERSION)
 
-    # Chunk the text (Critical for RAG)
-    text_splitter = RecursiveCharacterTextSplitter(chunk_size=1000, chunk_overlap=100)
-    chunks = text_splitter.split_documents(documents)
+        states = scan_file_states(files, manifest)
+        changes = diff_manifest(manifest, states)
+        tracked = manifest["files"]
+        # Files whose dropped duplicates pointed at chunks that are going away must be re-chunked
+        dirty = set(changes["changed"] + changes["removed"])
+        while True:
+            dependents = [
+                rel_path for rel_path in changes["unchanged"]
+                if dirty.intersection(tracked[rel_path].get("duplicate_of", []))
+            ]
+            if not dependents:
+                break
+            dirty.update(dependents)
+            changes["changed"] = sorted(changes["changed"] + dependents)
+            changes["unchanged"] = [rel_path for rel_path in changes["unchanged"] if rel_path not in dirty]
+        to_embed = changes["added"] + changes["changed"]
+        stale_ids = stale_chunk_ids(manifest, changes["changed"] + changes["removed"])
+        # A storage change only rewrites the compact vectors, nothing is re-embedded
+        storage_settings = {"mode": VECTOR_STORAGE, "pca_dims": VECTOR_PCA_DIMS}
+        storage_changed = manifest.get("vector_storage", {"mode": "float32", "pca_dims": None}) != storage_settings
+        keyword_changed = bool(manifest.get("bm25")) != HYBRID_RETRIEVAL
+        sidecars_changed = storage_changed or keyword_changed
+        compact_report = None
+        file_chunk_ids = {}
+        duplicate_of: Dict[str, set] = {}
+        stats = {"documents": 0, "chunks": 0, "batches": 0, "duplicates": 0}
+        version = current_version
 
-    # Force a fresh DB if requested
-    if force_rebuild and os.path.exists(VECTOR_DB_PATH):
-        # Try to close any existing ChromaDB connections first
-        try:
-            # If there's an existing vector store, try to delete it properly
-            if os.path.exists(VECTOR_DB_PATH):
-                # Try multiple times with increasing delays
-                max_retries = 5
-                for attempt in range(max_retries):
-                    try:
-                        if attempt > 0:
-                            time.sleep(2 * attempt)  # Increasing delay: 2s, 4s, 6s, 8s, 10s
-                        shutil.rmtree(VECTOR_DB_PATH)
-                        break  # Success, exit retry loop
-                    except PermissionError as pe:
-                        if attempt == max_retries - 1:
-                            # Last attempt failed
-                            return {
-                                "success": False,
-                                "message": f"❌ Cannot delete existing database. The database file is locked by another process.\n\n**Solutions:**\n1. Close any other instances of this application\n2. Uncheck 'Force Rebuild' to update existing database instead\n3. Restart your computer if the file is still locked\n\nError: {str(pe)}"
-                            }
-                        # Continue to next retry
-                    except Exception as e:
-                        # Non-permission errors
-                        return {
-                            "success": False,
-                            "message": f"❌ Error removing existing database: {str(e)}"
-                        }
-        except Exception as e:
+        if needs_rebuild or to_embed or stale_ids or sidecars_changed:
+            try:
+                version, build_path = create_snapshot(
+                    VECTOR_DB_PATH, base_version=None if needs_rebuild else current_version
+                )
+            except Exception as e:
+                return {"success": False, "message": f"❌ Error creating index snapshot: {str(e)}"}
+
+            build_embeddings, engine = _build_embeddings(embeddings)
+            try:
+                vector_db = _open_backend(build_path, build_embeddings)
+                if stale_ids:
+                    vector_db.delete(ids=stale_ids)
+
+                near_duplicates = None
+                if dedup_settings:
+                    near_duplicates = NearDuplicateIndex(DEDUP_THRESHOLD, DEDUP_NUM_PERM)
+                    if not needs_rebuild:
+                        near_duplicates.load(build_path)
+                        near_duplicates.remove(stale_ids)
+
+                def _is_duplicate(chunk: Document, chunk_id: str) -> bool:
+                    original = near_duplicates.check(chunk_id, chunk.page_content)
+                    if original is None:
+                        return False
+                    rel_path, source = chunk_id_path(chunk_id), chunk_id_path(original)
+                    if source != rel_path:
+                        duplicate_of.setdefault(rel_path, set()).add(source)
+                    return True
+
+                bm25 = None
+                if HYBRID_RETRIEVAL:
+                    bm25 = BM25Index()
+                    if keyword_changed and not needs_rebuild:
+                        # Index the chunks kept from the previous snapshot without re-embedding them
+                        kept = vector_db.get(include=["documents", "metadatas"])
+                        bm25.add_many(kept["ids"], kept["documents"], kept["metadatas"])
+                    elif not needs_rebuild:
+                        bm25.load(build_path)
+                        bm25.remove(stale_ids)
+
+                def _add_batch(docs: List[Document], ids: List[str]):
+                    vector_db.add_documents(docs, ids=ids)
+                    if bm25 is not None:
+                        bm25.add_many(ids, (doc.page_content for doc in docs), (doc.metadata for doc in docs))
+
+                def _remove_ids(ids: List[str]):
+                    vector_db.delete(ids=ids)
+                    if near_duplicates is not None:
+                        near_duplicates.remove(ids)
+                    if bm25 is not None:
+                        bm25.remove(ids)
+
+                # Stream only the files that need (re-)embedding
+                text_splitter = _chunk_splitter(embeddings)
+                file_chunk_ids, stats = run_ingestion(
+                    iter_file_chunks(
+                        ((rel_path, files[rel_path]) for rel_path in to_embed),
+                        text_splitter.split_documents,
+                        workers=INGEST_LOAD_WORKERS,
+                        pdf_pages_per_task=INGEST_PDF_PAGES_PER_TASK
+                    ),
+                    make_ids=lambda rel_path, start, count: make_chunk_ids(rel_path, states[rel_path]["hash"], count, start=start),
+                    add_batch=_add_batch,
+                    total_files=len(to_embed),
+                    batch_size=batch_size,
+                    max_pending=INGEST_MAX_PENDING_FILES,
+                    progress_callback=progress_callback,
+                    remove_ids=_remove_ids,
+                    is_duplicate=_is_duplicate if near_duplicates is not None else None
+                )
+                if near_duplicates is not None:
+                    near_duplicates.save(build_path)
+                    print(f"Near-duplicate filter: dropped {stats['duplicates']} chunks")
+                
+                # Explicitly persist
+                vector_db.persist()
+                compact_report = _build_compact_vectors(vector_db, build_path, batch_size)
+                if bm25 is not None:
+                    bm25.save(build_path)
+                elif os.path.exists(os.path.join(build_path, BM25_FILENAME)):
+                    os.remove(os.path.join(build_path, BM25_FILENAME))
+                del vector_db
+            except Exception as e:
+                _release_chroma_client(version)
+                discard_snapshot(VECTOR_DB_PATH, version)
+                if isinstance(e, PermissionError):
+                    return {
+                        "success": False,
+                        "message": f"❌ Database file is locked. Please close any other instances using the database and try again. Error: {str(e)}"
+                    }
+                return {"success": False, "message": f"❌ Error building knowledge base: {str(e)}"}
+            finally:
+                if engine is not None:
+                    engine.close()
+                    print(f"Embedding engine: {engine.stats()}")
+
+        # Unchanged files that were touched keep their chunks; only their size and mtime are refreshed
+        touched = [
+            rel_path for rel_path in changes["unchanged"]
+            if any(tracked[rel_path].get(key) != value for key, value in states[rel_path].items())
+        ]
+        for rel_path in changes["removed"]:
+            tracked.pop(rel_path, None)
+        for rel_path in changes["unchanged"]:
+            tracked[rel_path].update(states[rel_path])
+        for rel_path, ids in file_chunk_ids.items():
+            # Files that failed to load stay out of the manifest so the next build retries them
+            tracked[rel_path] = dict(states[rel_path], chunk_ids=ids)
+            if rel_path in duplicate_of:
+                tracked[rel_path]["duplicate_of"] = sorted(duplicate_of[rel_path])
+        manifest["embedding_model"] = model_name
+        manifest["pipeline_version"] = INGEST_PIPELINE_VERSION
+        manifest["dedup"] = dedup_settings
+        manifest["vector_storage"] = storage_settings
+        manifest["vector_backend"] = VECTOR_BACKEND
+        manifest["bm25"] = HYBRID_RETRIEVAL
+        total_chunks = sum(len(entry["chunk_ids"]) for entry in tracked.values())
+
+        # Every ingested file counts, including one whose chunks were all near-duplicates
+        if version != current_version and (needs_rebuild or stale_ids or file_chunk_ids or sidecars_changed):
+            try:
+                save_manifest(snapshot_path(VECTOR_DB_PATH, version), manifest)
+                publish_snapshot(VECTOR_DB_PATH, version)
+            except Exception as e:
+                _release_chroma_client(version)
+                discard_snapshot(VECTOR_DB_PATH, version)
+                return {"success": False, "message": f"❌ Error publishing knowledge base: {str(e)}"}
+        else:
+            # Nothing was added, changed or removed: drop the unused copy. Only the file stats
+            # (which spare the next build from re-hashing) are refreshed, atomically, in place
+            if version != current_version:
+                _release_chroma_client(version)
+                discard_snapshot(VECTOR_DB_PATH, version)
+                version = current_version
+            if touched:
+                save_manifest(snapshot_path(VECTOR_DB_PATH, version), manifest)
+                _published_files_cache.pop(version, None)
             return {
-                "success": False,
-                "message": f"❌ Error removing existing database: {str(e)}"
+                "success": True,
+                "message": f"✅ Knowledge Base is up to date. {total_chunks} text chunks from {len(tracked)} files.",
+                "chunks": 0,
+                "documents": 0,
+                "total_chunks": total_chunks,
+                "added": changes["added"],
+                "changed": changes["changed"],
+                "removed": changes["removed"],
+                "unchanged": changes["unchanged"],
+                "version": version
             }
 
-    try:
-        # Create Vector Store
-        embeddings = get_embeddings()
-        vector_db = Chroma.from_documents(
-            documents=chunks, 
-            embedding=embeddings, 
-            persist_directory=VECTOR_DB_PATH
-        )
-        
-        # Explicitly persist and close the connection
-        vector_db.persist()
-        # Try to clean up the connection
-        try:
-            del vector_db
-        except:
-            pass
-        
-        return {
-            "success": True,
-            "message": f"✅ Knowledge Base Ready! Processed {len(chunks)} text chunks from {len(documents)} documents.",
-            "chunks": len(chunks),
-            "documents": len(documents)
-        }
-    except PermissionError as e:
-        return {
-            "success": False,
-            "message": f"❌ Database file is locked. Please close any other instances using the database and try again. Error: {str(e)}"
-        }
-    except Exception as e:
-        return {"success": False, "message": f"❌ Error building knowledge base: {str(e)}"}
+    # New callers move to the new snapshot; in-flight readers keep their lease
+    _vector_store_handle.invalidate()
+    _query_cache.clear()
+    collect_snapshot_garbage()
+    # The snapshot just retired is inside its grace period; collect it once that has passed
+    schedule_snapshot_garbage_collection(SNAPSHOT_GRACE_SECONDS + 1)
 
+    return {
+        "success": True,
+        "message": (
+            f"✅ Knowledge Base Ready! Processed {stats['chunks']} text chunks from {stats['documents']} documents "
+            f"({len(changes['added'])} added, {len(changes['changed'])} changed, "
+            f"{len(changes['removed'])} removed, {len(changes['unchanged'])} unchanged; "
+            f"{stats['duplicates']} near-duplicate chunks skipped)."
+        ),
+        "chunks": stats["chunks"],
+        "documents": stats["documents"],
+        "duplicates_removed": stats["duplicates"],
+        "compact_index": compact_report,
+        "batches": stats["batches"],
+        "chunks_per_sec": stats["chunks_per_sec"],
+        "total_chunks": total_chunks,
+        "added": changes["added"],
+        "changed": changes["changed"],
+        "removed": changes["removed"],
+        "unchanged": changes["unchanged"],
+        "version": version
+    }
 
-def generate_test_plan(query: str = "Generate comprehensive test cases", model_type: str = "auto", k: int = 5):
-    """
-    Uses RAG to generate structured Test Cases based on the knowledge base.
-    """
-    print("--- 📝 Generating Test Plan ---")
-    
-    if not os.path.exists(VECTOR_DB_PATH):
-        return {"success": False, "message": "❌ Knowledge base not found. Please build it first.", "test_cases": []}
-    
-    try:
-        embeddings = get_embeddings()
-        vector_db = Chroma(persist_directory=VECTOR_DB_PATH, embedding_function=embeddings)
-        
-        # Retrieve relevant context
-        retriever = vector_db.as_retriever(search_kwargs={"k": k})
-        
-        prompt_template = """
+
+TEST_PLAN_PROMPT = PromptTemplate(
+    template="""
 You are a Senior QA Architect. Based STRICTLY on the provided Context, generate a comprehensive list of Test Cases.
 
 CONTEXT:
@@ -274,7 +1060,7 @@ REQUIREMENTS:
 1. Cover positive flow (Happy Path) scenarios.
 2. Cover negative flow (Edge Cases and error scenarios).
 3. Specifically check for form validations, payment processing, discount codes, and shipping methods mentioned in the documents.
-4. Each test case must reference the source document it's based on.
+4. Each test case must reference the source document it's based on, copied exactly from the [Source: ...] line of the context it comes from.
 5. DO NOT invent features that are not mentioned in the context.
 
 OUTPUT FORMAT (JSON ONLY, no markdown, no code blocks):
@@ -284,17 +1070,135 @@ OUTPUT FORMAT (JSON ONLY, no markdown, no code blocks):
     "title": "Short descriptive title",
     "description": "Detailed description of what to test",
     "expected_result": "What should happen when this test passes",
-    "source_document": "filename.md or checkout.html"
+    "source_document": "file name from the [Source: ...] line"
   }}
 ]
 
 Generate at least 8-12 test cases covering all features mentioned in the context.
-"""
-        
-        PROMPT = PromptTemplate(template=prompt_template, input_variables=["context", "query"])
-        
+""",
+    input_variables=["context", "query"]
+)
+
+SELENIUM_PROMPT = PromptTemplate(
+    template="""
+You are an expert Automation Engineer specializing in Python Selenium. Write a complete, runnable Python Selenium script for the following test case.
+
+TEST CASE:
+{test_case}
+
+TARGET HTML FILE CONTENT:
+{html_content}
+
+RELEVANT DOCUMENTATION:
+{doc_context}
+
+REQUIREMENTS:
+1. Use 'from selenium import webdriver' and 'from selenium.webdriver.common.by import By'
+2. Use 'from selenium.webdriver.support.ui import WebDriverWait' and 'from selenium.webdriver.support import expected_conditions as EC'
+3. Use Explicit Waits (WebDriverWait) for finding elements. DO NOT use time.sleep().
+4. Use the EXACT IDs, names, or CSS selectors found in the HTML above (e.g., By.ID("discountCode"), By.NAME("shipping"), etc.).
+5. Use webdriver.Chrome() with ChromeDriverManager for automatic driver management.
+6. Include proper error handling and assertions.
+7. Add comments explaining key steps.
+8. The script should be fully executable and test the exact scenario described in the test case.
+9. If the test case involves form validation, check for error messages using the exact error element IDs (e.g., "emailError").
+10. If the test case involves payment, verify the success message appears.
+11. IMPORTANT: On success, print a message like "Test Case {{ID}} PASSED" and exit with sys.exit(0).
+12. IMPORTANT: On failure, print a message like "Test Case {{ID}} FAILED" and exit with sys.exit(1).
+13. Wrap the entire test in a try-except block. In the except block, print the error, take a screenshot if possible, and sys.exit(1).
+14. CRITICAL: If you need to embed HTML content in the script, use a raw string with triple quotes to avoid escape sequence warnings. For example: HTML_CONTENT = r'''<html>...</html>'''
+
+OUTPUT ONLY the Python code, no markdown, no explanations, just the code:
+""",
+    input_variables=["test_case", "html_content", "doc_context"]
+)
+
+
+def get_llm_cache() -> Optional[LLMResponseCache]:
+    """Get the process-wide on-disk LLM response cache, or None if it is disabled"""
+    if not LLM_CACHE_MAX_ENTRIES:
+        return None
+    return registry.get(
+        "llm_cache",
+        lambda: LLMResponseCache(
+            LLM_CACHE_PATH, max_entries=LLM_CACHE_MAX_ENTRIES, ttl_seconds=LLM_CACHE_TTL_SECONDS,
+            touch_interval=LLM_CACHE_TOUCH_SECONDS
+        )
+    )
+
+
+def _llm_identity(llm) -> str:
+    """Model name used in LLM cache keys; a router answers for the models of all its providers"""
+    if isinstance(llm, LLMRouter):
+        return "auto:" + ",".join(f"{provider}/{LLM_MODELS.get(provider, provider)}" for provider in llm.providers)
+    return getattr(llm, "model_name", None) or getattr(llm, "model", None) or type(llm).__name__
+
+
+def _llm_cache_key(prompt: PromptTemplate, variables: Dict, llm, temperature: float) -> Optional[str]:
+    """
+    Key of a generation in the LLM response cache (hash of the rendered
+    prompt, model and temperature). Cassettes bypass the cache: every
+    recorded call must reach the model, and replays must pay their latency.
+    """
+    if get_llm_cache() is None or isinstance(llm, CassetteLLM):
+        return None
+    return llm_cache_key(_llm_identity(llm), temperature, prompt.format(**variables))
+
+
+def get_chain(name: str, prompt: PromptTemplate, llm):
+    """
+    Get the prebuilt prompt | llm | StrOutputParser() chain for an LLM client.
+    Each chain is composed once per (name, client) and reused; clients from
+    get_llm() live for the whole process, so their ids stay unique.
+    """
+    return registry.get(f"chain/{name}/{id(llm)}", lambda: prompt | llm | StrOutputParser())
+
+
+def _test_plan_request(query: str, k: int, filters: Optional[Dict]) -> str:
+    """Stable identity of a test plan request, keying its cassette entry"""
+    return json.dumps({"template": "test_plan", "query": query, "k": k, "filters": filters}, sort_keys=True)
+
+
+def _selenium_request(test_case_json: Dict, html_content: str) -> str:
+    """Stable identity of a Selenium script request, keying its cassette entry"""
+    return json.dumps({
+        "template": "selenium",
+        "test_case": test_case_json,
+        "html_sha256": hashlib.sha256(html_content.encode("utf-8")).hexdigest(),
+    }, sort_keys=True)
+
+
+def _test_plan_context(query: str, token_budget: int, k: int, filters: Optional[Dict]) -> PackedContext:
+    """Cheap wide first pass, cross-encoder rerank, then pack the k most relevant, diverse chunks into the model's budget"""
+    candidates = retrieve_documents(query, k=first_stage_k(k), filters=filters)
+    relevant_docs = rerank_documents([query], [candidates], k * CONTEXT_FETCH_FACTOR)[0]
+    packed = pack_documents(query, relevant_docs, token_budget, k)
+    print(f"Context: {packed.tokens} tokens from {len(packed.documents)} chunks ({packed.tokens_saved} tokens saved)")
+    return packed
+
+
+def generate_test_plan(
+    query: str = "Generate comprehensive test cases",
+    model_type: str = "auto",
+    k: int = 5,
+    filters: Optional[Dict] = None,
+    use_cache: bool = True
+):
+    """
+    Uses RAG to generate structured Test Cases based on the knowledge base.
+    filters optionally restricts retrieval by source_file, file_type or section.
+    Valid responses are cached by rendered prompt, model and temperature;
+    use_cache=False regenerates (and refreshes the cached response).
+    """
+    print("--- 📝 Generating Test Plan ---")
+    
+    if read_index_version(VECTOR_DB_PATH) is None:
+        return {"success": False, "message": "❌ Knowledge base not found. Please build it first.", "test_cases": []}
+    
+    temperature = 0.1
+    try:
         try:
-            llm = get_llm(model_type=model_type, temperature=0.1)
+            llm = get_llm(model_type=model_type, temperature=temperature)
         except Exception as llm_error:
             return {
                 "success": False,
@@ -302,35 +1206,40 @@ Generate at least 8-12 test cases covering all features mentioned in the context
                 "test_cases": []
             }
         
-        # Use modern LangChain LCEL pattern
-        def format_docs(docs):
-            return "\n\n".join(doc.page_content for doc in docs)
-        
-        rag_chain = (
-            {"context": retriever | format_docs, "query": RunnablePassthrough()}
-            | PROMPT
-            | llm
-            | StrOutputParser()
-        )
-        
-        result = rag_chain.invoke(query)
-        raw_response = result if isinstance(result, str) else str(result)
+        token_budget, run_config = _plan_llm_call(llm, _test_plan_request(query, k, filters))
+        packed = _test_plan_context(query, token_budget, k, filters)
+        variables = {"context": packed.text, "query": query}
+        cache_key = _llm_cache_key(TEST_PLAN_PROMPT, variables, llm, temperature)
+        raw_response = get_llm_cache().get(cache_key) if cache_key and use_cache else None
+        cached = raw_response is not None
+        if not cached:
+            # Prebuilt LCEL chain, shared by every call on this client
+            result = get_chain("test_plan", TEST_PLAN_PROMPT, llm).invoke(variables, config=run_config)
+            raw_response = result if isinstance(result, str) else str(result)
         
         # Use our utility to clean the JSON
         structured_data = clean_llm_json(raw_response)
         
         if isinstance(structured_data, list) and len(structured_data) > 0:
+            # Only valid responses are cached, so "Try again" really asks the model again
+            if cache_key and not cached:
+                get_llm_cache().put(cache_key, raw_response)
             return {
                 "success": True,
                 "message": f"✅ Generated {len(structured_data)} test cases.",
-                "test_cases": structured_data
+                "test_cases": structured_data,
+                "context_tokens": packed.tokens,
+                "tokens_saved": packed.tokens_saved,
+                "cached": cached
             }
         else:
             return {
                 "success": False,
                 "message": "❌ Failed to generate valid test cases. Please try again.",
                 "test_cases": [],
-                "raw_response": raw_response
+                "raw_response": raw_response,
+                "context_tokens": packed.tokens,
+                "tokens_saved": packed.tokens_saved
             }
     except Exception as e:
         return {
@@ -340,10 +1249,139 @@ Generate at least 8-12 test cases covering all features mentioned in the context
         }
 
 
-def generate_selenium_code(test_case_json: Dict, html_content: Optional[str] = None, model_type: str = "auto"):
+def generate_test_plan_stream(
+    query: str = "Generate comprehensive test cases",
+    model_type: str = "auto",
+    k: int = 5,
+    filters: Optional[Dict] = None,
+    use_cache: bool = True
+) -> Iterator[Dict]:
+    """
+    Streaming variant of generate_test_plan().
+    Consumes the LLM response as it is generated and yields
+    {"event": "test_case", "test_case": {...}} as soon as each test case
+    object is complete, then a final {"event": "result", ...} event holding
+    the generate_test_plan() result plus first_test_case_seconds and
+    total_seconds.
+    """
+    print("--- 📝 Streaming Test Plan ---")
+    start = time.perf_counter()
+    
+    if read_index_version(VECTOR_DB_PATH) is None:
+        yield {"event": "result", "success": False, "message": "❌ Knowledge base not found. Please build it first.", "test_cases": []}
+        return
+    
+    temperature = 0.1
+    try:
+        llm = get_llm(model_type=model_type, temperature=temperature)
+    except Exception as llm_error:
+        yield {"event": "result", "success": False, "message": f"❌ LLM Error: {str(llm_error)}", "test_cases": []}
+        return
+    
+    try:
+        token_budget, run_config = _plan_llm_call(llm, _test_plan_request(query, k, filters))
+        packed = _test_plan_context(query, token_budget, k, filters)
+        variables = {"context": packed.text, "query": query}
+        cache_key = _llm_cache_key(TEST_PLAN_PROMPT, variables, llm, temperature)
+        cached_response = get_llm_cache().get(cache_key) if cache_key and use_cache else None
+        cached = cached_response is not None
+        if cached:
+            chunks = [cached_response]
+        else:
+            chunks = get_chain("test_plan", TEST_PLAN_PROMPT, llm).stream(variables, config=run_config)
+        
+        parser = IncrementalJSONArrayParser()
+        pieces = []
+        test_cases = []
+        first_test_case_seconds = None
+        for chunk in chunks:
+            pieces.append(chunk)
+            for test_case in parser.feed(chunk):
+                if first_test_case_seconds is None:
+                    first_test_case_seconds = round(time.perf_counter() - start, 3)
+                test_cases.append(test_case)
+                yield {"event": "test_case", "test_case": test_case}
+        raw_response = "".join(pieces)
+        
+        if not test_cases:
+            # Not a bare JSON array (e.g. an object wrapping it): fall back to parsing the whole response
+            structured_data = clean_llm_json(raw_response)
+            if isinstance(structured_data, list):
+                for test_case in structured_data:
+                    test_cases.append(test_case)
+                    yield {"event": "test_case", "test_case": test_case}
+        
+        timings = {
+            "first_test_case_seconds": first_test_case_seconds,
+            "total_seconds": round(time.perf_counter() - start, 3)
+        }
+        if test_cases:
+            if cache_key and not cached:
+                get_llm_cache().put(cache_key, raw_response)
+            yield {
+                "event": "result",
+                "success": True,
+                "message": f"✅ Generated {len(test_cases)} test cases.",
+                "test_cases": test_cases,
+                "context_tokens": packed.tokens,
+                "tokens_saved": packed.tokens_saved,
+                "cached": cached,
+                **timings
+            }
+        else:
+            yield {
+                "event": "result",
+                "success": False,
+                "message": "❌ Failed to generate valid test cases. Please try again.",
+                "test_cases": [],
+                "raw_response": raw_response,
+                **timings
+            }
+    except Exception as e:
+        yield {"event": "result", "success": False, "message": f"❌ Error generating test plan: {str(e)}", "test_cases": []}
+
+
+def _test_case_query(test_case_json: Dict) -> str:
+    return f"{test_case_json.get('title', '')} {test_case_json.get('description', '')}"
+
+
+def retrieve_test_case_context(test_cases: List[Dict], k: int = 3) -> List[List[Document]]:
+    """
+    Retrieve the documentation context candidates of many test cases in one
+    batch, for packing k chunks per test case.
+    Each test case searches only its source_document, checked against the
+    indexed files (see source_filter()); test cases naming no indexed file,
+    or whose filter matches nothing, search the whole knowledge base. The
+    wide first-stage results are then reranked together.
+    """
+    if not test_cases:
+        return []
+    queries = [_test_case_query(tc) for tc in test_cases]
+    known_files = published_files()
+    filters = [source_filter(tc.get("source_document", ""), known_files) for tc in test_cases]
+    wide_k = first_stage_k(k)
+    results = retrieve_documents_batch(queries, k=wide_k, filters=filters)
+    retry = [i for i, docs in enumerate(results) if filters[i] and not docs]
+    if retry:
+        for i, docs in zip(retry, retrieve_documents_batch([queries[i] for i in retry], k=wide_k)):
+            results[i] = docs
+    return rerank_documents(queries, results, k * CONTEXT_FETCH_FACTOR)
+
+
+def generate_selenium_code(
+    test_case_json: Dict,
+    html_content: Optional[str] = None,
+    model_type: str = "auto",
+    relevant_docs: Optional[List[Document]] = None,
+    use_cache: bool = True
+):
     """
     Generates a Python Selenium script for the given test case.
     Context: The specific Test Case + The RAW HTML file.
+    relevant_docs, if given, are the candidate chunks packed into the
+    documentation context instead of retrieving them (see
+    generate_selenium_code_batch).
+    Responses are cached like in generate_test_plan().
     """
     print(f"--- 🤖 Generating Code for {test_case_json.get('id', 'Unknown')} ---")
     
@@ -360,74 +1398,61 @@ def generate_selenium_code(test_case_json: Dict, html_content: Optional[str] = N
                 "code": ""
             }
     
+    temperature = 0.0
+    try:
+        llm = get_llm(model_type=model_type, temperature=temperature)
+        token_budget, run_config = _plan_llm_call(llm, _selenium_request(test_case_json, html_content))
+    except Exception as e:
+        return {
+            "success": False,
+            "message": f"❌ Error generating script: {str(e)}",
+            "code": ""
+        }
+    
     # Retrieve relevant documentation for context
-    doc_context = ""
+    query = _test_case_query(test_case_json)
+    packed = PackedContext("", [], 0, 0)
     try:
-        if os.path.exists(VECTOR_DB_PATH):
-            embeddings = get_embeddings()
-            vector_db = Chroma(persist_directory=VECTOR_DB_PATH, embedding_function=embeddings)
-            retriever = vector_db.as_retriever(search_kwargs={"k": 3})
-            
-            # Search for relevant docs based on test case
-            source_doc = test_case_json.get("source_document", "")
-            query = f"{test_case_json.get('title', '')} {test_case_json.get('description', '')}"
-            relevant_docs = retriever.get_relevant_documents(query)
-            doc_context = "\n\n".join([doc.page_content for doc in relevant_docs])
+        if relevant_docs is None and read_index_version(VECTOR_DB_PATH) is not None:
+            # Source-document search with knowledge-base fallback, then rerank
+            relevant_docs = retrieve_test_case_context([test_case_json], k=3)[0]
+        if relevant_docs:
+            packed = pack_documents(query, relevant_docs, token_budget, k=3)
     except Exception as e:
         print(f"Warning: Could not retrieve document context: {e}")
+    doc_context = packed.text
     
-    # Construct Prompt
-    prompt = f"""
-You are an expert Automation Engineer specializing in Python Selenium. Write a complete, runnable Python Selenium script for the following test case.
-
-TEST CASE:
-{json.dumps(test_case_json, indent=2)}
-
-TARGET HTML FILE CONTENT:
-{html_content}
-
-RELEVANT DOCUMENTATION:
-{doc_context}
-
-REQUIREMENTS:
-1. Use 'from selenium import webdriver' and 'from selenium.webdriver.common.by import By'
-2. Use 'from selenium.webdriver.support.ui import WebDriverWait' and 'from selenium.webdriver.support import expected_conditions as EC'
-3. Use Explicit Waits (WebDriverWait) for finding elements. DO NOT use time.sleep().
-4. Use the EXACT IDs, names, or CSS selectors found in the HTML above (e.g., By.ID("discountCode"), By.NAME("shipping"), etc.).
-5. Use webdriver.Chrome() with ChromeDriverManager for automatic driver management.
-6. Include proper error handling and assertions.
-7. Add comments explaining key steps.
-8. The script should be fully executable and test the exact scenario described in the test case.
-9. If the test case involves form validation, check for error messages using the exact error element IDs (e.g., "emailError").
-10. If the test case involves payment, verify the success message appears.
-11. IMPORTANT: On success, print a message like "Test Case {{ID}} PASSED" and exit with sys.exit(0).
-12. IMPORTANT: On failure, print a message like "Test Case {{ID}} FAILED" and exit with sys.exit(1).
-13. Wrap the entire test in a try-except block. In the except block, print the error, take a screenshot if possible, and sys.exit(1).
-14. CRITICAL: If you need to embed HTML content in the script, use a raw string with triple quotes to avoid escape sequence warnings. For example: HTML_CONTENT = r'''<html>...</html>'''
-
-OUTPUT ONLY the Python code, no markdown, no explanations, just the code:
-"""
+    # Selectors only need the markup, not its indentation or comments
+    compact_html_content = compact_html(html_content)
+    html_tokens = count_tokens(compact_html_content)
+    tokens_saved = packed.tokens_saved + max(0, count_tokens(html_content) - html_tokens)
     
     try:
-        llm = get_llm(model_type=model_type, temperature=0.0)
-        response = llm.invoke(prompt)
-        
-        # Extract content (handle different response types)
-        if hasattr(response, 'content'):
-            code = response.content
-        elif isinstance(response, str):
-            code = response
-        else:
-            code = str(response)
+        variables = {
+            "test_case": json.dumps(test_case_json, indent=2),
+            "html_content": compact_html_content,
+            "doc_context": doc_context
+        }
+        cache_key = _llm_cache_key(SELENIUM_PROMPT, variables, llm, temperature)
+        code = get_llm_cache().get(cache_key) if cache_key and use_cache else None
+        cached = code is not None
+        if not cached:
+            # Prebuilt chain; StrOutputParser handles both chat messages and plain completions
+            code = get_chain("selenium", SELENIUM_PROMPT, llm).invoke(variables, config=run_config)
         
         # Clean the code
         from app.utils import clean_python_code
         clean_code = clean_python_code(code)
+        if cache_key and not cached and clean_code.strip():
+            get_llm_cache().put(cache_key, code)
         
         return {
             "success": True,
             "message": f"✅ Generated Selenium script for {test_case_json.get('id', 'Unknown')}",
-            "code": clean_code
+            "code": clean_code,
+            "context_tokens": packed.tokens + html_tokens,
+            "tokens_saved": tokens_saved,
+            "cached": cached
         }
     except Exception as e:
         return {
@@ -435,3 +1460,33 @@ OUTPUT ONLY the Python code, no markdown, no explanations, just the code:
             "message": f"❌ Error generating script: {str(e)}",
             "code": ""
         }
+
+
+def generate_selenium_code_batch(
+    test_cases: List[Dict],
+    html_content: Optional[str] = None,
+    model_type: str = "auto",
+    progress_callback: Optional[Callable[[int, int], None]] = None,
+    use_cache: bool = True
+) -> List[Dict]:
+    """
+    Generates Selenium scripts for many test cases.
+    Documentation context for all of them is retrieved in one batch before
+    the per-test-case LLM calls. progress_callback, if given, is called with
+    (done, total) after every script.
+    Returns one generate_selenium_code() result per test case, in order.
+    """
+    contexts: List[Optional[List[Document]]] = [None] * len(test_cases)
+    try:
+        if test_cases and read_index_version(VECTOR_DB_PATH) is not None:
+            contexts = retrieve_test_case_context(test_cases, k=3)
+    except Exception as e:
+        print(f"Warning: Could not retrieve document context: {e}")
+        contexts = [[] for _ in test_cases]
+
+    results = []
+    for i, (test_case, docs) in enumerate(zip(test_cases, contexts)):
+        results.append(generate_selenium_code(test_case, html_content, model_type, relevant_docs=docs, use_cache=use_cache))
+        if progress_callback:
+            progress_callback(i + 1, len(test_cases))
+    return results
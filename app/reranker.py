@@ -0,0 +1,100 @@
+"""
+Reranker - Cross-encoder second retrieval stage that rescores a wide set of
+first-stage candidates, with scores cached per (query, chunk) pair.
+"""
+
+from typing import List, Optional, Sequence, Tuple
+
+from langchain_core.documents import Document
+
+from app.embedding_cache import EmbeddingCache, embedding_key
+
+try:
+    from sentence_transformers import CrossEncoder
+    HAS_CROSS_ENCODER = True
+except ImportError:
+    HAS_CROSS_ENCODER = False
+
+
+def load_cross_encoder(model_name: str):
+    """Load a local sentence-transformers cross-encoder."""
+    if not HAS_CROSS_ENCODER:
+        raise ImportError("Cross-encoder reranking needs sentence-transformers. Install with: pip install sentence-transformers")
+    return CrossEncoder(model_name)
+
+
+class CrossEncoderReranker:
+    """
+    Scores (query, chunk) pairs with a cross-encoder.
+
+    Scores live in an EmbeddingCache as one-element vectors, so each pair is
+    run through the model once; only cache misses reach predict(), in a
+    single call per rerank.
+    """
+
+    def __init__(self, model, model_name: str, cache: Optional[EmbeddingCache] = None, batch_size: int = 32):
+        self.model = model
+        self.model_name = model_name
+        self.cache = cache
+        self.batch_size = batch_size
+
+    def _key(self, query: str, text: str) -> str:
+        return embedding_key(self.model_name, f"rerank\0{query}\0{text}")
+
+    def score(self, pairs: List[Tuple[str, str]]) -> List[float]:
+        """
+        Relevance scores of (query, text) pairs; higher is more relevant.
+
+        Args:
+            pairs: (query, chunk text) tuples
+
+        Returns:
+            One score per pair, in order
+        """
+        keys = [self._key(query, text) for query, text in pairs]
+        cached = self.cache.get_many(keys) if self.cache is not None else [None] * len(keys)
+
+        # Score each distinct missing pair once
+        missing = {}
+        for i, vector in enumerate(cached):
+            if vector is None:
+                missing.setdefault(keys[i], pairs[i])
+        computed = {}
+        if missing:
+            missing_keys = list(missing)
+            predicted = self.model.predict(
+                [list(missing[key]) for key in missing_keys], batch_size=self.batch_size, show_progress_bar=False
+            )
+            computed = {key: float(score) for key, score in zip(missing_keys, predicted)}
+            if self.cache is not None:
+                self.cache.put_many(missing_keys, [[score] for score in computed.values()])
+        return [vector[0] if vector is not None else computed[key] for key, vector in zip(keys, cached)]
+
+    def rerank_many(
+        self,
+        queries: Sequence[str],
+        document_lists: Sequence[List[Document]],
+        top_n: Optional[int] = None
+    ) -> List[List[Tuple[Document, float]]]:
+        """
+        Rerank the candidates of many queries with one model call.
+
+        Args:
+            queries: Queries
+            document_lists: First-stage candidates of each query
+            top_n: Candidates kept per query (all if None)
+
+        Returns:
+            Per query, (document, score) pairs sorted by descending score
+        """
+        pairs = [(query, doc.page_content) for query, docs in zip(queries, document_lists) for doc in docs]
+        scores = iter(self.score(pairs))
+        ranked = []
+        for docs in document_lists:
+            scored = sorted(((doc, next(scores)) for doc in docs), key=lambda item: item[1], reverse=True)
+            ranked.append(scored[:top_n] if top_n is not None else scored)
+        return ranked
+
+    def rerank(self, query: str, documents: List[Document], top_n: Optional[int] = None) -> List[Tuple[Document, float]]:
+        """Rerank one query's candidates; see rerank_many()."""
+        return self.rerank_many([query], [documents], top_n)[0]
@@ -9,7 +9,10 @@ project_root = Path(__file__).parent.parent
 if str(project_root) not in sys.path:
     sys.path.insert(0, str(project_root))
 
-from app.rag_engine import ingest_knowledge_base, generate_test_plan, generate_selenium_code
+from app.rag_engine import (
+    ingest_knowledge_base, generate_test_plan_stream, generate_selenium_code, generate_selenium_code_batch,
+    warm_up_embeddings, warm_up_reranker
+)
 from app.utils import save_generated_script
 from app.test_runner import run_all_test_scripts, generate_test_summary, run_selenium_script
 
@@ -20,6 +23,10 @@ st.set_page_config(
     layout="wide"
 )
 
+# Load the embeddings and reranker models in the background while the page renders
+warm_up_embeddings()
+warm_up_reranker()
+
 # Initialize session state
 if "knowledge_base_built" not in st.session_state:
     st.session_state.knowledge_base_built = False
@@ -213,9 +220,9 @@ st.markdown("---")
 col1, col2, col3 = st.columns([1, 1, 1])
 with col1:
     force_rebuild = st.checkbox(
-        "Force Rebuild (Delete existing)",
-        value=True,
-        help="If checked, will delete and rebuild the knowledge base. Uncheck to update existing."
+        "Force Rebuild (Re-embed everything)",
+        value=False,
+        help="If checked, will rebuild the knowledge base from scratch. Otherwise only added, changed or removed files are re-processed."
     )
 with col2:
     build_kb_button = st.button(
@@ -228,7 +235,17 @@ with col2:
 if build_kb_button:
     with st.spinner("🧠 Building knowledge base... This may take a moment."):
         try:
-            result = ingest_knowledge_base(force_rebuild=force_rebuild)
+            build_progress = st.progress(0.0)
+            
+            def report_build_progress(progress):
+                total_files = progress["total_files"] or 1
+                build_progress.progress(
+                    min(progress["files"] / total_files, 1.0),
+                    text=f"Embedded {progress['chunks']} chunks from {progress['files']}/{progress['total_files']} files"
+                )
+            
+            result = ingest_knowledge_base(force_rebuild=force_rebuild, progress_callback=report_build_progress)
+            build_progress.empty()
             
             if result.get("success"):
                 st.session_state.knowledge_base_built = True
@@ -274,8 +291,17 @@ else:
             type="primary",
             use_container_width=True
         )
+    regenerate_tc_button = False
+    if st.session_state.test_cases:
+        with col3:
+            # Asks the model again instead of serving the cached response
+            regenerate_tc_button = st.button(
+                "🔁 Regenerate",
+                use_container_width=True,
+                help="Ignore the LLM response cache and generate new test cases"
+            )
     
-    if generate_tc_button:
+    if generate_tc_button or regenerate_tc_button:
         # Show which model will be used
         model_names = {
             "auto": "Auto Mode",
@@ -285,13 +311,36 @@ else:
         }
         st.info(f"🔄 Using **{model_names.get(selected_model, 'Auto Mode')}** to generate test cases...")
         
+        live_test_cases = st.empty()
         with st.spinner("📝 Generating test cases... This may take a moment."):
             try:
-                result = generate_test_plan(query=test_query, model_type=selected_model)
+                result = {"success": False, "message": "❌ No response from the test case generator.", "test_cases": []}
+                received = []
+                for event in generate_test_plan_stream(
+                    query=test_query, model_type=selected_model, use_cache=not regenerate_tc_button
+                ):
+                    if event["event"] == "test_case":
+                        # Show each test case as soon as the LLM has finished writing it
+                        received.append(event["test_case"])
+                        live_test_cases.markdown("\n".join(
+                            f"- **{tc.get('id', 'Unknown')}**: {tc.get('title', 'No title')}" for tc in received
+                        ))
+                    else:
+                        result = event
+                live_test_cases.empty()
                 
                 if result.get("success"):
                     st.session_state.test_cases = result.get("test_cases", [])
                     st.success(result["message"])
+                    if "context_tokens" in result:
+                        st.caption(f"📦 Context: {result['context_tokens']} tokens ({result['tokens_saved']} saved by packing)")
+                    if result.get("cached"):
+                        st.caption("⚡ Served from the LLM response cache")
+                    elif result.get("first_test_case_seconds") is not None:
+                        st.caption(
+                            f"⏱️ First test case after {result['first_test_case_seconds']}s, "
+                            f"all {len(st.session_state.test_cases)} after {result['total_seconds']}s"
+                        )
                 else:
                     st.error(result["message"])
                     error_msg = result.get("message", "").lower()
@@ -407,16 +456,15 @@ else:
             
             # Step 1: Generate all scripts
             status_text.text("📝 Step 1/3: Generating scripts for all test cases...")
-            for idx, test_case in enumerate(st.session_state.test_cases):
+            # Context for every test case is retrieved in one batch
+            batch_results = generate_selenium_code_batch(
+                st.session_state.test_cases,
+                html_content=html_content,
+                model_type=selected_model,
+                progress_callback=lambda done, total: progress_bar.progress(done / (total * 3))  # Divide by 3 for 3 steps
+            )
+            for idx, (test_case, result) in enumerate(zip(st.session_state.test_cases, batch_results)):
                 tc_id = test_case.get("id", f"TC-{idx+1:03d}")
-                progress_bar.progress((idx + 1) / (total_tcs * 3))  # Divide by 3 for 3 steps
-                
-                result = generate_selenium_code(
-                    test_case_json=test_case,
-                    html_content=html_content,
-                    model_type=selected_model
-                )
-                
                 if result.get("success"):
                     filename = f"{tc_id}.py"
                     save_generated_script(filename, result.get("code", ""))
@@ -461,7 +509,9 @@ else:
                 result = generate_selenium_code(
                     test_case_json=selected_test_case,
                     html_content=html_content,
-                    model_type=selected_model
+                    model_type=selected_model,
+                    # A retried script must not come back from the response cache unchanged
+                    use_cache=not st.session_state.pop("force_regenerate", False)
                 )
                 
                 if result.get("success"):
@@ -471,6 +521,10 @@ else:
                     filename = f"{tc_id}.py"
                     saved_path = save_generated_script(filename, st.session_state.generated_script)
                     st.success(f"✅ {result['message']} Script saved to: {saved_path}")
+                    if "context_tokens" in result:
+                        st.caption(f"📦 Context: {result['context_tokens']} tokens ({result['tokens_saved']} saved by packing)")
+                    if result.get("cached"):
+                        st.caption("⚡ Served from the LLM response cache")
                     
                     # Run the script immediately to get pass/fail status
                     with st.spinner("▶️ Running test script..."):
@@ -523,6 +577,7 @@ else:
                 st.session_state.generated_script = None
                 st.session_state.single_test_result = None
                 st.session_state.last_generated_option = None
+                st.session_state.force_regenerate = True
                 st.rerun()
 
 # Phase 4: Test Execution Results
@@ -26,6 +26,69 @@ def clean_llm_json(response_text: str):
         print(f"Raw Text: {text}")
         return []
 
+class IncrementalJSONArrayParser:
+    """
+    Parses a JSON array of objects while its text is still arriving.
+    feed() returns every top-level object completed by the new text, so
+    each one can be used before the array is finished. Text before the
+    opening '[' (such as a ```json fence) and after the closing ']' is ignored.
+    """
+
+    def __init__(self):
+        self.done = False
+        self._buffer = ""
+        self._position = 0
+        self._in_array = False
+        self._in_string = False
+        self._escaped = False
+        self._depth = 0
+        self._start = None
+
+    def feed(self, text: str) -> list:
+        """Add the next piece of text and return the objects it completed."""
+        if self.done:
+            return []
+        buffer = self._buffer + text
+        items = []
+        i = self._position
+        while i < len(buffer) and not self.done:
+            char = buffer[i]
+            if not self._in_array:
+                self._in_array = char == "["
+            elif self._in_string:
+                if self._escaped:
+                    self._escaped = False
+                elif char == "\\":
+                    self._escaped = True
+                elif char == '"':
+                    self._in_string = False
+            elif char == '"':
+                self._in_string = True
+            elif char in "{[":
+                if self._depth == 0 and char == "{":
+                    self._start = i
+                self._depth += 1
+            elif char in "}]":
+                if self._depth == 0:
+                    self.done = char == "]"
+                else:
+                    self._depth -= 1
+                    if self._depth == 0 and self._start is not None:
+                        try:
+                            items.append(json.loads(buffer[self._start:i + 1]))
+                        except json.JSONDecodeError as e:
+                            print(f"❌ JSON Parsing Error: {e}")
+                        self._start = None
+            i += 1
+        # Keep only the unfinished object, if any
+        keep = self._start if self._start is not None else i
+        self._buffer = buffer[keep:]
+        self._position = i - keep
+        if self._start is not None:
+            self._start = 0
+        return items
+
+
 def clean_python_code(response_text: str):
     """
     Extracts pure Python code from LLM response, removing markdown formatting.
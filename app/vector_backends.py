@@ -0,0 +1,534 @@
+"""
+Vector Backends - Interchangeable stores for a snapshot's chunks and vectors:
+Chroma, a memory-mapped NumPy matrix searched by brute force, and HNSW.
+"""
+
+import json
+import os
+from typing import Dict, Iterable, Iterator, List, Optional, Sequence, Tuple
+
+import numpy as np
+from langchain_community.vectorstores import Chroma
+from langchain_core.documents import Document
+from langchain_core.embeddings import Embeddings
+
+from app.quantization import top_k_indices
+
+try:
+    import hnswlib
+    HAS_HNSWLIB = True
+except ImportError:
+    HAS_HNSWLIB = False
+
+VECTOR_BACKENDS = ("chroma", "numpy", "hnsw")
+# Chunk metadata that retrieval can filter on
+FILTER_FIELDS = ("source_file", "file_type", "section")
+VECTORS_FILENAME = "vectors.npy"
+RECORDS_FILENAME = "records.jsonl"
+LEGACY_RECORDS_FILENAME = "records.json"
+# Chunks added since the last persist()
+PENDING_VECTORS_FILENAME = "vectors.pending.f32"
+PENDING_RECORDS_FILENAME = "records.pending.jsonl"
+HNSW_FILENAME = "hnsw_index.bin"
+
+
+class VectorBackend:
+    """
+    Interface shared by the vector backends.
+
+    It is the subset of langchain's Chroma API the RAG engine uses, so
+    Chroma only needs its search results to carry the chunk IDs.
+    Returned Documents have their chunk ID as Document.id.
+    """
+
+    embeddings: Embeddings
+
+    def add_documents(self, documents: List[Document], ids: List[str]) -> List[str]:
+        """Embed and store documents under the given IDs, replacing existing ones."""
+        raise NotImplementedError
+
+    def delete(self, ids: List[str]) -> None:
+        """Remove documents by ID; unknown IDs are ignored."""
+        raise NotImplementedError
+
+    def get(self, ids: Optional[List[str]] = None, include: Sequence[str] = ("documents", "metadatas")) -> Dict:
+        """Stored records as {"ids", and "embeddings"/"documents"/"metadatas" as included}."""
+        raise NotImplementedError
+
+    def similarity_search(self, query: str, k: int = 4, filter: Optional[Dict] = None) -> List[Document]:
+        """The k documents nearest to the query by squared L2 distance, among those matching filter."""
+        return self.similarity_search_by_vector(self.embeddings.embed_query(query), k=k, filter=filter)
+
+    def similarity_search_by_vector(self, embedding: List[float], k: int = 4, filter: Optional[Dict] = None) -> List[Document]:
+        raise NotImplementedError
+
+    def persist(self) -> None:
+        """Write pending changes to disk."""
+        raise NotImplementedError
+
+    def search_vectors(self, vectors: np.ndarray, k: int = 4, filter: Optional[Dict] = None) -> List[List[Document]]:
+        """The k nearest documents for each row of a query matrix, all under the same filter."""
+        return [self.similarity_search_by_vector(vector, k=k, filter=filter) for vector in vectors]
+
+    def batch_search(
+        self,
+        queries: List[str],
+        vectors: np.ndarray,
+        k: int = 4,
+        filters: Optional[List[Optional[Dict]]] = None,
+    ) -> List[List[Document]]:
+        """
+        Search many queries at once; queries sharing a filter are answered by one search_vectors() call.
+
+        Args:
+            queries: Query texts (used by keyword-aware stores)
+            vectors: Query embeddings, one row per query
+            k: Number of documents per query
+            filters: Optional metadata filter per query
+
+        Returns:
+            One list of documents per query, in input order
+        """
+        results: List[List[Document]] = [[] for _ in queries]
+        for filter, positions in group_by_filter(filters, len(queries)):
+            for position, documents in zip(positions, self.search_vectors(np.asarray(vectors)[positions], k=k, filter=filter)):
+                results[position] = documents
+        return results
+
+
+def group_by_filter(filters: Optional[List[Optional[Dict]]], count: int) -> List[Tuple[Optional[Dict], List[int]]]:
+    """Group query positions by identical filter, as (filter, positions) pairs."""
+    groups: Dict[str, Tuple[Optional[Dict], List[int]]] = {}
+    for position in range(count):
+        filter = filters[position] if filters else None
+        key = json.dumps(filter, sort_keys=True, default=str)
+        groups.setdefault(key, (filter, []))[1].append(position)
+    return list(groups.values())
+
+
+def embed_queries(embeddings: Embeddings, queries: List[str]) -> np.ndarray:
+    """Embed many queries in one model call when the embeddings support it."""
+    if hasattr(embeddings, "embed_queries"):
+        return np.asarray(embeddings.embed_queries(queries), dtype=np.float32)
+    # Every model used here embeds queries exactly like documents
+    return np.asarray(embeddings.embed_documents(queries), dtype=np.float32)
+
+
+def metadata_matches(metadata: Dict, filter: Optional[Dict]) -> bool:
+    """
+    Whether chunk metadata satisfies a filter.
+
+    A filter maps metadata keys to a value or a list of accepted values,
+    e.g. {"source_file": ["checkout.html", "product_specs.md"]}; all keys must match.
+    """
+    if not filter:
+        return True
+    for key, accepted in filter.items():
+        value = metadata.get(key)
+        if isinstance(accepted, (list, tuple, set)):
+            if value not in accepted:
+                return False
+        elif value != accepted:
+            return False
+    return True
+
+
+def chroma_where(filter: Optional[Dict]) -> Optional[Dict]:
+    """Translate a metadata filter into a Chroma where clause."""
+    if not filter:
+        return None
+    clauses = [
+        {key: {"$in": list(accepted)}} if isinstance(accepted, (list, tuple, set)) else {key: accepted}
+        for key, accepted in filter.items()
+    ]
+    return clauses[0] if len(clauses) == 1 else {"$and": clauses}
+
+
+def _write_atomic(path: str, write) -> None:
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "wb") as f:
+        write(f)
+    os.replace(tmp_path, path)
+
+
+class ChromaVectorStore(Chroma, VectorBackend):
+    """Chroma whose search results carry their chunk IDs."""
+
+    def similarity_search(self, query: str, k: int = 4, filter: Optional[Dict] = None, **kwargs) -> List[Document]:
+        return self.similarity_search_by_vector(self.embeddings.embed_query(query), k=k, filter=filter)
+
+    def similarity_search_by_vector(self, embedding: List[float], k: int = 4, filter: Optional[Dict] = None, **kwargs) -> List[Document]:
+        return self.search_vectors(np.asarray([embedding], dtype=np.float32), k=k, filter=filter)[0]
+
+    def search_vectors(self, vectors: np.ndarray, k: int = 4, filter: Optional[Dict] = None) -> List[List[Document]]:
+        if not len(vectors):
+            return []
+        results = self._collection.query(
+            query_embeddings=np.asarray(vectors, dtype=np.float32), n_results=k,
+            where=chroma_where(filter), include=["documents", "metadatas"]
+        )
+        return [
+            [
+                Document(id=chunk_id, page_content=text, metadata=metadata or {})
+                for chunk_id, text, metadata in zip(ids, documents, metadatas)
+            ]
+            for ids, documents, metadatas in zip(results["ids"], results["documents"], results["metadatas"])
+        ]
+
+
+class NumpyVectorStore(VectorBackend):
+    """
+    Chunks in a JSON-lines file and vectors in a memory-mapped float32 matrix.
+
+    Queries are one matrix-vector product over the whole matrix, which for
+    small and medium corpora is faster than any index traversal. Only chunk
+    IDs and file offsets are held in memory; texts and metadata are read
+    for the rows a search returns. Added chunks are appended to spill files
+    next to the store and persist() streams the live rows into new files,
+    so building a store takes memory independent of the corpus size.
+    """
+
+    # Rows read from disk at a time by scans and persist()
+    block_rows = 65_536
+
+    def __init__(self, path: str, embeddings: Embeddings):
+        self.path = path
+        self.embeddings = embeddings
+        os.makedirs(path, exist_ok=True)
+        # Spill files left by an interrupted build have no offsets to go with them
+        for name in (PENDING_VECTORS_FILENAME, PENDING_RECORDS_FILENAME):
+            if os.path.exists(os.path.join(path, name)):
+                os.remove(os.path.join(path, name))
+        self._load()
+
+    def _load(self) -> None:
+        records_path = os.path.join(self.path, RECORDS_FILENAME)
+        legacy_path = os.path.join(self.path, LEGACY_RECORDS_FILENAME)
+        vectors_path = os.path.join(self.path, VECTORS_FILENAME)
+        self.ids: List[str] = []
+        self._offsets: List[int] = []
+        self._legacy: Optional[List[Dict]] = None
+        if os.path.exists(records_path):
+            with open(records_path, "rb") as f:
+                offset = 0
+                for line in f:
+                    self.ids.append(json.loads(line)["id"])
+                    self._offsets.append(offset)
+                    offset += len(line)
+        elif os.path.exists(legacy_path):
+            # Stores written before records were streamed keep them in one JSON document
+            with open(legacy_path, "r", encoding="utf-8") as f:
+                records = json.load(f)
+            self.ids = records["ids"]
+            self._legacy = [
+                {"id": chunk_id, "document": document, "metadata": metadata}
+                for chunk_id, document, metadata in zip(records["ids"], records["documents"], records["metadatas"])
+            ]
+        self._base_rows = len(self.ids)
+        self._vectors = np.load(vectors_path, mmap_mode="r") if os.path.exists(vectors_path) else None
+        # Computed on the first unfiltered scan, so stores searched through compact codes never read the whole matrix
+        self._norms = None
+        self._rows = {chunk_id: row for row, chunk_id in enumerate(self.ids)}
+        self._pending_offsets: List[int] = []
+        self._pending_dims = 0
+        self._pending_view = None
+        self._removed = set()
+        self._facets: Dict[str, Dict] = {}
+
+    def __len__(self) -> int:
+        return len(self._rows)
+
+    @property
+    def dirty(self) -> bool:
+        return bool(self._pending_offsets or self._removed)
+
+    @property
+    def vectors(self) -> np.ndarray:
+        """The float32 vector matrix, row-aligned with ids and memory-mapped; pending changes are persisted first."""
+        if self.dirty:
+            self.persist()
+        return self._vectors if self._vectors is not None else np.zeros((0, 0), dtype=np.float32)
+
+    @property
+    def _dims(self) -> int:
+        return self._vectors.shape[1] if self._base_rows else self._pending_dims
+
+    def add_documents(self, documents: List[Document], ids: List[str]) -> List[str]:
+        if not documents:
+            return []
+        vectors = np.asarray(self.embeddings.embed_documents([d.page_content for d in documents]), dtype=np.float32)
+        with open(os.path.join(self.path, PENDING_VECTORS_FILENAME), "ab") as f:
+            f.write(vectors.tobytes())
+        with open(os.path.join(self.path, PENDING_RECORDS_FILENAME), "ab") as f:
+            offset = f.tell()
+            for document, chunk_id in zip(documents, ids):
+                line = _record_line(chunk_id, document.page_content, document.metadata)
+                f.write(line)
+                self._pending_offsets.append(offset)
+                offset += len(line)
+                previous = self._rows.get(chunk_id)
+                if previous is not None:
+                    self._removed.add(previous)
+                self._rows[chunk_id] = len(self.ids)
+                self.ids.append(chunk_id)
+        self._pending_dims = vectors.shape[1]
+        self._pending_view = None
+        self._norms = None
+        self._facets = {}
+        return list(ids)
+
+    def delete(self, ids: List[str]) -> None:
+        for chunk_id in ids:
+            row = self._rows.pop(chunk_id, None)
+            if row is not None:
+                self._removed.add(row)
+                self._facets = {}
+
+    def _pending_vectors(self) -> np.ndarray:
+        if self._pending_view is None:
+            self._pending_view = np.memmap(
+                os.path.join(self.path, PENDING_VECTORS_FILENAME), dtype=np.float32, mode="r",
+                shape=(len(self._pending_offsets), self._pending_dims)
+            )
+        return self._pending_view
+
+    def _row_vectors(self, rows: np.ndarray) -> np.ndarray:
+        """Vectors of the given rows, from the persisted matrix or the spill file."""
+        rows = np.asarray(rows, dtype=np.int64)
+        vectors = np.empty((len(rows), self._dims), dtype=np.float32)
+        persisted = rows < self._base_rows
+        if persisted.any():
+            vectors[persisted] = self._vectors[rows[persisted]]
+        if not persisted.all():
+            vectors[~persisted] = self._pending_vectors()[rows[~persisted] - self._base_rows]
+        return vectors
+
+    def _record_lines(self) -> Iterator[Tuple[int, bytes]]:
+        """(row, JSON line) of every stored row, removed ones included, in row order."""
+        if self._legacy is not None:
+            for row, record in enumerate(self._legacy):
+                yield row, _record_line(record["id"], record["document"], record["metadata"])
+        else:
+            yield from self._file_lines(RECORDS_FILENAME, 0)
+        if self._pending_offsets:
+            yield from self._file_lines(PENDING_RECORDS_FILENAME, self._base_rows)
+
+    def _file_lines(self, name: str, first_row: int) -> Iterator[Tuple[int, bytes]]:
+        path = os.path.join(self.path, name)
+        if os.path.exists(path):
+            with open(path, "rb") as f:
+                yield from enumerate(f, start=first_row)
+
+    def _read_records(self, rows: Iterable[int]) -> List[Dict]:
+        """Records ({"id", "document", "metadata"}) of the given rows, read by offset."""
+        records = []
+        handles = {}
+        try:
+            for row in rows:
+                if row < self._base_rows and self._legacy is not None:
+                    records.append(self._legacy[row])
+                    continue
+                if row < self._base_rows:
+                    name, offset = RECORDS_FILENAME, self._offsets[row]
+                else:
+                    name, offset = PENDING_RECORDS_FILENAME, self._pending_offsets[row - self._base_rows]
+                if name not in handles:
+                    handles[name] = open(os.path.join(self.path, name), "rb")
+                handles[name].seek(offset)
+                records.append(json.loads(handles[name].readline()))
+        finally:
+            for handle in handles.values():
+                handle.close()
+        return records
+
+    def persist(self) -> None:
+        """Stream the live rows into new vector and record files, then drop the spill files."""
+        if not self.dirty and self._legacy is None and os.path.exists(os.path.join(self.path, RECORDS_FILENAME)):
+            return
+        live = np.array(sorted(self._rows.values()), dtype=np.int64)
+        vectors_path = os.path.join(self.path, VECTORS_FILENAME)
+        if len(live):
+            matrix = np.lib.format.open_memmap(vectors_path + ".tmp", mode="w+", dtype=np.float32, shape=(len(live), self._dims))
+            for start in range(0, len(live), self.block_rows):
+                matrix[start:start + self.block_rows] = self._row_vectors(live[start:start + self.block_rows])
+            matrix.flush()
+            del matrix
+            os.replace(vectors_path + ".tmp", vectors_path)
+        else:
+            _write_atomic(vectors_path, lambda f: np.save(f, np.zeros((0, 0), dtype=np.float32)))
+
+        def write_records(f):
+            for row, line in self._record_lines():
+                if row not in self._removed:
+                    f.write(line)
+
+        _write_atomic(os.path.join(self.path, RECORDS_FILENAME), write_records)
+        self._pending_view = None
+        for name in (PENDING_VECTORS_FILENAME, PENDING_RECORDS_FILENAME, LEGACY_RECORDS_FILENAME):
+            if os.path.exists(os.path.join(self.path, name)):
+                os.remove(os.path.join(self.path, name))
+        # Serve queries from the page cache instead of private memory
+        self._load()
+
+    def get(self, ids: Optional[List[str]] = None, include: Sequence[str] = ("documents", "metadatas")) -> Dict:
+        rows = sorted(self._rows.values()) if ids is None else [self._rows[i] for i in ids if i in self._rows]
+        return self._records(rows, include)
+
+    def _records(self, rows: Iterable[int], include: Sequence[str]) -> Dict:
+        rows = list(rows)
+        result = {"ids": [self.ids[row] for row in rows]}
+        if "embeddings" in include:
+            result["embeddings"] = self._row_vectors(rows) if rows else np.zeros((0, 0), dtype=np.float32)
+        if "documents" in include or "metadatas" in include:
+            records = self._read_records(rows)
+            if "documents" in include:
+                result["documents"] = [record["document"] for record in records]
+            if "metadatas" in include:
+                result["metadatas"] = [record["metadata"] for record in records]
+        return result
+
+    def _to_documents(self, rows: Iterable[int]) -> List[Document]:
+        return [
+            Document(id=record["id"], page_content=record["document"], metadata=record["metadata"])
+            for record in self._read_records(rows)
+        ]
+
+    def _filter_rows(self, filter: Dict) -> np.ndarray:
+        """Live rows matching a filter, from per-field value -> rows maps built in one scan on first use."""
+        missing = [key for key in filter if key not in self._facets]
+        if missing:
+            keys = set(missing).union(key for key in FILTER_FIELDS if key not in self._facets)
+            facets: Dict[str, Dict] = {key: {} for key in keys}
+            for row, line in self._record_lines():
+                metadata = json.loads(line)["metadata"]
+                for key in keys:
+                    facets[key].setdefault(metadata.get(key), []).append(row)
+            for key, facet in facets.items():
+                self._facets[key] = {value: np.array(r, dtype=np.int64) for value, r in facet.items()}
+        rows = None
+        for key, accepted in filter.items():
+            values = accepted if isinstance(accepted, (list, tuple, set)) else [accepted]
+            matched = [self._facets[key][value] for value in values if value in self._facets[key]]
+            matched = np.unique(np.concatenate(matched)) if matched else np.zeros(0, dtype=np.int64)
+            rows = matched if rows is None else np.intersect1d(rows, matched)
+        if self._removed:
+            rows = np.setdiff1d(rows, np.fromiter(self._removed, dtype=np.int64))
+        return rows
+
+    def _scan_blocks(self) -> Iterator[Tuple[int, np.ndarray]]:
+        """(first row, vectors) of consecutive blocks covering every stored row."""
+        for start in range(0, len(self.ids), self.block_rows):
+            yield start, self._row_vectors(np.arange(start, min(start + self.block_rows, len(self.ids))))
+
+    def similarity_search_by_vector(self, embedding: List[float], k: int = 4, filter: Optional[Dict] = None) -> List[Document]:
+        return self.search_vectors(np.asarray([embedding], dtype=np.float32), k=k, filter=filter)[0]
+
+    def search_vectors(self, vectors: np.ndarray, k: int = 4, filter: Optional[Dict] = None) -> List[List[Document]]:
+        """One matrix product for all queries, over the filtered sub-collection if a filter is given."""
+        queries = np.asarray(vectors, dtype=np.float32)
+        if not len(self._rows):
+            return [[] for _ in queries]
+        if filter:
+            rows = self._filter_rows(filter)
+            matched = self._row_vectors(rows)
+            distances = np.einsum("ij,ij->i", matched, matched) - 2.0 * (queries @ matched.T)
+        else:
+            rows = None
+            if self._norms is None:
+                self._norms = np.concatenate([np.einsum("ij,ij->i", block, block) for _, block in self._scan_blocks()])
+            if self.dirty:
+                distances = np.empty((len(queries), len(self.ids)), dtype=np.float32)
+                for start, block in self._scan_blocks():
+                    distances[:, start:start + len(block)] = -2.0 * (queries @ block.T)
+                distances += self._norms
+                distances[:, sorted(self._removed)] = np.inf
+            else:
+                distances = self._norms - 2.0 * (queries @ self._vectors.T)
+            k = min(k, len(self._rows))
+        results = []
+        for row_distances in distances:
+            best = top_k_indices(row_distances, k)
+            results.append(self._to_documents(best if rows is None else rows[best]))
+        return results
+
+
+def _record_line(chunk_id: str, document: str, metadata: Dict) -> bytes:
+    return (json.dumps({"id": chunk_id, "document": document, "metadata": dict(metadata)}, ensure_ascii=False) + "\n").encode("utf-8")
+
+
+class HnswVectorStore(NumpyVectorStore):
+    """
+    NumPy store with an HNSW graph (hnswlib) over its vectors.
+
+    The graph is rebuilt from the matrix on persist(), once per build; until
+    then, and whenever it is missing, searches fall back to brute force.
+    """
+
+    def __init__(self, path: str, embeddings: Embeddings, m: int = 16, ef_construction: int = 200, ef_search: int = 64):
+        self.m = m
+        self.ef_construction = ef_construction
+        self.ef_search = ef_search
+        self._index = None
+        super().__init__(path, embeddings)
+
+    def _load(self) -> None:
+        super()._load()
+        self._index = None
+        index_path = os.path.join(self.path, HNSW_FILENAME)
+        if self._vectors is not None and len(self.ids) and os.path.exists(index_path):
+            self._index = hnswlib.Index(space="l2", dim=self._vectors.shape[1])
+            self._index.load_index(index_path, max_elements=len(self.ids))
+            self._index.set_ef(self.ef_search)
+
+    def persist(self) -> None:
+        index_path = os.path.join(self.path, HNSW_FILENAME)
+        # The graph of the previous rows must not be loaded for the new ones
+        if self.dirty and os.path.exists(index_path):
+            os.remove(index_path)
+        super().persist()
+        if self._vectors is None or not len(self.ids) or os.path.exists(index_path):
+            return
+        index = hnswlib.Index(space="l2", dim=self._vectors.shape[1])
+        index.init_index(max_elements=len(self.ids), ef_construction=self.ef_construction, M=self.m)
+        for start in range(0, len(self.ids), self.block_rows):
+            block = np.asarray(self._vectors[start:start + self.block_rows])
+            index.add_items(block, np.arange(start, start + len(block)))
+        index.save_index(index_path + ".tmp")
+        os.replace(index_path + ".tmp", index_path)
+        self._load()
+
+    def search_vectors(self, vectors: np.ndarray, k: int = 4, filter: Optional[Dict] = None) -> List[List[Document]]:
+        if self._index is None or self.dirty or filter:
+            # Filtered sub-collections are small enough to scan exactly
+            return super().search_vectors(vectors, k=k, filter=filter)
+        k = min(k, len(self.ids))
+        if k <= 0:
+            return [[] for _ in vectors]
+        # ef must be at least k for hnswlib to return k neighbors
+        self._index.set_ef(max(self.ef_search, k))
+        labels, _ = self._index.knn_query(np.asarray(vectors, dtype=np.float32), k=k)
+        return [self._to_documents(int(label) for label in row) for row in labels]
+
+
+def open_vector_backend(backend: str, path: str, embeddings: Embeddings, **options):
+    """
+    Open the vector store of a snapshot directory.
+
+    Args:
+        backend: "chroma", "numpy" or "hnsw"
+        path: Snapshot directory
+        embeddings: Embeddings used for documents and queries
+        **options: HNSW parameters (m, ef_construction, ef_search)
+
+    Returns:
+        A store implementing the VectorBackend interface
+    """
+    if backend == "chroma":
+        return ChromaVectorStore(persist_directory=path, embedding_function=embeddings)
+    if backend == "numpy":
+        return NumpyVectorStore(path, embeddings)
+    if backend == "hnsw":
+        if not HAS_HNSWLIB:
+            raise Exception("hnswlib not installed. Install with: pip install hnswlib")
+        return HnswVectorStore(path, embeddings, **options)
+    raise ValueError(f"Unknown vector backend: {backend}")
@@ -0,0 +1,292 @@
+"""
+Vector Store - Versioned index snapshots published by an atomic pointer swap.
+
+Layout of the vector database directory:
+
+    CURRENT                    name of the published snapshot
+    snapshots/<version>/       one complete vector store per build
+
+Every build writes into a fresh snapshot and only becomes visible once
+CURRENT is replaced, so readers never see a half-built index and never wait
+for a rebuild. Retired snapshots are garbage-collected once nothing uses them.
+"""
+
+import os
+import shutil
+import threading
+import time
+import uuid
+from collections import Counter
+from contextlib import contextmanager
+from typing import Any, Callable, Iterator, List, Optional, Set, Tuple
+
+CURRENT_FILENAME = "CURRENT"
+SNAPSHOTS_DIRNAME = "snapshots"
+BUILDING_MARKER = "BUILDING"
+RETIRED_MARKER = "RETIRED"
+
+
+def snapshot_path(db_path: str, version: str) -> str:
+    """Directory holding the given snapshot."""
+    return os.path.join(db_path, SNAPSHOTS_DIRNAME, version)
+
+
+def read_index_version(db_path: str) -> Optional[str]:
+    """
+    Read the version of the published snapshot.
+
+    Args:
+        db_path: Vector database directory
+
+    Returns:
+        The snapshot version, or None if no snapshot has been published
+    """
+    try:
+        with open(os.path.join(db_path, CURRENT_FILENAME), "r", encoding="utf-8") as f:
+            version = f.read().strip()
+    except OSError:
+        return None
+    if not version or not os.path.isdir(snapshot_path(db_path, version)):
+        return None
+    return version
+
+
+def _touch(path: str) -> None:
+    with open(path, "w", encoding="utf-8") as f:
+        f.write(str(time.time()))
+
+
+def create_snapshot(db_path: str, base_version: Optional[str] = None) -> Tuple[str, str]:
+    """
+    Create a new, unpublished snapshot directory.
+
+    Args:
+        db_path: Vector database directory
+        base_version: Snapshot to copy as the starting point (None for an empty snapshot)
+
+    Returns:
+        Tuple of (version, snapshot directory)
+    """
+    version = f"{time.strftime('%Y%m%d-%H%M%S')}-{uuid.uuid4().hex[:8]}"
+    path = snapshot_path(db_path, version)
+    if base_version:
+        shutil.copytree(
+            snapshot_path(db_path, base_version), path,
+            ignore=shutil.ignore_patterns(BUILDING_MARKER, RETIRED_MARKER)
+        )
+    else:
+        os.makedirs(path)
+    _touch(os.path.join(path, BUILDING_MARKER))
+    return version, path
+
+
+def publish_snapshot(db_path: str, version: str) -> None:
+    """
+    Make a snapshot the current index with an atomic pointer swap.
+
+    Args:
+        db_path: Vector database directory
+        version: Snapshot to publish
+    """
+    previous = read_index_version(db_path)
+    building_marker = os.path.join(snapshot_path(db_path, version), BUILDING_MARKER)
+    if os.path.exists(building_marker):
+        os.remove(building_marker)
+
+    pointer = os.path.join(db_path, CURRENT_FILENAME)
+    tmp_pointer = f"{pointer}.{uuid.uuid4().hex}.tmp"
+    with open(tmp_pointer, "w", encoding="utf-8") as f:
+        f.write(version)
+    os.replace(tmp_pointer, pointer)
+
+    if previous and previous != version:
+        _touch(os.path.join(snapshot_path(db_path, previous), RETIRED_MARKER))
+
+
+def discard_snapshot(db_path: str, version: str) -> None:
+    """Delete an unpublished snapshot, e.g. after a failed build."""
+    shutil.rmtree(snapshot_path(db_path, version), ignore_errors=True)
+
+
+def list_snapshots(db_path: str) -> List[str]:
+    """List snapshot versions, oldest first."""
+    snapshots_dir = os.path.join(db_path, SNAPSHOTS_DIRNAME)
+    if not os.path.isdir(snapshots_dir):
+        return []
+    return sorted(
+        name for name in os.listdir(snapshots_dir)
+        if os.path.isdir(os.path.join(snapshots_dir, name))
+    )
+
+
+def _age(path: str) -> Optional[float]:
+    try:
+        return time.time() - os.path.getmtime(path)
+    except OSError:
+        return None
+
+
+def collect_garbage(
+    db_path: str,
+    in_use: Set[str],
+    grace_seconds: float = 60.0,
+    stale_build_seconds: float = 3600.0,
+    release: Optional[Callable[[str], None]] = None,
+) -> List[str]:
+    """
+    Delete snapshots that are no longer current or in use.
+
+    A retired snapshot is kept for grace_seconds so readers in other processes
+    can finish with it. Snapshots still being built are kept unless their build
+    marker is older than stale_build_seconds (a crashed build). Deletion errors,
+    e.g. files still locked on Windows, are ignored and retried on the next run.
+
+    Args:
+        db_path: Vector database directory
+        in_use: Versions this process still holds open
+        grace_seconds: Minimum time since retirement before deletion
+        stale_build_seconds: Age after which an unpublished build is abandoned
+        release: Optional callback invoked with a version before it is deleted
+
+    Returns:
+        Versions that were deleted
+    """
+    current = read_index_version(db_path)
+    removed = []
+    for version in list_snapshots(db_path):
+        if version == current or version in in_use:
+            continue
+        path = snapshot_path(db_path, version)
+        building_age = _age(os.path.join(path, BUILDING_MARKER))
+        if building_age is not None:
+            if building_age < stale_build_seconds:
+                continue
+        else:
+            retired_age = _age(os.path.join(path, RETIRED_MARKER))
+            if retired_age is not None and retired_age < grace_seconds:
+                continue
+
+        if release:
+            release(version)
+        shutil.rmtree(path, ignore_errors=True)
+        if not os.path.exists(path):
+            removed.append(version)
+    return removed
+
+
+def remove_legacy_layout(db_path: str) -> List[str]:
+    """
+    Delete what the pre-snapshot layout left in the root of the vector
+    database directory (a Chroma store written in place). Nothing is
+    deleted until a snapshot has been published, so the old index is never
+    removed before its replacement exists.
+
+    Args:
+        db_path: Vector database directory
+
+    Returns:
+        Names of the entries that were deleted
+    """
+    if read_index_version(db_path) is None:
+        return []
+    removed = []
+    for name in os.listdir(db_path):
+        # Keep the pointer, the snapshots and pointer files being written by a concurrent publish
+        if name in (CURRENT_FILENAME, SNAPSHOTS_DIRNAME) or name.startswith(f"{CURRENT_FILENAME}."):
+            continue
+        path = os.path.join(db_path, name)
+        if os.path.isdir(path):
+            shutil.rmtree(path, ignore_errors=True)
+        else:
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+        if not os.path.exists(path):
+            removed.append(name)
+    return removed
+
+
+class VectorStoreHandle:
+    """
+    Caches one open vector store per snapshot version.
+
+    get() and lease() always resolve the currently published version, so a
+    build published by any process is picked up on the next call. A lease pins
+    its snapshot until the block exits, letting in-flight readers finish on the
+    old snapshot while new callers move to the new one.
+    """
+
+    def __init__(
+        self,
+        open_store: Callable[[str], Any],
+        current_version: Callable[[], Optional[str]],
+        close_store: Optional[Callable[[str], None]] = None,
+    ):
+        self._open_store = open_store
+        self._current_version = current_version
+        self._close_store = close_store
+        self._stores = {}
+        self._leases = Counter()
+        self._version = None
+        self._lock = threading.Lock()
+
+    def _resolve(self) -> Tuple[str, Any]:
+        # Must be called with self._lock held
+        version = self._current_version()
+        if version is None:
+            raise FileNotFoundError("No published index snapshot")
+        if version not in self._stores:
+            self._stores[version] = self._open_store(version)
+        self._version = version
+        self._prune()
+        return version, self._stores[version]
+
+    def _prune(self) -> None:
+        # Must be called with self._lock held
+        for version in list(self._stores):
+            if version != self._version and not self._leases[version]:
+                del self._stores[version]
+                if self._close_store:
+                    self._close_store(version)
+
+    def get(self) -> Any:
+        """Return the store for the published snapshot, opening it if needed."""
+        with self._lock:
+            return self._resolve()[1]
+
+    @contextmanager
+    def lease(self) -> Iterator[Any]:
+        """Pin the published snapshot for the duration of the block and yield its store."""
+        with self.pin() as (_, store):
+            yield store
+
+    @contextmanager
+    def pin(self) -> Iterator[Tuple[str, Any]]:
+        """Like lease(), but yield (version, store) so callers can key results by version."""
+        with self._lock:
+            version, store = self._resolve()
+            self._leases[version] += 1
+        try:
+            yield version, store
+        finally:
+            with self._lock:
+                self._leases[version] -= 1
+                if not self._leases[version]:
+                    del self._leases[version]
+                self._prune()
+
+    def in_use(self) -> Set[str]:
+        """Versions currently open or leased by this handle."""
+        with self._lock:
+            return set(self._stores) | set(self._leases)
+
+    def invalidate(self) -> None:
+        """Drop every cached store that is not leased so the next call reopens it."""
+        with self._lock:
+            self._version = None
+            self._prune()
+
+    @property
+    def version(self) -> Optional[str]:
+        return self._version
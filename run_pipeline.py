@@ -0,0 +1,101 @@
+"""
+Run the full QA pipeline (ingest -> test plan -> scripts -> execution) from
+the command line and report the time spent in each stage.
+Usage: python run_pipeline.py --llm replay --cassette cassettes/llm_cassette.jsonl
+
+Record a cassette once on a machine with LLM access (--llm record), then
+replay it on offline CI boxes for reproducible, network-free profiling.
+"""
+
+import argparse
+import json
+import os
+import sys
+import time
+from pathlib import Path
+
+from dotenv import load_dotenv
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run and profile the ingest -> plan -> script -> run pipeline")
+    parser.add_argument("--llm", default="auto", help="Model type: auto, google, openai, ollama, stub, record or replay")
+    parser.add_argument("--cassette", help="LLM cassette file for --llm record/replay")
+    parser.add_argument("--strict-cassette", action="store_true", help="Only replay responses recorded for the identical prompt")
+    parser.add_argument("--replay-latency", type=float, help="Seconds per replayed response (default: recorded latency)")
+    parser.add_argument("--query", default="Generate comprehensive test cases", help="Test plan query")
+    parser.add_argument("--max-scripts", type=int, default=None, help="Generate scripts for at most this many test cases")
+    parser.add_argument("--force-rebuild", action="store_true", help="Rebuild the knowledge base from scratch")
+    parser.add_argument("--skip-run", action="store_true", help="Generate scripts without executing them")
+    parser.add_argument("--report", help="Write the stage timings and results as JSON to this file")
+    args = parser.parse_args()
+
+    from app import rag_engine
+    from app.test_runner import generate_test_summary, run_all_test_scripts
+    from app.utils import save_generated_script
+
+    if args.cassette:
+        rag_engine.LLM_CASSETTE_PATH = args.cassette
+    if args.replay_latency is not None:
+        rag_engine.LLM_CASSETTE_LATENCY_SECONDS = args.replay_latency
+    if args.strict_cassette:
+        rag_engine.LLM_CASSETTE_STRICT = True
+    if args.llm in ("record", "replay") or (args.llm == "auto" and rag_engine.LLM_CASSETTE_MODE):
+        # Chunks are counted at ingest too, so settle token counting before building
+        rag_engine.use_deterministic_prompts()
+
+    timings = {}
+    report = {"llm": args.llm, "timings_seconds": timings}
+
+    start = time.perf_counter()
+    build = rag_engine.ingest_knowledge_base(force_rebuild=args.force_rebuild)
+    timings["ingest"] = round(time.perf_counter() - start, 3)
+    print(build["message"])
+    if not build["success"]:
+        return 1
+
+    start = time.perf_counter()
+    plan = rag_engine.generate_test_plan(query=args.query, model_type=args.llm)
+    timings["test_plan"] = round(time.perf_counter() - start, 3)
+    print(plan["message"])
+    if not plan["success"]:
+        return 1
+    test_cases = plan["test_cases"][:args.max_scripts] if args.max_scripts else plan["test_cases"]
+
+    start = time.perf_counter()
+    scripts = rag_engine.generate_selenium_code_batch(test_cases, model_type=args.llm)
+    for test_case, result in zip(test_cases, scripts):
+        if result.get("success"):
+            save_generated_script(f"{test_case.get('id', 'test_case')}.py", result["code"])
+    timings["scripts"] = round(time.perf_counter() - start, 3)
+    generated = sum(1 for result in scripts if result.get("success"))
+    print(f"✅ Generated {generated}/{len(test_cases)} Selenium scripts")
+    report.update({"test_cases": len(test_cases), "scripts_generated": generated})
+
+    if not args.skip_run:
+        start = time.perf_counter()
+        summary = generate_test_summary(run_all_test_scripts(test_cases))
+        timings["run"] = round(time.perf_counter() - start, 3)
+        print(f"🧪 {summary['passed']}/{summary['total']} passed ({summary['pass_rate']}%)")
+        report.update({key: summary[key] for key in ("total", "passed", "failed", "not_found", "pass_rate")})
+
+    timings["total"] = round(sum(timings.values()), 3)
+    for stage, seconds in timings.items():
+        print(f"⏱️  {stage:<10} {seconds:8.3f}s")
+    if args.report:
+        with open(args.report, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+    return 0
+
+
+if __name__ == "__main__":
+    # Ensure we're in the project root
+    load_dotenv()
+    project_root = Path(__file__).parent
+    os.chdir(project_root)
+
+    # Add project root to Python path
+    if str(project_root) not in sys.path:
+        sys.path.insert(0, str(project_root))
+
+    sys.exit(main())
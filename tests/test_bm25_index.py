@@ -0,0 +1,69 @@
+"""
+Tests for the BM25 keyword index and reciprocal rank fusion, alone and
+fused with a numpy vector store in HybridVectorStore.
+"""
+
+from langchain_community.embeddings import DeterministicFakeEmbedding
+from langchain_core.documents import Document
+
+from app.bm25_index import BM25Index, HybridVectorStore, reciprocal_rank_fusion
+from app.vector_backends import NumpyVectorStore
+
+
+def test_rrf_scores_sum_reciprocal_ranks():
+    # a = 1/61, b = 2/62, c = 1/63 + 1/61, d = 1/63
+    assert reciprocal_rank_fusion([["a", "b", "c"], ["c", "b", "d"]], k=60) == ["c", "b", "a", "d"]
+
+
+def test_rrf_rewards_agreement_over_a_single_top_rank():
+    assert reciprocal_rank_fusion([["x", "shared"], ["shared", "y"], ["z", "shared"]])[0] == "shared"
+
+
+def test_rrf_small_k_favours_top_ranks():
+    rankings = [["top", "x", "agreed"], ["y", "z", "agreed"]]
+    # top = 1/(k+1), agreed = 2/(k+3): agreement only wins for k > 1
+    assert reciprocal_rank_fusion(rankings, k=60)[0] == "agreed"
+    assert reciprocal_rank_fusion(rankings, k=0.5)[0] == "top"
+
+
+def test_rrf_single_ranking_keeps_order_and_empty_input():
+    assert reciprocal_rank_fusion([["c", "a", "b"]]) == ["c", "a", "b"]
+    assert reciprocal_rank_fusion([[], []]) == []
+
+
+def test_bm25_ranks_matching_chunks_and_honours_filters_and_removal():
+    index = BM25Index()
+    index.add_many(
+        ["1", "2", "3"],
+        ["discount code SAVE15", "shipping options and costs", "discount banner colours"],
+        [{"source_file": "specs.md"}, {"source_file": "specs.md"}, {"source_file": "ui.txt"}],
+    )
+    assert [chunk_id for chunk_id, _ in index.search("SAVE15 discount")] == ["1", "3"]
+    assert [chunk_id for chunk_id, _ in index.search("discount", filter={"source_file": "ui.txt"})] == ["3"]
+    index.remove(["1"])
+    assert [chunk_id for chunk_id, _ in index.search("SAVE15 discount")] == ["3"]
+
+
+def test_bm25_save_and_load_drop_tombstones(tmp_path):
+    index = BM25Index()
+    index.add_many(["1", "2"], ["alpha beta", "beta gamma"])
+    index.remove(["1"])
+    index.save(str(tmp_path))
+    loaded = BM25Index()
+    assert loaded.load(str(tmp_path))
+    assert loaded.ids == ["2"]
+    assert [chunk_id for chunk_id, _ in loaded.search("beta")] == ["2"]
+
+
+def test_hybrid_store_returns_keyword_only_hits(tmp_path):
+    store = NumpyVectorStore(str(tmp_path), DeterministicFakeEmbedding(size=8))
+    texts = {f"id{i}": f"filler text number {i}" for i in range(10)}
+    texts["id9"] = "the SAVE15 discount code"
+    store.add_documents([Document(page_content=text) for text in texts.values()], list(texts))
+    store.persist()
+    bm25 = BM25Index()
+    bm25.add_many(texts, texts.values())
+    hybrid = HybridVectorStore(store, bm25, candidates=2)
+    results = hybrid.similarity_search("SAVE15", k=3)
+    assert "id9" in [document.id for document in results]
+    assert len(results) == 3
@@ -0,0 +1,156 @@
+"""
+Tests for incremental knowledge base builds: the manifest diff, and
+ingest_knowledge_base() adding, changing and removing files on a small
+temporary knowledge base (numpy backend, fake embeddings).
+"""
+
+import os
+
+import pytest
+from langchain_community.embeddings import DeterministicFakeEmbedding
+
+from app import rag_engine
+from app.kb_manifest import (
+    chunk_id_path, diff_manifest, empty_manifest, load_manifest, make_chunk_ids, scan_file_states, stale_chunk_ids,
+)
+from app.model_registry import registry
+from app.vector_backends import NumpyVectorStore
+from app.vector_store import RETIRED_MARKER, read_index_version, snapshot_path
+
+CHECKOUT = "# Checkout\n\nThe checkout form asks for name, email and address. Shipping is free above 50 dollars.\n"
+DISCOUNTS = "# Discounts\n\nThe code SAVE15 takes 15 percent off. Expired codes show an error under the field.\n"
+PAYMENTS = "# Payments\n\nCards and PayPal are accepted. A declined card shows a retry message.\n"
+
+
+def test_diff_manifest_classifies_files(tmp_path):
+    for name, text in (("a.md", "one"), ("b.md", "two"), ("c.md", "three")):
+        (tmp_path / name).write_text(text)
+    files = {name: str(tmp_path / name) for name in ("a.md", "b.md", "c.md")}
+    manifest = empty_manifest()
+    for rel_path, state in scan_file_states(files, manifest).items():
+        manifest["files"][rel_path] = dict(state, chunk_ids=make_chunk_ids(rel_path, state["hash"], 2))
+
+    (tmp_path / "b.md").write_text("two, edited")
+    (tmp_path / "d.md").write_text("four")
+    files = {name: str(tmp_path / name) for name in ("a.md", "b.md", "d.md")}
+    changes = diff_manifest(manifest, scan_file_states(files, manifest))
+
+    assert changes == {"added": ["d.md"], "changed": ["b.md"], "removed": ["c.md"], "unchanged": ["a.md"]}
+    stale = stale_chunk_ids(manifest, changes["changed"] + changes["removed"])
+    assert sorted({chunk_id_path(chunk_id) for chunk_id in stale}) == ["b.md", "c.md"]
+    assert len(stale) == 4
+
+
+def test_chunk_ids_continue_across_parts():
+    assert make_chunk_ids("docs/a.md", "f" * 64, 2, start=3) == ["docs/a.md::ffffffffffffffff::3", "docs/a.md::ffffffffffffffff::4"]
+    assert chunk_id_path("docs/a::b.md::ffffffffffffffff::0") == "docs/a::b.md"
+
+
+@pytest.fixture
+def kb(tmp_path, monkeypatch):
+    """A temporary knowledge base directory and an ingest() building it with the numpy backend"""
+    data = tmp_path / "data"
+    data.mkdir()
+    db_path = str(tmp_path / "db")
+    embeddings = DeterministicFakeEmbedding(size=16)
+    monkeypatch.setattr(rag_engine, "VECTOR_DB_PATH", db_path)
+    monkeypatch.setattr(rag_engine, "VECTOR_BACKEND", "numpy")
+    monkeypatch.setattr(rag_engine, "VECTOR_STORAGE", "float32")
+    monkeypatch.setattr(rag_engine, "INGEST_LOAD_WORKERS", 1)
+    monkeypatch.setattr(rag_engine, "EMBEDDING_CACHE_PATH", str(tmp_path / "embeddings.sqlite3"))
+    monkeypatch.setattr(rag_engine, "_load_base_embeddings", lambda: (embeddings, "fake16"))
+    # Collection is tested explicitly, not from background timers outliving the test
+    monkeypatch.setattr(rag_engine, "schedule_snapshot_garbage_collection", lambda delay=0.0: None)
+    for key in ("embeddings", "embedding_cache"):
+        registry.evict(key)
+    rag_engine._vector_store_handle.invalidate()
+    yield data, lambda: rag_engine.ingest_knowledge_base(data_path=str(data))
+    rag_engine._vector_store_handle.invalidate()
+    for key in ("embeddings", "embedding_cache"):
+        registry.evict(key)
+
+
+def stored_ids(version):
+    store = NumpyVectorStore(snapshot_path(rag_engine.VECTOR_DB_PATH, version), DeterministicFakeEmbedding(size=16))
+    return set(store.ids)
+
+
+def manifest_files(version):
+    return load_manifest(snapshot_path(rag_engine.VECTOR_DB_PATH, version))["files"]
+
+
+def test_incremental_builds(kb):
+    data, ingest = kb
+    (data / "checkout.md").write_text(CHECKOUT)
+    (data / "discounts.md").write_text(DISCOUNTS)
+
+    first = ingest()
+    assert first["success"] and first["added"] == ["checkout.md", "discounts.md"]
+    files = manifest_files(first["version"])
+    checkout_ids = set(files["checkout.md"]["chunk_ids"])
+    discount_ids = set(files["discounts.md"]["chunk_ids"])
+    assert stored_ids(first["version"]) == checkout_ids | discount_ids
+
+    # An unchanged tree is not rebuilt
+    same = ingest()
+    assert same["version"] == first["version"] and same["chunks"] == 0
+
+    # Only the edited file is re-embedded; its old chunks are deleted
+    (data / "discounts.md").write_text(DISCOUNTS + "\nCodes cannot be combined.\n")
+    edited = ingest()
+    assert edited["changed"] == ["discounts.md"] and edited["unchanged"] == ["checkout.md"]
+    new_discount_ids = set(manifest_files(edited["version"])["discounts.md"]["chunk_ids"])
+    assert edited["chunks"] == len(new_discount_ids)
+    assert not new_discount_ids & discount_ids
+    assert stored_ids(edited["version"]) == checkout_ids | new_discount_ids
+
+    # Adding and removing files in one build
+    (data / "checkout.md").unlink()
+    (data / "payments.md").write_text(PAYMENTS)
+    moved = ingest()
+    assert moved["added"] == ["payments.md"] and moved["removed"] == ["checkout.md"]
+    files = manifest_files(moved["version"])
+    assert set(files) == {"discounts.md", "payments.md"}
+    assert stored_ids(moved["version"]) == new_discount_ids | set(files["payments.md"]["chunk_ids"])
+
+
+def test_duplicate_file_is_published_and_rechunked_with_its_original(kb):
+    data, ingest = kb
+    (data / "discounts.md").write_text(DISCOUNTS)
+    first = ingest()
+
+    # A copy whose chunks are all near-duplicates still publishes a snapshot that knows the file
+    (data / "discounts_copy.md").write_text(DISCOUNTS)
+    copied = ingest()
+    assert copied["version"] != first["version"]
+    assert copied["duplicates_removed"] >= 1
+    entry = manifest_files(copied["version"])["discounts_copy.md"]
+    assert entry["chunk_ids"] == [] and entry["duplicate_of"] == ["discounts.md"]
+    assert "discounts_copy.md" in rag_engine.published_files()
+
+    # When the original changes, the copy's chunks are no longer duplicates and must be embedded
+    (data / "discounts.md").write_text(PAYMENTS)
+    changed = ingest()
+    assert changed["changed"] == ["discounts.md", "discounts_copy.md"]
+    files = manifest_files(changed["version"])
+    assert files["discounts_copy.md"]["chunk_ids"]
+    assert "duplicate_of" not in files["discounts_copy.md"]
+    assert stored_ids(changed["version"]) == set(files["discounts.md"]["chunk_ids"]) | set(files["discounts_copy.md"]["chunk_ids"])
+
+
+def test_publish_moves_current_and_retires_previous(kb, monkeypatch):
+    data, ingest = kb
+    (data / "checkout.md").write_text(CHECKOUT)
+    first = ingest()
+    assert read_index_version(rag_engine.VECTOR_DB_PATH) == first["version"]
+
+    (data / "checkout.md").write_text(CHECKOUT + "\nGuests can check out without an account.\n")
+    second = ingest()
+    assert read_index_version(rag_engine.VECTOR_DB_PATH) == second["version"]
+    assert os.path.exists(os.path.join(snapshot_path(rag_engine.VECTOR_DB_PATH, first["version"]), RETIRED_MARKER))
+
+    monkeypatch.setattr(rag_engine, "SNAPSHOT_GRACE_SECONDS", 0)
+    rag_engine.collect_snapshot_garbage()
+    assert not os.path.exists(snapshot_path(rag_engine.VECTOR_DB_PATH, first["version"]))
+    assert os.path.isdir(snapshot_path(rag_engine.VECTOR_DB_PATH, second["version"]))
+    assert rag_engine.retrieve_documents("guest checkout", k=1)
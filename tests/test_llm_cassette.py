@@ -0,0 +1,103 @@
+"""
+Tests for LLM cassettes: recording and replaying through LCEL chains,
+keys by request identity or prompt, strict prompt checks and streaming.
+"""
+
+import json
+
+import pytest
+from langchain_core.output_parsers import StrOutputParser
+from langchain_core.prompts import PromptTemplate
+
+from app.llm_cassette import (
+    CASSETTE_REQUEST_CONFIG_KEY, CassetteLLM, CassetteMissError, LLMCassette, cassette_key,
+)
+from app.llm_router import StubLLM
+
+PROMPT = PromptTemplate.from_template("Context: {context}\nQuery: {query}")
+
+
+def chain(llm):
+    return PROMPT | llm | StrOutputParser()
+
+
+def request(identity):
+    return {"configurable": {CASSETTE_REQUEST_CONFIG_KEY: identity}}
+
+
+@pytest.fixture
+def path(tmp_path):
+    return str(tmp_path / "cassette.jsonl")
+
+
+def record(path, variables, config=None, response="recorded answer"):
+    recorder = CassetteLLM(LLMCassette(path), "record", llm=StubLLM(response), model_name="stub")
+    return chain(recorder).invoke(variables, config=config)
+
+
+def replay(path, variables, config=None, strict=False):
+    player = CassetteLLM(LLMCassette(path), "replay", latency=0.0, strict=strict)
+    return chain(player).invoke(variables, config=config)
+
+
+def test_replay_matches_request_identity_despite_different_prompt(path):
+    assert record(path, {"context": "chunk A", "query": "q"}, request("test_plan/q")) == "recorded answer"
+    assert replay(path, {"context": "chunk A, packed differently", "query": "q"}, request("test_plan/q")) == "recorded answer"
+
+
+def test_entries_are_keyed_by_identity_and_store_the_prompt_hash(path):
+    record(path, {"context": "c", "query": "q"}, request("test_plan/q"))
+    with open(path, encoding="utf-8") as f:
+        entry = json.loads(f.readline())
+    assert entry["key"] == cassette_key("test_plan/q")
+    assert entry["prompt_hash"] == cassette_key(entry["prompt"])
+    assert entry["model"] == "stub"
+
+
+def test_unknown_request_misses(path):
+    record(path, {"context": "c", "query": "q"}, request("test_plan/q"))
+    with pytest.raises(CassetteMissError):
+        replay(path, {"context": "c", "query": "other"}, request("test_plan/other"))
+
+
+def test_strict_replay_requires_identical_prompt(path):
+    record(path, {"context": "c", "query": "q"}, request("test_plan/q"))
+    assert replay(path, {"context": "c", "query": "q"}, request("test_plan/q"), strict=True) == "recorded answer"
+    with pytest.raises(CassetteMissError, match="different prompt"):
+        replay(path, {"context": "c2", "query": "q"}, request("test_plan/q"), strict=True)
+
+
+def test_calls_without_identity_are_keyed_by_prompt(path):
+    record(path, {"context": "c", "query": "q"})
+    assert replay(path, {"context": "c", "query": "q"}) == "recorded answer"
+    with pytest.raises(CassetteMissError):
+        replay(path, {"context": "c2", "query": "q"})
+
+
+def test_prompt_keyed_entries_still_replay_for_identified_requests(path):
+    # Cassettes recorded before request identities existed
+    record(path, {"context": "c", "query": "q"})
+    assert replay(path, {"context": "c", "query": "q"}, request("test_plan/q")) == "recorded answer"
+
+
+def test_later_recording_wins(path):
+    record(path, {"context": "c", "query": "q"}, request("r"), response="first")
+    record(path, {"context": "c", "query": "q"}, request("r"), response="second")
+    assert replay(path, {"context": "c", "query": "q"}, request("r")) == "second"
+
+
+def test_streamed_recording_replays_identically(path):
+    response = '[{"id": "TC-001"}, {"id": "TC-002"}]'
+    recorder = CassetteLLM(LLMCassette(path), "record", llm=StubLLM(response), model_name="stub")
+    recorded = list(chain(recorder).stream({"context": "c", "query": "q"}, config=request("r")))
+    player = CassetteLLM(LLMCassette(path), "replay", latency=0.0)
+    replayed = list(chain(player).stream({"context": "other", "query": "q"}, config=request("r")))
+    assert "".join(recorded) == "".join(replayed) == response
+    assert len(replayed) > 1
+
+
+def test_record_mode_needs_an_llm_and_modes_are_checked(path):
+    with pytest.raises(ValueError):
+        CassetteLLM(LLMCassette(path), "record")
+    with pytest.raises(ValueError):
+        CassetteLLM(LLMCassette(path), "rewind")
@@ -0,0 +1,113 @@
+"""
+Tests for the LLM router: ranking, ageing and exploration of provider
+statistics, circuit breakers, fallthrough and hedged requests, using StubLLM.
+"""
+
+import time
+
+import pytest
+
+from app.llm_router import CLOSED, HALF_OPEN, OPEN, ROUTE_CONFIG_KEY, LLMRouter, ProviderHealth, StubLLM
+
+
+def make_router(stubs, health=None, hedge_after=None):
+    return LLMRouter({name: (lambda stub=stub: stub) for name, stub in stubs.items()}, health or ProviderHealth(), hedge_after)
+
+
+def test_rank_fastest_first_unmeasured_then_failing():
+    health = ProviderHealth()
+    health.record("slow", 0.5, ok=True)
+    health.record("fast", 0.1, ok=True)
+    assert health.rank(["new", "slow", "fast"]) == ["fast", "slow", "new"]
+    health.record("broken", 0.1, ok=False)
+    assert health.rank(["broken", "new"]) == ["new", "broken"]
+
+
+def test_old_samples_expire():
+    health = ProviderHealth(max_age_seconds=0.05)
+    health.record("a", 5.0, ok=True)
+    health.record("b", 1.0, ok=True)
+    assert health.rank(["a", "b"]) == ["b", "a"]
+    time.sleep(0.06)
+    health.record("b", 1.0, ok=True)
+    assert health.stats("a")["calls"] == 0
+    assert health.rank(["b", "a"]) == ["b", "a"]
+    health.record("a", 0.2, ok=True)
+    assert health.rank(["b", "a"]) == ["a", "b"]
+
+
+def test_exploration_tries_stalest_provider():
+    health = ProviderHealth(explore_every=3)
+    health.record("slow", 2.0, ok=True)
+    health.record("fast", 0.1, ok=True)
+    orders = [health.rank(["fast", "slow", "never"])[0] for _ in range(6)]
+    assert orders == ["fast", "fast", "never", "fast", "fast", "never"]
+    health.record("never", 3.0, ok=True)
+    orders = [health.rank(["fast", "slow", "never"])[0] for _ in range(3)]
+    assert orders == ["fast", "fast", "slow"]
+
+
+def test_breaker_opens_half_opens_and_closes():
+    health = ProviderHealth(failure_threshold=2, reset_seconds=0.05)
+    health.record("a", 0.1, ok=False)
+    assert health.stats("a")["state"] == CLOSED
+    health.record("a", 0.1, ok=False)
+    assert health.stats("a")["state"] == OPEN
+    assert health.rank(["a", "b"]) == ["b"]
+    time.sleep(0.06)
+    assert health.stats("a")["state"] == HALF_OPEN
+    assert "a" in health.rank(["a", "b"])
+    health.record("a", 0.1, ok=True)
+    assert health.stats("a")["state"] == CLOSED
+
+
+def test_half_open_failure_reopens():
+    health = ProviderHealth(failure_threshold=1, reset_seconds=0.05)
+    health.record("a", 0.1, ok=False)
+    time.sleep(0.06)
+    assert health.stats("a")["state"] == HALF_OPEN
+    health.record("a", 0.1, ok=False)
+    assert health.stats("a")["state"] == OPEN
+
+
+def test_breaker_opens_on_error_rate():
+    health = ProviderHealth(failure_threshold=100, max_error_rate=0.5, min_samples=4)
+    for ok in (True, False, True, False):
+        health.record("a", 0.1, ok=ok)
+    assert health.stats("a")["state"] == OPEN
+
+
+def test_route_raises_when_every_circuit_is_open():
+    health = ProviderHealth(failure_threshold=1)
+    router = make_router({"a": StubLLM("a")}, health)
+    health.record("a", 0.1, ok=False)
+    with pytest.raises(Exception, match="unavailable"):
+        router.route()
+
+
+def test_failed_provider_falls_through():
+    router = make_router({"down": StubLLM("down", fail_rate=1.0), "up": StubLLM("up")})
+    assert router.invoke("hi") == "up"
+    assert router.health.stats("down")["error_rate"] == 1.0
+    assert "".join(router.stream("hi there")) == "up"
+
+
+def test_all_providers_failing_raises():
+    router = make_router({"a": StubLLM(fail_rate=1.0), "b": StubLLM(fail_rate=1.0)})
+    with pytest.raises(Exception, match="All LLM providers failed"):
+        router.invoke("hi")
+
+
+def test_hedged_request_returns_faster_provider():
+    router = make_router({"slow": StubLLM("slow", latency=1.0), "fast": StubLLM("fast", latency=0.01)}, hedge_after=0.1)
+    start = time.perf_counter()
+    assert router.invoke("hi") == "fast"
+    assert time.perf_counter() - start < 0.5
+
+
+def test_route_in_config_is_followed_unless_open():
+    health = ProviderHealth(failure_threshold=1)
+    router = make_router({"a": StubLLM("a"), "b": StubLLM("b")}, health)
+    assert router.invoke("hi", config={"configurable": {ROUTE_CONFIG_KEY: ["b", "a"]}}) == "b"
+    health.record("b", 0.1, ok=False)
+    assert router.invoke("hi", config={"configurable": {ROUTE_CONFIG_KEY: ["b", "a"]}}) == "a"
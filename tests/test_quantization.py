@@ -0,0 +1,88 @@
+"""
+Tests for compact vector storage: quantization error, blocked fitting,
+exact neighbors, recall against float32 and CompactVectorStore search.
+"""
+
+import numpy as np
+import pytest
+from langchain_community.embeddings import DeterministicFakeEmbedding
+from langchain_core.documents import Document
+
+from app.quantization import (
+    CompactVectorStore, QuantizedVectors, evaluate_recall, exact_neighbors, load_compact_vectors,
+)
+from app.vector_backends import NumpyVectorStore
+
+
+@pytest.fixture
+def vectors():
+    return np.random.RandomState(0).normal(size=(400, 32)).astype(np.float32)
+
+
+def blocks_of(vectors, size):
+    return lambda: (vectors[start:start + size] for start in range(0, len(vectors), size))
+
+
+@pytest.mark.parametrize("mode", ["int8", "float16"])
+def test_distances_approximate_float32(vectors, mode):
+    quantized = QuantizedVectors(mode).fit(vectors)
+    query = vectors[7] + 0.01
+    exact = np.square(vectors - query).sum(axis=1)
+    assert np.allclose(quantized.distances(query), exact, rtol=0.05, atol=0.5)
+    assert quantized.search(query, 1)[0] == 7
+
+
+@pytest.mark.parametrize("mode,pca_dims", [("int8", None), ("int8", 8), ("float16", 8)])
+def test_fit_blocks_matches_fit(vectors, mode, pca_dims):
+    whole = QuantizedVectors(mode, pca_dims).fit(vectors)
+    blocked = QuantizedVectors(mode, pca_dims).fit_blocks(blocks_of(vectors, 64), len(vectors), vectors.shape[1])
+    assert np.array_equal(whole.codes, blocked.codes)
+    assert np.allclose(whole.norms, blocked.norms)
+
+
+def test_exact_neighbors_matches_brute_force(vectors):
+    queries = vectors[:10] + 0.1
+    expected = np.argsort(((queries[:, None, :] - vectors[None]) ** 2).sum(axis=2), axis=1)[:, :5]
+    assert np.array_equal(exact_neighbors(vectors, queries, 5, block=37), expected)
+
+
+def test_recall_of_int8_is_high_and_rescoring_is_no_worse(vectors):
+    report = evaluate_recall(vectors, QuantizedVectors("int8").fit(vectors), k=5, candidates=20)
+    assert report["queries"] == 100 and report["k"] == 5
+    assert report["recall_at_k"] >= 0.8
+    assert report["recall_at_k_rescored"] >= report["recall_at_k"]
+    assert report["recall_at_k_rescored"] >= 0.95
+
+
+def test_pca_reduces_footprint_and_recall(vectors):
+    full = QuantizedVectors("int8").fit(vectors)
+    reduced = QuantizedVectors("int8", pca_dims=4).fit(vectors)
+    assert reduced.codes.shape == (400, 4)
+    assert reduced.nbytes < full.nbytes
+    assert evaluate_recall(vectors, reduced)["recall_at_k"] < evaluate_recall(vectors, full)["recall_at_k"]
+
+
+def test_recall_on_tiny_matrix():
+    assert evaluate_recall(np.zeros((1, 4), dtype=np.float32), QuantizedVectors("int8"))["recall_at_k"] == 1.0
+
+
+def test_compact_store_matches_exact_search(tmp_path):
+    embeddings = DeterministicFakeEmbedding(size=16)
+    store = NumpyVectorStore(str(tmp_path), embeddings)
+    texts = [f"chunk number {i}" for i in range(50)]
+    store.add_documents(
+        [Document(page_content=text, metadata={"source_file": f"f{i % 2}.md"}) for i, text in enumerate(texts)],
+        [f"id{i}" for i in range(50)],
+    )
+    store.persist()
+    QuantizedVectors("int8").fit(store.vectors).save(str(tmp_path), store.ids)
+    ids, quantized = load_compact_vectors(str(tmp_path))
+    compact = CompactVectorStore(store, ids, quantized)
+
+    queries = ["chunk number 3", "chunk number 42"]
+    vectors = np.asarray([embeddings.embed_query(query) for query in queries], dtype=np.float32)
+    exact = store.batch_search(queries, vectors, k=3)
+    approx = compact.batch_search(queries, vectors, k=3)
+    assert [[d.id for d in documents] for documents in approx] == [[d.id for d in documents] for documents in exact]
+    filtered = compact.batch_search(queries, vectors, k=3, filters=[{"source_file": "f1.md"}, None])
+    assert all(d.metadata["source_file"] == "f1.md" for d in filtered[0])
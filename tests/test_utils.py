@@ -0,0 +1,84 @@
+"""
+Tests for IncrementalJSONArrayParser: objects split across chunks at every
+position, tricky string contents, surrounding prose and fences, and
+unterminated output.
+"""
+
+import json
+
+from app.utils import IncrementalJSONArrayParser
+
+TEST_CASES = [
+    {"id": "TC-001", "title": "Apply {SAVE15} discount", "description": 'Enter "SAVE15" and press [Apply]'},
+    {"id": "TC-002", "title": "Path C:\\checkout\\", "steps": [{"action": "click", "target": "#pay"}], "tags": []},
+    {"id": "TC-003", "title": "Unicode é ✅", "expected_result": "Shows \\\"Paid\\\" }]"},
+]
+ARRAY_TEXT = json.dumps(TEST_CASES, ensure_ascii=False)
+
+
+def parse_chunks(chunks):
+    parser = IncrementalJSONArrayParser()
+    items = []
+    for chunk in chunks:
+        items.extend(parser.feed(chunk))
+    return items, parser
+
+
+def test_whole_array_in_one_chunk():
+    items, parser = parse_chunks([ARRAY_TEXT])
+    assert items == TEST_CASES
+    assert parser.done
+
+
+def test_split_at_every_position():
+    for split in range(len(ARRAY_TEXT) + 1):
+        items, parser = parse_chunks([ARRAY_TEXT[:split], ARRAY_TEXT[split:]])
+        assert items == TEST_CASES, split
+        assert parser.done
+
+
+def test_one_character_at_a_time():
+    items, parser = parse_chunks(list(ARRAY_TEXT))
+    assert items == TEST_CASES
+    assert parser.done
+
+
+def test_objects_are_returned_as_soon_as_complete():
+    parser = IncrementalJSONArrayParser()
+    first_end = ARRAY_TEXT.index("}, {") + 1
+    assert parser.feed(ARRAY_TEXT[:first_end - 1]) == []
+    assert parser.feed(ARRAY_TEXT[first_end - 1:first_end]) == [TEST_CASES[0]]
+    assert not parser.done
+
+
+def test_braces_brackets_and_escaped_quotes_inside_strings():
+    text = '[{"a": "}{][", "b": "say \\"hi\\" \\\\", "c": "\\\\"}, {"d": "\\"}"}]'
+    items, _ = parse_chunks([text])
+    assert items == json.loads(text)
+
+
+def test_prose_and_code_fence_around_array():
+    text = "Here are the test cases:\n```json\n" + ARRAY_TEXT + "\n```\nLet me know if you need more."
+    for split in range(0, len(text), 7):
+        items, parser = parse_chunks([text[:split], text[split:]])
+        assert items == TEST_CASES
+        assert parser.done
+
+
+def test_text_after_closing_bracket_is_ignored():
+    parser = IncrementalJSONArrayParser()
+    assert parser.feed(ARRAY_TEXT) == TEST_CASES
+    assert parser.feed('[{"id": "TC-999"}]') == []
+
+
+def test_unterminated_last_object_is_not_returned():
+    cut = ARRAY_TEXT.rindex("{") + 10
+    items, parser = parse_chunks([ARRAY_TEXT[:cut]])
+    assert items == TEST_CASES[:2]
+    assert not parser.done
+
+
+def test_invalid_object_is_skipped():
+    items, parser = parse_chunks(['[{"id": "TC-001",}, {"id": "TC-002"}]'])
+    assert items == [{"id": "TC-002"}]
+    assert parser.done
@@ -0,0 +1,76 @@
+"""
+Tests for versioned index snapshots: creation, atomic publishing, garbage
+collection of retired and abandoned snapshots, and legacy layout cleanup.
+"""
+
+import os
+import time
+
+from app.vector_store import (
+    BUILDING_MARKER, CURRENT_FILENAME, RETIRED_MARKER, collect_garbage, create_snapshot, list_snapshots,
+    publish_snapshot, read_index_version, remove_legacy_layout, snapshot_path,
+)
+
+
+def build(db_path, base_version=None, content="v"):
+    version, path = create_snapshot(db_path, base_version)
+    with open(os.path.join(path, "data.txt"), "a", encoding="utf-8") as f:
+        f.write(content)
+    return version, path
+
+
+def test_unpublished_snapshot_is_invisible(tmp_path):
+    db_path = str(tmp_path)
+    version, path = build(db_path)
+    assert read_index_version(db_path) is None
+    assert os.path.exists(os.path.join(path, BUILDING_MARKER))
+    publish_snapshot(db_path, version)
+    assert read_index_version(db_path) == version
+    assert not os.path.exists(os.path.join(path, BUILDING_MARKER))
+
+
+def test_snapshot_copies_base_and_leaves_it_untouched(tmp_path):
+    db_path = str(tmp_path)
+    first, first_path = build(db_path, content="a")
+    publish_snapshot(db_path, first)
+    second, second_path = build(db_path, base_version=first, content="b")
+    assert open(os.path.join(second_path, "data.txt")).read() == "ab"
+    assert open(os.path.join(first_path, "data.txt")).read() == "a"
+    publish_snapshot(db_path, second)
+    assert read_index_version(db_path) == second
+    assert os.path.exists(os.path.join(first_path, RETIRED_MARKER))
+
+
+def test_garbage_collection_respects_grace_period_and_leases(tmp_path):
+    db_path = str(tmp_path)
+    first, _ = build(db_path)
+    publish_snapshot(db_path, first)
+    second, _ = build(db_path, base_version=first)
+    publish_snapshot(db_path, second)
+    building, _ = build(db_path, base_version=second)
+
+    assert collect_garbage(db_path, in_use=set(), grace_seconds=60) == []
+    assert collect_garbage(db_path, in_use={first}, grace_seconds=0) == []
+    assert collect_garbage(db_path, in_use=set(), grace_seconds=0) == [first]
+    # The current snapshot and a build in progress are never collected
+    assert list_snapshots(db_path) == sorted([second, building])
+
+
+def test_abandoned_build_is_collected(tmp_path):
+    db_path = str(tmp_path)
+    version, path = build(db_path)
+    old = time.time() - 7200
+    os.utime(os.path.join(path, BUILDING_MARKER), (old, old))
+    assert collect_garbage(db_path, in_use=set(), stale_build_seconds=3600) == [version]
+
+
+def test_legacy_layout_removed_only_after_publish(tmp_path):
+    db_path = str(tmp_path)
+    (tmp_path / "chroma.sqlite3").write_text("old index")
+    (tmp_path / "old-collection").mkdir()
+    assert remove_legacy_layout(db_path) == []
+    version, _ = build(db_path)
+    publish_snapshot(db_path, version)
+    assert sorted(remove_legacy_layout(db_path)) == ["chroma.sqlite3", "old-collection"]
+    assert sorted(os.listdir(db_path)) == [CURRENT_FILENAME, "snapshots"]
+    assert os.path.isdir(snapshot_path(db_path, version))